@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import os
+import time
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import httpx
 
+from app.json_stream import JsonFieldExtractor, Path, extract_json_fields
+from app.notion_calendar import describe_event, event_from_utterance, show_event_action
 from app.provider_types import AIProviderId
 
 
@@ -14,9 +20,211 @@ class ProviderResult:
     reply_text: str
     provider_applied: AIProviderId
     routing_note: str
+    usage: Optional[Dict[str, int]] = None  # normalized: prompt_tokens / completion_tokens / cached_tokens (/ cache_write_tokens)
+    citations: Tuple[str, ...] = ()  # source URLs (Perplexity)
+    client_actions: Tuple[Dict[str, Any], ...] = ()  # e.g. Notion Calendar cron:// deep links
+
+
+def _usage_openai(u: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    if not u:
+        return None
+    return {
+        "prompt_tokens": int(u.get("prompt_tokens") or 0),
+        "completion_tokens": int(u.get("completion_tokens") or 0),
+        "cached_tokens": int((u.get("prompt_tokens_details") or {}).get("cached_tokens") or 0),
+    }
+
+
+def _usage_gemini(u: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    if not u:
+        return None
+    return {
+        "prompt_tokens": int(u.get("promptTokenCount") or 0),
+        "completion_tokens": int(u.get("candidatesTokenCount") or 0),
+        "cached_tokens": int(u.get("cachedContentTokenCount") or 0),
+    }
+
+
+def _usage_anthropic(u: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    if not u:
+        return None
+    cache_read = int(u.get("cache_read_input_tokens") or 0)
+    cache_write = int(u.get("cache_creation_input_tokens") or 0)
+    return {
+        # Anthropic reports cached input separately; normalize to the OpenAI shape.
+        "prompt_tokens": int(u.get("input_tokens") or 0) + cache_read + cache_write,
+        "completion_tokens": int(u.get("output_tokens") or 0),
+        "cached_tokens": cache_read,
+        "cache_write_tokens": cache_write,  # billed above the plain input rate
+    }
+
+
+# --- Response decoding ---
+#
+# Responses are streamed and only the fields below are decoded (app/json_stream.py);
+# e.g. Perplexity search_results are scanned but never materialized.
+
+_CHAT_TEXT: Path = ("choices", 0, "message", "content")
+_CHAT_USAGE: Path = ("usage",)
+_PPLX_CITATIONS: Path = ("citations",)
+_CLAUDE_CONTENT: Path = ("content",)
+_GEMINI_TEXT: Path = ("candidates", 0, "content", "parts", 0, "text")
+_GEMINI_USAGE: Path = ("usageMetadata",)
+
+
+def _citations(value: Any) -> Tuple[str, ...]:
+    if not isinstance(value, list):
+        return ()
+    return tuple(c if isinstance(c, str) else str((c or {}).get("url") or "") for c in value if c)
+
+
+async def _post_json_fields(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    fields: Iterable[Path],
+) -> JsonFieldExtractor:
+    async with client.stream("POST", url, headers=headers, content=_encode_json(payload)) as r:
+        r.raise_for_status()
+        return await extract_json_fields(r.aiter_bytes(), fields)
+
+
+# --- Upstream connection pool ---
+#
+# One pooled client per provider instance (and event loop), so follow-up turns
+# and speculative warm-ups reuse TLS connections instead of reconnecting.
+
+
+def _keepalive_sec() -> float:
+    try:
+        return max(1.0, float((os.getenv("HALO_AI_KEEPALIVE_SEC") or "30").strip()))
+    except ValueError:
+        return 30.0
+
+
+def _upstream_origin(provider_id: AIProviderId) -> Optional[str]:
+    """Origin the provider's adapter will call, or None if it would not call upstream."""
+    if provider_id == AIProviderId.OPENAI and os.getenv("OPENAI_API_KEY"):
+        return "https://api.openai.com"
+    if provider_id == AIProviderId.PERPLEXITY and os.getenv("PERPLEXITY_API_KEY"):
+        return "https://api.perplexity.ai"
+    if provider_id == AIProviderId.CLAUDE and os.getenv("ANTHROPIC_API_KEY"):
+        return "https://api.anthropic.com"
+    if provider_id == AIProviderId.CLOUD_AI and os.getenv("GEMINI_API_KEY"):
+        return "https://generativelanguage.googleapis.com"
+    if provider_id == AIProviderId.PRO_ACTOR and os.getenv("PRO_ACTOR_API_KEY"):
+        u = httpx.URL(os.getenv("PRO_ACTOR_BASE_URL") or "")
+        return f"{u.scheme}://{u.netloc.decode('ascii')}" if u.scheme and u.host else None
+    return None
+
+
+# Providers answered in-process (no upstream call): never worth speculating on, and
+# their result (e.g. a calendar action) must come from the final utterance.
+LOCAL_PROVIDERS = frozenset({AIProviderId.NOTION_CALENDAR, AIProviderId.ECHO})
+
+
+# --- Prompt construction (provider-side prompt caching) ---
+#
+# Upstream prompt caches match on the longest identical prefix, so every payload
+# is built in a fixed order: system prompt -> session history (oldest first) ->
+# current utterance. Nothing turn-specific (timestamps, ids) goes into the prefix,
+# and JSON is serialized deterministically so the same prefix is byte-identical
+# across turns.
+
+
+def _system_prompt() -> str:
+    return (os.getenv("HALO_AI_SYSTEM_PROMPT") or "").strip()
+
+
+def _history(session_context: Dict[str, Any]) -> List[Dict[str, str]]:
+    return [
+        {"role": m["role"], "content": m["content"]}
+        for m in (session_context.get("history") or [])
+        if m.get("role") in ("user", "assistant") and m.get("content")
+    ]
+
+
+def _chat_messages(user_utterance: str, session_context: Dict[str, Any]) -> List[Dict[str, str]]:
+    messages: List[Dict[str, str]] = []
+    system = _system_prompt()
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.extend(_history(session_context))
+    messages.append({"role": "user", "content": user_utterance})
+    return messages
+
+
+def estimate_prompt_tokens(user_utterance: str, session_context: Dict[str, Any]) -> int:
+    """Rough upstream prompt size (~4 chars per token) for calls whose usage is never reported."""
+    return sum(len(m["content"]) for m in _chat_messages(user_utterance, session_context)) // 4 + 1
+
+
+def _encode_json(payload: Dict[str, Any]) -> bytes:
+    # Insertion order is preserved (no sort_keys): payload builders put the
+    # cacheable prefix ("model", "system", "messages") first.
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _prompt_cache_key(session_context: Dict[str, Any]) -> Optional[str]:
+    # OpenAI routes requests sharing a prompt_cache_key to the same cache shard.
+    tenant_id = session_context.get("tenant_id")
+    session_id = session_context.get("session_id")
+    if not tenant_id or not session_id:
+        return None
+    return hashlib.sha256(f"{tenant_id}:{session_id}".encode("utf-8")).hexdigest()[:32]
 
 
 class ConversationAIProvider:
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._transport = transport  # injectable for in-process perf runs (httpx.MockTransport)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._warm_until: Dict[str, float] = {}  # origin -> monotonic deadline
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Pooled connections are bound to the loop that opened them.
+            self._client = httpx.AsyncClient(
+                timeout=float(os.getenv("HALO_AI_UPSTREAM_TIMEOUT_SEC") or "60"),
+                limits=httpx.Limits(keepalive_expiry=_keepalive_sec()),
+                transport=self._transport,
+            )
+            self._client_loop = loop
+            self._warm_until.clear()
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client, self._client_loop = self._client, None, None
+            self._warm_until.clear()
+            try:
+                await client.aclose()
+            except RuntimeError:
+                pass  # loop that owned the pool is already gone
+
+    async def warm(self, provider_id: AIProviderId) -> bool:
+        """
+        Open (or keep) a pooled connection to the provider's upstream with a HEAD
+        request, so the next generate_reply() skips DNS/TCP/TLS setup.
+        Returns False when the provider would not call upstream or the origin is unreachable.
+        """
+        origin = _upstream_origin(provider_id)
+        if origin is None:
+            return False
+        client = self._http()
+        now = time.monotonic()
+        if self._warm_until.get(origin, 0.0) > now:
+            return True
+        self._warm_until[origin] = now + _keepalive_sec() / 2
+        try:
+            await client.head(origin + "/", timeout=5.0)
+            return True
+        except httpx.HTTPError:
+            self._warm_until.pop(origin, None)
+            return False
+
     async def generate_reply(
         self,
         user_utterance: str,
@@ -24,29 +232,35 @@ class ConversationAIProvider:
         provider_requested: AIProviderId,
     ) -> ProviderResult:
         if provider_requested == AIProviderId.OPENAI:
-            return await self._openai(user_utterance)
+            return await self._openai(user_utterance, session_context)
 
         if provider_requested == AIProviderId.PERPLEXITY:
-            return await self._perplexity(user_utterance)
+            return await self._perplexity(user_utterance, session_context)
+
+        if provider_requested == AIProviderId.CLAUDE:
+            return await self._claude(user_utterance, session_context)
 
         if provider_requested == AIProviderId.CLOUD_AI:
-            return await self._gemini(user_utterance)
+            return await self._gemini(user_utterance, session_context)
 
         if provider_requested == AIProviderId.PRO_ACTOR:
             return await self._openai_compatible(
                 user_utterance=user_utterance,
+                session_context=session_context,
                 base_url=os.getenv("PRO_ACTOR_BASE_URL") or "",
                 api_key=os.getenv("PRO_ACTOR_API_KEY") or "",
                 model=os.getenv("PRO_ACTOR_MODEL") or "default",
                 provider_name=AIProviderId.PRO_ACTOR,
             )
 
-        # Notion Calendar is handled as client action in main.py (MVP placeholder)
+        # Notion Calendar: event parsed locally, returned as a client action (cron:// deep link)
         if provider_requested == AIProviderId.NOTION_CALENDAR:
+            event, lang = event_from_utterance(user_utterance, str(session_context.get("session_id") or "halo"))
             return ProviderResult(
-                reply_text="Notion Calendar selected (client action required).",
+                reply_text=describe_event(event, lang),
                 provider_applied=AIProviderId.NOTION_CALENDAR,
-                routing_note="notion_calendar_placeholder",
+                routing_note="notion_calendar_action",
+                client_actions=(show_event_action(event),),
             )
 
         return ProviderResult(
@@ -55,7 +269,7 @@ class ConversationAIProvider:
             routing_note="echo_stub",
         )
 
-    async def _openai(self, user_utterance: str) -> ProviderResult:
+    async def _openai(self, user_utterance: str, session_context: Dict[str, Any]) -> ProviderResult:
         key = os.getenv("OPENAI_API_KEY") or ""
         if not key:
             return ProviderResult(
@@ -66,20 +280,20 @@ class ConversationAIProvider:
 
         model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
         url = "https://api.openai.com/v1/chat/completions"
-        headers = {"Authorization": f"Bearer {key}", "Accept": "application/json", "User-Agent": "halo-mvp/0.1"}
-        payload = {
+        headers = {"Authorization": f"Bearer {key}", "Accept": "application/json", "Content-Type": "application/json", "User-Agent": "halo-mvp/0.1"}
+        payload: Dict[str, Any] = {
             "model": model,
-            "messages": [{"role": "user", "content": user_utterance}],
+            "messages": _chat_messages(user_utterance, session_context),
             "temperature": 0.2,
         }
+        cache_key = _prompt_cache_key(session_context)
+        if cache_key:
+            payload["prompt_cache_key"] = cache_key
 
         try:
-            async with httpx.AsyncClient(timeout=float(os.getenv("HALO_AI_UPSTREAM_TIMEOUT_SEC") or "60")) as client:
-                r = await client.post(url, headers=headers, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                txt = data["choices"][0]["message"]["content"]
-            return ProviderResult(txt, AIProviderId.OPENAI, "openai_chat_completions")
+            ex = await _post_json_fields(self._http(), url, headers, payload, (_CHAT_TEXT, _CHAT_USAGE))
+            txt = ex.results[_CHAT_TEXT]
+            return ProviderResult(txt, AIProviderId.OPENAI, "openai_chat_completions", _usage_openai(ex.get(_CHAT_USAGE)))
         except Exception as e:
             return ProviderResult(
                 reply_text=f"ECHO: {user_utterance}",
@@ -87,7 +301,7 @@ class ConversationAIProvider:
                 routing_note=f"degraded_openai_error:{type(e).__name__}",
             )
 
-    async def _perplexity(self, user_utterance: str) -> ProviderResult:
+    async def _perplexity(self, user_utterance: str, session_context: Dict[str, Any]) -> ProviderResult:
         key = os.getenv("PERPLEXITY_API_KEY") or ""
         if not key:
             return ProviderResult(
@@ -98,20 +312,23 @@ class ConversationAIProvider:
 
         model = os.getenv("PERPLEXITY_MODEL") or "sonar"
         url = "https://api.perplexity.ai/chat/completions"
-        headers = {"Authorization": f"Bearer {key}", "Accept": "application/json", "User-Agent": "halo-mvp/0.1"}
+        headers = {"Authorization": f"Bearer {key}", "Accept": "application/json", "Content-Type": "application/json", "User-Agent": "halo-mvp/0.1"}
         payload = {
             "model": model,
-            "messages": [{"role": "user", "content": user_utterance}],
+            "messages": _chat_messages(user_utterance, session_context),
             "temperature": 0.2,
         }
 
         try:
-            async with httpx.AsyncClient(timeout=float(os.getenv("HALO_AI_UPSTREAM_TIMEOUT_SEC") or "60")) as client:
-                r = await client.post(url, headers=headers, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                txt = data["choices"][0]["message"]["content"]
-            return ProviderResult(txt, AIProviderId.PERPLEXITY, "perplexity_chat_completions")
+            ex = await _post_json_fields(self._http(), url, headers, payload, (_CHAT_TEXT, _CHAT_USAGE, _PPLX_CITATIONS))
+            txt = ex.results[_CHAT_TEXT]
+            return ProviderResult(
+                txt,
+                AIProviderId.PERPLEXITY,
+                "perplexity_chat_completions",
+                _usage_openai(ex.get(_CHAT_USAGE)),
+                _citations(ex.get(_PPLX_CITATIONS)),
+            )
         except Exception as e:
             return ProviderResult(
                 reply_text=f"ECHO: {user_utterance}",
@@ -119,7 +336,55 @@ class ConversationAIProvider:
                 routing_note=f"degraded_perplexity_error:{type(e).__name__}",
             )
 
-    async def _gemini(self, user_utterance: str) -> ProviderResult:
+    async def _claude(self, user_utterance: str, session_context: Dict[str, Any]) -> ProviderResult:
+        key = os.getenv("ANTHROPIC_API_KEY") or ""
+        if not key:
+            return ProviderResult(
+                reply_text=f"ECHO: {user_utterance}",
+                provider_applied=AIProviderId.CLAUDE,
+                routing_note="degraded_missing_ANTHROPIC_API_KEY",
+            )
+
+        model = os.getenv("CLAUDE_MODEL") or "claude-3-5-haiku-latest"
+        url = "https://api.anthropic.com/v1/messages"
+        headers = {
+            "x-api-key": key,
+            "anthropic-version": "2023-06-01",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "User-Agent": "halo-mvp/0.1",
+        }
+
+        # Explicit cache breakpoints: end of system prompt and end of history,
+        # so each turn reads the cache written by the previous one.
+        messages: List[Dict[str, Any]] = [
+            {"role": m["role"], "content": [{"type": "text", "text": m["content"]}]}
+            for m in _history(session_context)
+        ]
+        if messages:
+            messages[-1]["content"][-1]["cache_control"] = {"type": "ephemeral"}
+        messages.append({"role": "user", "content": [{"type": "text", "text": user_utterance}]})
+
+        payload: Dict[str, Any] = {"model": model}
+        system = _system_prompt()
+        if system:
+            payload["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        payload["messages"] = messages
+        payload["max_tokens"] = int(os.getenv("CLAUDE_MAX_TOKENS") or "1024")
+        payload["temperature"] = 0.2
+
+        try:
+            ex = await _post_json_fields(self._http(), url, headers, payload, (_CLAUDE_CONTENT, _CHAT_USAGE))
+            txt = "".join(b.get("text", "") for b in ex.results[_CLAUDE_CONTENT] if b.get("type") == "text")
+            return ProviderResult(txt, AIProviderId.CLAUDE, "anthropic_messages", _usage_anthropic(ex.get(_CHAT_USAGE)))
+        except Exception as e:
+            return ProviderResult(
+                reply_text=f"ECHO: {user_utterance}",
+                provider_applied=AIProviderId.CLAUDE,
+                routing_note=f"degraded_claude_error:{type(e).__name__}",
+            )
+
+    async def _gemini(self, user_utterance: str, session_context: Dict[str, Any]) -> ProviderResult:
         key = os.getenv("GEMINI_API_KEY") or ""
         if not key:
             return ProviderResult(
@@ -131,15 +396,19 @@ class ConversationAIProvider:
         model = os.getenv("GEMINI_MODEL") or "gemini-2.5-flash"
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
         headers = {"x-goog-api-key": key, "Content-Type": "application/json"}
-        payload = {"contents": [{"parts": [{"text": user_utterance}]}]}
+        payload: Dict[str, Any] = {}
+        system = _system_prompt()
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        payload["contents"] = [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in _history(session_context)
+        ] + [{"role": "user", "parts": [{"text": user_utterance}]}]
 
         try:
-            async with httpx.AsyncClient(timeout=float(os.getenv("HALO_AI_UPSTREAM_TIMEOUT_SEC") or "60")) as client:
-                r = await client.post(url, headers=headers, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                txt = data["candidates"][0]["content"]["parts"][0]["text"]
-            return ProviderResult(txt, AIProviderId.CLOUD_AI, "gemini_generateContent")
+            ex = await _post_json_fields(self._http(), url, headers, payload, (_GEMINI_TEXT, _GEMINI_USAGE))
+            txt = ex.results[_GEMINI_TEXT]
+            return ProviderResult(txt, AIProviderId.CLOUD_AI, "gemini_generateContent", _usage_gemini(ex.get(_GEMINI_USAGE)))
         except Exception as e:
             return ProviderResult(
                 reply_text=f"ECHO: {user_utterance}",
@@ -150,6 +419,7 @@ class ConversationAIProvider:
     async def _openai_compatible(
         self,
         user_utterance: str,
+        session_context: Dict[str, Any],
         base_url: str,
         api_key: str,
         model: str,
@@ -163,20 +433,17 @@ class ConversationAIProvider:
             )
 
         url = base_url.rstrip("/") + "/chat/completions"
-        headers = {"Authorization": f"Bearer {api_key}"}
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         payload = {
             "model": model,
-            "messages": [{"role": "user", "content": user_utterance}],
+            "messages": _chat_messages(user_utterance, session_context),
             "temperature": 0.2,
         }
 
         try:
-            async with httpx.AsyncClient(timeout=float(os.getenv("HALO_AI_UPSTREAM_TIMEOUT_SEC") or "60")) as client:
-                r = await client.post(url, headers=headers, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                txt = data["choices"][0]["message"]["content"]
-            return ProviderResult(txt, provider_name, f"{provider_name.value}_openai_compatible")
+            ex = await _post_json_fields(self._http(), url, headers, payload, (_CHAT_TEXT, _CHAT_USAGE))
+            txt = ex.results[_CHAT_TEXT]
+            return ProviderResult(txt, provider_name, f"{provider_name.value}_openai_compatible", _usage_openai(ex.get(_CHAT_USAGE)))
         except Exception as e:
             return ProviderResult(
                 reply_text=f"ECHO: {user_utterance}",
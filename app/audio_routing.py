@@ -10,21 +10,40 @@ class AudioRoute(str, Enum):
     PAIRED_DEVICE = "paired_device"  # earbuds/headset BT
 
 
-def infer_audio_route_override_from_text(user_text: str) -> Optional[AudioRoute]:
-    t = (user_text or "").strip().lower()
+# Command phrases per route, checked in order (EN + common IT variants).
+_ROUTE_PHRASES: list[tuple[AudioRoute, tuple[str, ...]]] = [
+    # earbuds / earphones / headset
+    (AudioRoute.PAIRED_DEVICE, (
+        "use earbuds", "use earphones", "use headset",
+        "usa auricolari", "usa gli auricolari", "usa le cuffie", "usa cuffie",
+    )),
+    # phone speaker
+    (AudioRoute.PHONE_SPEAKER, (
+        "use phone speaker", "use speaker",
+        "usa altoparlante", "usa l altoparlante", "usa vivavoce", "usa il vivavoce",
+    )),
+    # glasses
+    (AudioRoute.GLASSES, (
+        "use glasses",
+        "usa occhiali", "usa gli occhiali",
+    )),
+]
+
+
+def match_audio_route_command(user_text: str) -> Optional[tuple[AudioRoute, str]]:
+    """Return (route, matched phrase) for an audio route command, if any."""
+    t = (user_text or "").strip().lower().replace("'", " ")
     if not t:
         return None
 
-    # earbuds / earphones / headset
-    if "use earbuds" in t or "use earphones" in t or "use headset" in t:
-        return AudioRoute.PAIRED_DEVICE
+    for route, phrases in _ROUTE_PHRASES:
+        for phrase in phrases:
+            if phrase in t:
+                return route, phrase
 
-    # phone speaker
-    if "use phone speaker" in t or "use speaker" in t:
-        return AudioRoute.PHONE_SPEAKER
+    return None
 
-    # glasses
-    if "use glasses" in t:
-        return AudioRoute.GLASSES
 
-    return None
+def infer_audio_route_override_from_text(user_text: str) -> Optional[AudioRoute]:
+    m = match_audio_route_command(user_text)
+    return m[0] if m is not None else None
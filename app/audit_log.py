@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.env import env_float, env_int
+from app.shared_state import worker_id
+
+
+# Async append-only audit pipeline (routing decisions).
+# - emit() never blocks the request path: events go to a bounded in-memory queue
+# - a single background writer drains the queue in batches to rotated JSONL files
+# - when the queue is saturated events are dropped and counted (the count is
+#   itself written to the log as an "audit_dropped" event)
+# - a failed write (disk full, permissions, rotation) loses that batch, is
+#   counted in write_errors, and the writer keeps draining
+# - secrets are redacted before serialization (gating spec: no tokens in logs)
+# - under the multi-worker launcher each worker writes (and rotates) its own
+#   <HALO_AUDIT_LOG_DIR>/worker-<N>/audit.jsonl
+
+
+_STOP = object()
+
+_REDACTIONS: list[tuple[re.Pattern[str], str]] = [
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._~+/=-]+"), "Bearer [REDACTED]"),
+    (re.compile(r"\b(?:sk|pplx|hf)-[A-Za-z0-9_-]{8,}"), "[REDACTED]"),
+    (re.compile(r"\bhf_[A-Za-z0-9]{8,}"), "[REDACTED]"),
+    (re.compile(r"\bAIza[0-9A-Za-z_-]{20,}"), "[REDACTED]"),
+    (re.compile(r"(?i)\b(api[_-]?key|token|secret|password)\s*[=:]\s*[^\s,;&]+"), r"\1=[REDACTED]"),
+]
+
+_SECRET_FIELDS = {"api_key", "apikey", "authorization", "token", "secret", "password"}
+
+
+def redact(value: Any) -> Any:
+    if isinstance(value, str):
+        for pat, rep in _REDACTIONS:
+            value = pat.sub(rep, value)
+        return value
+    if isinstance(value, dict):
+        return {
+            k: ("[REDACTED]" if str(k).lower() in _SECRET_FIELDS else redact(v))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class AuditLog:
+    """
+    Background JSONL writer. Disabled (no-op) when `directory` is None.
+
+    fsync policy:
+      - "always":   fsync after every batch
+      - "interval": fsync at most every `fsync_interval_sec` (default)
+      - "never":    leave it to the OS
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        queue_max: int = 10000,
+        batch_max: int = 256,
+        fsync: str = "interval",
+        fsync_interval_sec: float = 1.0,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        max_files: int = 10,
+        stop_timeout_sec: float = 5.0,
+    ) -> None:
+        self.directory = Path(directory) if directory else None
+        self.queue_max = max(1, queue_max)
+        self.batch_max = max(1, batch_max)
+        self.fsync = fsync if fsync in self.FSYNC_POLICIES else "interval"
+        self.fsync_interval_sec = max(0.0, fsync_interval_sec)
+        self.rotate_bytes = max(0, rotate_bytes)
+        self.max_files = max(1, max_files)
+        self.stop_timeout_sec = max(0.0, stop_timeout_sec)
+
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.lost = 0  # events in batches that failed to write
+        self._dropped_reported = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fh = None
+        self._last_fsync = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AuditLog":
+        directory = (os.getenv("HALO_AUDIT_LOG_DIR") or "").strip() or None
+        wid = worker_id()
+        if directory and wid is not None:
+            directory = os.path.join(directory, f"worker-{wid}")
+        return cls(
+            directory=directory,
+            queue_max=env_int("HALO_AUDIT_QUEUE_MAX", 10000),
+            batch_max=env_int("HALO_AUDIT_BATCH_MAX", 256),
+            fsync=(os.getenv("HALO_AUDIT_FSYNC") or "interval").strip().lower(),
+            fsync_interval_sec=env_float("HALO_AUDIT_FSYNC_INTERVAL_SEC", 1.0),
+            rotate_bytes=env_int("HALO_AUDIT_ROTATE_BYTES", 64 * 1024 * 1024),
+            max_files=env_int("HALO_AUDIT_MAX_FILES", 10),
+            stop_timeout_sec=env_float("HALO_AUDIT_STOP_TIMEOUT_SEC", 5.0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self.directory / "audit.jsonl" if self.directory else None
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.queue_max)
+        self._task = asyncio.create_task(self._run(), name="halo-audit-writer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # Everything queued is flushed, unless the writer does not finish within
+        # stop_timeout_sec (then it is cancelled and the rest is dropped).
+        task = self._task
+        try:
+            if not task.done():
+                await asyncio.wait_for(self._queue.put(_STOP), timeout=self.stop_timeout_sec)
+            await asyncio.wait_for(task, timeout=self.stop_timeout_sec)
+        except asyncio.TimeoutError:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    def emit(self, kind: str, **fields: Any) -> None:
+        """Enqueue an event without blocking; drop-with-count when saturated."""
+        if self._queue is None:
+            return
+        event = {"ts": datetime.now(timezone.utc).isoformat(), "kind": kind, **fields}
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def emit_routing(
+        self,
+        tenant_id: str,
+        session_id: str,
+        provider_requested: str,
+        provider_applied: str,
+        routing_reason: str,
+        latency_ms: float,
+    ) -> None:
+        self.emit(
+            "routing",
+            tenant_id=tenant_id,
+            session_id=session_id,
+            provider_requested=provider_requested,
+            provider_applied=provider_applied,
+            routing_reason=routing_reason,
+            latency_ms=round(latency_ms, 3),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "lost": self.lost,
+        }
+
+    async def _run(self) -> None:
+        stopping = False
+        try:
+            while not stopping:
+                item = await self._queue.get()
+                batch: List[Dict[str, Any]] = []
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.batch_max or self._queue.empty():
+                        break
+                    item = self._queue.get_nowait()
+
+                if self.dropped > self._dropped_reported:
+                    batch.append({
+                        "ts": datetime.now(timezone.utc).isoformat(),
+                        "kind": "audit_dropped",
+                        "dropped_total": self.dropped,
+                        "dropped_since_last": self.dropped - self._dropped_reported,
+                    })
+                    self._dropped_reported = self.dropped
+
+                if batch:
+                    # Serialization + disk I/O stay off the event loop.
+                    try:
+                        await asyncio.to_thread(self._write_batch, batch, stopping)
+                    except Exception:
+                        self.write_errors += 1
+                        self.lost += len(batch)
+                        await asyncio.to_thread(self._discard_handle)
+        finally:
+            try:
+                await asyncio.to_thread(self._close)
+            except Exception:
+                self.write_errors += 1
+
+    def _write_batch(self, batch: List[Dict[str, Any]], force_fsync: bool) -> None:
+        data = "".join(
+            json.dumps(redact(ev), ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+            for ev in batch
+        ).encode("utf-8")
+
+        fh = self._open()
+        if self.rotate_bytes and fh.tell() > 0 and fh.tell() + len(data) > self.rotate_bytes:
+            self._rotate()
+            fh = self._open()
+
+        fh.write(data)
+        fh.flush()
+        self.written += len(batch)
+
+        now = time.monotonic()
+        if self.fsync == "always" or (
+            self.fsync == "interval" and (force_fsync or now - self._last_fsync >= self.fsync_interval_sec)
+        ):
+            os.fsync(fh.fileno())
+            self._last_fsync = now
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+        return self._fh
+
+    def _close(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            if self.fsync != "never":
+                os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+
+    def _discard_handle(self) -> None:
+        # Reopen on the next batch (the file may have been rotated or removed).
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            try:
+                fh.close()
+            except OSError:
+                pass
+
+    def _rotate(self) -> None:
+        self._close()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        os.replace(self.path, self.directory / f"audit-{stamp}.jsonl")
+
+        rotated = sorted(self.directory.glob("audit-*.jsonl"))
+        for old in rotated[: max(0, len(rotated) - (self.max_files - 1))]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
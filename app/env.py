@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import os
+
+
+# Typed HALO_* environment lookups shared by the components' from_env()
+# constructors: unset, blank or malformed values fall back to the default.
+
+_TRUE = ("1", "true", "yes", "y", "on")
+_FALSE = ("0", "false", "no", "n", "off")
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float((os.getenv(name) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Opt-in flags (default False) need a true value; default-on flags need an explicit false one."""
+    v = (os.getenv(name) or "").strip().lower()
+    return v not in _FALSE if default else v in _TRUE
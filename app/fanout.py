@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.ai_provider import ConversationAIProvider, ProviderResult, _upstream_origin, estimate_prompt_tokens
+from app.env import env_flag, env_float, env_int
+from app.provider_selection import provider_enabled
+from app.provider_types import AIProviderId
+
+
+# Opt-in fan-out for research-type queries (HALO_AI_FANOUT=1).
+#
+# Queries the policy routes to Perplexity by search intent are sent to Perplexity
+# and the secondary providers (HALO_AI_FANOUT_PROVIDERS) concurrently, under one
+# total deadline (HALO_AI_FANOUT_DEADLINE_SEC). Providers still running at the
+# deadline are cancelled and the answer is chosen among those that finished.
+#
+# Strategies (HALO_AI_FANOUT_STRATEGY):
+# - first_valid: first non-degraded reply wins, the rest are cancelled
+# - longest_with_sources: wait for all; replies with citations first, then longest
+# - score: wait for all; local heuristic (query coverage, sources, length, hedging)
+#
+# Providers excluded by bootstrap gating (HALO_AI_PROVIDERS_*) are never queried.
+# Providers are only added while the estimated cost of the whole fan-out stays
+# under HALO_AI_FANOUT_MAX_COST_USD, Perplexity included: when Perplexity alone
+# does not fit, the plan is empty and the caller makes a plain single call.
+# When no reply is usable, the per-provider failure reasons end up in the
+# routing note (degraded_fanout_0of3[perplexity=...,openai=deadline]).
+# Cancelled providers are returned in FanoutResult.unfinished: the caller bills
+# their estimated prompt tokens, like cancelled speculative generations.
+
+STRATEGIES = ("first_valid", "longest_with_sources", "score")
+
+CostFn = Callable[[AIProviderId, int, int], float]
+
+
+def fanout_enabled() -> bool:
+    return env_flag("HALO_AI_FANOUT")
+
+
+@dataclass(frozen=True)
+class FanoutConfig:
+    secondaries: Tuple[AIProviderId, ...] = (AIProviderId.OPENAI, AIProviderId.CLOUD_AI)
+    strategy: str = "longest_with_sources"
+    deadline_sec: float = 8.0
+    max_cost_usd: float = 0.02
+    est_completion_tokens: int = 400
+
+    @classmethod
+    def from_env(cls) -> "FanoutConfig":
+        secondaries: List[AIProviderId] = []
+        for raw in (os.getenv("HALO_AI_FANOUT_PROVIDERS") or "openai,cloud_ai").split(","):
+            try:
+                p = AIProviderId(raw.strip().lower())
+            except ValueError:
+                continue
+            if p != AIProviderId.PERPLEXITY and p not in secondaries:
+                secondaries.append(p)
+        strategy = (os.getenv("HALO_AI_FANOUT_STRATEGY") or "longest_with_sources").strip().lower()
+        return cls(
+            secondaries=tuple(secondaries),
+            strategy=strategy if strategy in STRATEGIES else "longest_with_sources",
+            deadline_sec=max(0.1, env_float("HALO_AI_FANOUT_DEADLINE_SEC", 8.0)),
+            max_cost_usd=max(0.0, env_float("HALO_AI_FANOUT_MAX_COST_USD", 0.02)),
+            est_completion_tokens=env_int("HALO_AI_FANOUT_EST_COMPLETION_TOKENS", 400),
+        )
+
+
+@dataclass
+class FanoutResult:
+    chosen: ProviderResult
+    completed: List[ProviderResult] = field(default_factory=list)  # every finished reply (for usage accounting)
+    unfinished: List[AIProviderId] = field(default_factory=list)  # cancelled at the deadline (or after first_valid), plan order
+    errors: Dict[AIProviderId, str] = field(default_factory=dict)  # why a provider gave no usable reply
+
+
+def _valid(r: ProviderResult) -> bool:
+    return bool((r.reply_text or "").strip()) and not r.routing_note.startswith(("degraded_", "echo_"))
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_HEDGES = (
+    "i don't have access", "i do not have access", "as of my knowledge cutoff", "i can't browse",
+    "i cannot browse", "non ho accesso", "non posso navigare", "alla data del mio",
+)
+
+
+def score_reply(query: str, r: ProviderResult) -> float:
+    """Local quality heuristic (higher is better): query coverage, sources, length, no hedging."""
+    text = (r.reply_text or "").lower()
+    q = {w for w in _WORD.findall(query.lower()) if len(w) > 3}
+    coverage = len(q & set(_WORD.findall(text))) / len(q) if q else 0.0
+    sources = min(len(r.citations), 5) / 5
+    length = min(len(text), 1200) / 1200
+    hedging = 1.0 if any(h in text for h in _HEDGES) else 0.0
+    return 1.5 * coverage + sources + length - 2.0 * hedging
+
+
+def choose(strategy: str, query: str, results: List[ProviderResult]) -> Optional[ProviderResult]:
+    """Pick among finished replies (in completion order); None if none is valid."""
+    valid = [r for r in results if _valid(r)]
+    if not valid:
+        return None
+    if strategy == "first_valid":
+        return valid[0]
+    if strategy == "score":
+        return max(valid, key=lambda r: score_reply(query, r))
+    return max(valid, key=lambda r: (bool(r.citations), len(r.reply_text)))
+
+
+def plan_providers(
+    user_utterance: str,
+    session_context: Dict[str, Any],
+    cfg: FanoutConfig,
+    cost_usd: CostFn,
+) -> List[AIProviderId]:
+    """
+    Perplexity plus the configured secondaries that are enabled and fit the cost
+    cap (rough token estimate); empty when Perplexity itself is gated off or over the cap.
+    """
+    est_prompt = estimate_prompt_tokens(user_utterance, session_context)
+
+    total = cost_usd(AIProviderId.PERPLEXITY, est_prompt, cfg.est_completion_tokens)
+    if not provider_enabled(AIProviderId.PERPLEXITY) or total > cfg.max_cost_usd:
+        return []
+    plan = [AIProviderId.PERPLEXITY]
+    for p in cfg.secondaries:
+        if not provider_enabled(p) or _upstream_origin(p) is None:
+            continue  # gated off, or not configured (would only echo)
+        c = cost_usd(p, est_prompt, cfg.est_completion_tokens)
+        if total + c > cfg.max_cost_usd:
+            continue
+        total += c
+        plan.append(p)
+    return plan
+
+
+async def generate_fanout(
+    provider: ConversationAIProvider,
+    user_utterance: str,
+    session_context: Dict[str, Any],
+    cfg: FanoutConfig,
+    cost_usd: CostFn,
+    plan: Optional[List[AIProviderId]] = None,
+) -> FanoutResult:
+    if plan is None:
+        plan = plan_providers(user_utterance, session_context, cfg, cost_usd)
+    tasks: Dict[asyncio.Task, AIProviderId] = {
+        asyncio.create_task(provider.generate_reply(user_utterance, session_context, p)): p for p in plan
+    }
+    completed: List[ProviderResult] = []
+    errors: Dict[AIProviderId, str] = {}
+    pending = set(tasks)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + cfg.deadline_sec
+    answered = False  # first_valid already has its reply: the rest is cancelled, not late
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.cancelled():
+                    errors[tasks[t]] = "cancelled"
+                elif t.exception() is not None:
+                    errors[tasks[t]] = type(t.exception()).__name__
+                else:
+                    completed.append(t.result())
+                    if not _valid(t.result()):
+                        errors[tasks[t]] = t.result().routing_note or "empty_reply"
+            if cfg.strategy == "first_valid" and any(_valid(r) for r in completed):
+                answered = True
+                break
+    finally:
+        for t in pending:
+            t.cancel()
+
+    unfinished = [p for t, p in tasks.items() if t in pending]
+    for p in unfinished:
+        errors.setdefault(p, "cancelled" if answered else "deadline")
+    n = len(plan)
+    chosen = choose(cfg.strategy, user_utterance, completed)
+    if chosen is None:
+        # Nothing usable in time: same shape as a degraded single-provider call.
+        reasons = ",".join(f"{p.value}={errors.get(p, 'unknown')}" for p in plan)
+        return FanoutResult(
+            chosen=ProviderResult(
+                reply_text=f"ECHO: {user_utterance}",
+                provider_applied=AIProviderId.PERPLEXITY,
+                routing_note=f"degraded_fanout_{len(completed)}of{n}[{reasons}]",
+            ),
+            completed=completed,
+            unfinished=unfinished,
+            errors=errors,
+        )
+
+    note = f"fanout_{cfg.strategy}_{len(completed)}of{n}:{chosen.routing_note}"
+    return FanoutResult(
+        chosen=ProviderResult(chosen.reply_text, chosen.provider_applied, note, chosen.usage, chosen.citations),
+        completed=completed,
+        unfinished=unfinished,
+        errors=errors,
+    )
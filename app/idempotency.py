@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.env import env_float, env_int
+from app.provider_selection import _norm
+
+
+# Coalescing of client retries for POST /api/v1/conversation/message.
+#
+# Glasses on flaky links resend the same request after a client-side timeout.
+# A request is identified by its Idempotency-Key header or, without one, by a
+# fingerprint of tenant + session + normalized utterance (+ audio route hint):
+# - while the first request is still running, duplicates join its task
+#   (the work is shielded, so the first client disconnecting does not cancel it)
+# - once it finished, duplicates get the stored response for HALO_IDEMPOTENCY_TTL_SEC
+#   (Idempotency-Key) or HALO_IDEMPOTENCY_FINGERPRINT_TTL_SEC (fingerprint, default 3 s)
+# Failed requests are not stored, so a retry after an error runs again.
+#
+# Without a key the user may genuinely repeat themselves ("tell me another joke"),
+# so the fingerprint window is short, and replies the caller marks as not
+# cacheable (local intents such as the time) are only joined while running.
+#
+# Reusing an Idempotency-Key with a different request is a conflict (422).
+# State is per worker: in multi-worker mode a retry landing on another worker runs again.
+
+
+class IdempotencyConflict(ValueError):
+    """Idempotency-Key already used for a different request."""
+
+
+def fingerprint(tenant_id: str, session_id: str, user_utterance: str, audio_route_request: Any = None) -> str:
+    raw = "\x1f".join((tenant_id, session_id, _norm(user_utterance), str(audio_route_request or "")))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_sec: float = 10.0, max_entries: int = 4096, fingerprint_ttl_sec: float = 3.0) -> None:
+        self.ttl_sec = ttl_sec
+        self.fingerprint_ttl_sec = fingerprint_ttl_sec
+        self.max_entries = max(1, max_entries)
+
+        self._inflight: Dict[str, Tuple[str, asyncio.Task]] = {}
+        self._results: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()  # key -> (expires, fp, result)
+
+        self.executed = 0
+        self.joined = 0  # duplicate arrived while the first request was running
+        self.replayed = 0  # duplicate answered from the result store
+        self.conflicts = 0
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        return cls(
+            ttl_sec=env_float("HALO_IDEMPOTENCY_TTL_SEC", 10.0),
+            max_entries=env_int("HALO_IDEMPOTENCY_MAX_ENTRIES", 4096),
+            fingerprint_ttl_sec=env_float("HALO_IDEMPOTENCY_FINGERPRINT_TTL_SEC", 3.0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0
+
+    def _cached(self, key: str, fp: str) -> Optional[Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, stored_fp, result = entry
+        if time.monotonic() > expires:
+            del self._results[key]
+            return None
+        if stored_fp != fp:
+            self.conflicts += 1
+            raise IdempotencyConflict(key)
+        self.replayed += 1
+        return result
+
+    def _store(self, key: str, fp: str, result: Any, ttl_sec: float) -> None:
+        self._results.pop(key, None)
+        while len(self._results) >= self.max_entries:
+            self._results.popitem(last=False)
+        self._results[key] = (time.monotonic() + ttl_sec, fp, result)
+
+    async def run(
+        self,
+        key: str,
+        fp: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl_sec: Optional[float] = None,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Run factory() once per key within the TTL; duplicates (same key and
+        fingerprint) join the running task or get the stored result.
+        ttl_sec overrides the store TTL for this key; results for which
+        cacheable() is false are not stored (duplicates only join in flight).
+        """
+        if not self.enabled:
+            return await factory()
+
+        cached = self._cached(key, fp)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != fp:
+                self.conflicts += 1
+                raise IdempotencyConflict(key)
+            self.joined += 1
+            return await asyncio.shield(inflight[1])
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = (fp, task)
+        self.executed += 1
+
+        def _done(t: asyncio.Task) -> None:
+            if self._inflight.get(key, (None, None))[1] is t:
+                del self._inflight[key]
+            if t.cancelled() or t.exception() is not None:
+                return
+            ttl = self.ttl_sec if ttl_sec is None else ttl_sec
+            if ttl > 0 and (cacheable is None or cacheable(t.result())):
+                self._store(key, fp, t.result(), ttl)
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    async def stop(self) -> None:
+        tasks = [t for _, t in self._inflight.values()]
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "ttl_sec": self.ttl_sec,
+            "fingerprint_ttl_sec": self.fingerprint_ttl_sec,
+            "inflight": len(self._inflight),
+            "stored": sum(1 for exp, _, _ in self._results.values() if exp >= now),
+            "executed": self.executed,
+            "joined": self.joined,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts,
+        }
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Incremental JSON field extraction for upstream responses.
+#
+# Upstream bodies are fed chunk by chunk; only the values at the requested
+# paths are decoded (json.loads on their raw bytes), everything else is
+# scanned structurally and discarded. Object keys are only decoded below a
+# requested path prefix, so large sibling arrays (e.g. Perplexity
+# search_results) cost a scan but no Python objects.
+#
+# Paths are tuples of object keys (str) and array indices (int), e.g.
+# ("choices", 0, "message", "content").
+
+Path = Tuple[Any, ...]
+
+# Next token: a whole string (group 1 is None if it is not terminated yet in
+# the buffer) or a structural character.
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(")?|[{}\[\],:]')
+# Inside a subtree that cannot contain a target: jump straight to the next
+# bracket (or an unterminated string), consuming complete strings in one C call.
+_DEAD_SKIP = re.compile(rb'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+class JsonFieldExtractor:
+    def __init__(self, targets: Iterable[Path]) -> None:
+        self.targets = {tuple(t) for t in targets}
+        self._prefixes = {t[:i] for t in self.targets for i in range(len(t) + 1)}
+        self.results: Dict[Path, Any] = {}
+
+        self._buf = bytearray()
+        self._pos = 0
+        # Frames: [is_object, key_or_index, expecting_key, live]; "live" frames sit
+        # on a path that can still lead to a target, all others are just skipped.
+        self._stack: List[list] = []
+        self._capture: Optional[Tuple[Path, int, int]] = None  # (path, start, depth)
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def _path(self) -> Path:
+        return tuple(f[1] for f in self._stack)
+
+    def _push(self, is_object: bool) -> None:
+        stack = self._stack
+        live = not stack or (stack[-1][3] and self._path() in self._prefixes)
+        stack.append([is_object, None if is_object else 0, is_object, live])
+
+    def _begin_value(self, value_start: int) -> None:
+        if self._capture is None and self._stack[-1][3]:
+            path = self._path()
+            if path in self.targets and path not in self.results:
+                self._capture = (path, value_start, len(self._stack))
+
+    def _end_value(self, value_end: int) -> None:
+        cap = self._capture
+        if cap is not None and cap[2] == len(self._stack):
+            path, start, _ = cap
+            self._capture = None
+            try:
+                self.results[path] = json.loads(bytes(self._buf[start:value_end]))
+            except ValueError:
+                pass  # empty array slot / malformed value: treat as missing
+            if len(self.results) == len(self.targets):
+                self._done = True
+
+    def feed(self, chunk: bytes) -> None:
+        if self._done or not chunk:
+            return
+
+        # Drop everything already consumed (and not part of an open capture).
+        keep = self._capture[1] if self._capture is not None else self._pos
+        if keep:
+            del self._buf[:keep]
+            self._pos -= keep
+            if self._capture is not None:
+                path, start, depth = self._capture
+                self._capture = (path, start - keep, depth)
+        self._buf += chunk
+
+        buf = self._buf
+        stack = self._stack
+        pos = self._pos
+        n = len(buf)
+        while not self._done:
+            if self._capture is None and stack and not stack[-1][3]:
+                pos = _DEAD_SKIP.match(buf, pos).end()
+                if pos >= n or buf[pos] == 0x22:
+                    break  # need more data (end of buffer / unterminated string)
+                if buf[pos] in b"{[":
+                    stack.append([False, None, False, False])
+                else:
+                    stack.pop()
+                pos += 1
+                continue
+
+            m = _TOKEN.search(buf, pos)
+            if m is None:
+                pos = n
+                break
+            i = m.start()
+            c = buf[i]
+
+            if c == 0x22:  # '"'
+                if m.group(1) is None:
+                    pos = i  # string continues in the next chunk
+                    break
+                top = stack[-1] if stack else None
+                if top is not None and top[0] and top[2]:
+                    # Object key: decoded only where it can lead to a target.
+                    top[1] = json.loads(bytes(buf[i:m.end()])) if top[3] else None
+                    top[2] = False
+                pos = m.end()
+                continue
+
+            pos = i + 1
+            if c == 0x3A:  # ':'
+                self._begin_value(pos)
+            elif c == 0x7B:  # '{'
+                self._push(True)
+            elif c == 0x5B:  # '['
+                self._push(False)
+                self._begin_value(pos)
+            elif c == 0x2C:  # ','
+                self._end_value(i)
+                if stack:
+                    top = stack[-1]
+                    if top[0]:
+                        top[2] = True
+                    else:
+                        top[1] += 1
+                        self._begin_value(pos)
+            else:  # '}' or ']'
+                self._end_value(i)
+                if stack:
+                    stack.pop()
+                if not stack:
+                    self._done = True
+
+        self._pos = pos
+
+    def get(self, path: Path, default: Any = None) -> Any:
+        return self.results.get(tuple(path), default)
+
+
+async def extract_json_fields(byte_chunks, targets: Iterable[Path]) -> JsonFieldExtractor:
+    """Feed an async byte iterator (e.g. httpx Response.aiter_bytes()) into an extractor."""
+    ex = JsonFieldExtractor(targets)
+    async for chunk in byte_chunks:
+        ex.feed(chunk)
+        if ex.done:
+            # Keep draining so the connection can go back to the pool.
+            async for _ in byte_chunks:
+                pass
+            break
+    return ex
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.audio_routing import AudioRoute, match_audio_route_command
+from app.env import env_flag
+from app.localization import EN_MONTHS, EN_WEEKDAYS, IT_MONTHS, IT_WEEKDAYS, detect_lang, local_tz
+from app.provider_selection import (
+    _INTENT_TOKENS,
+    _norm,
+    bootstrap_enabled_providers,
+    match_ai_provider_override,
+    provider_enabled,
+)
+from app.provider_types import AIProviderId
+
+
+# Local fast path: deterministic intents answered before provider dispatch,
+# with templated EN/IT replies and no upstream LLM call.
+#
+# Handlers are plain callables (utterance, context) -> LocalIntentResult | None,
+# tried in registration order; register_local_intent() adds new ones.
+# Commands only short-circuit when the utterance is *just* the command
+# ("usa perplexity"), so "use earbuds and tell me the news" still goes upstream.
+
+
+@dataclass(frozen=True)
+class LocalIntentResult:
+    intent: str  # reported as guardrail:<intent>
+    reply_text: str
+    audio_route: Optional[AudioRoute] = None
+    ai_provider: Optional[AIProviderId] = None
+    audio_cues: Tuple[str, ...] = ()
+
+
+LocalIntentHandler = Callable[[str, Dict[str, Any]], Optional[LocalIntentResult]]
+
+_HANDLERS: List[LocalIntentHandler] = []
+
+
+def register_local_intent(handler: LocalIntentHandler) -> LocalIntentHandler:
+    _HANDLERS.append(handler)
+    return handler
+
+
+def local_intents_enabled() -> bool:
+    """HALO_LOCAL_INTENTS=0 keeps only the ping guardrail (default on)."""
+    return env_flag("HALO_LOCAL_INTENTS", default=True)
+
+
+# Handlers that stay on with HALO_LOCAL_INTENTS=0 (by name, independent of registration order).
+_ALWAYS_ON = {"_ping"}
+
+
+def answer_local_intent(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    handlers = _HANDLERS if local_intents_enabled() else [h for h in _HANDLERS if h.__name__ in _ALWAYS_ON]
+    for handler in handlers:
+        res = handler(user_text, context)
+        if res is not None:
+            return res
+    return None
+
+
+# --- helpers ---
+
+# Politeness / glue words that may surround a bare command.
+_FILLER = {
+    "halo", "hey", "ok", "okay", "please", "now", "to", "the", "a", "on", "instead", "for", "me",
+    "per", "favore", "ora", "adesso", "a", "al", "alla", "allo", "il", "lo", "la", "le", "gli", "l",
+    "su", "di", "grazie", "thanks",
+}
+
+_PROVIDER_NAMES = {
+    AIProviderId.OPENAI: "ChatGPT",
+    AIProviderId.PERPLEXITY: "Perplexity",
+    AIProviderId.CLAUDE: "Claude",
+    AIProviderId.HUGGINGFACE: "Hugging Face",
+    AIProviderId.CLOUD_AI: "Gemini",
+    AIProviderId.NOTION_CALENDAR: "Notion Calendar",
+    AIProviderId.PRO_ACTOR: "Pro Actor",
+    AIProviderId.ECHO: "Echo",
+}
+
+_ROUTE_NAMES = {
+    "en": {AudioRoute.GLASSES: "the glasses", AudioRoute.PHONE_SPEAKER: "the phone speaker", AudioRoute.PAIRED_DEVICE: "your earbuds"},
+    "it": {AudioRoute.GLASSES: "gli occhiali", AudioRoute.PHONE_SPEAKER: "l'altoparlante del telefono", AudioRoute.PAIRED_DEVICE: "gli auricolari"},
+}
+
+
+def _only(tokens: set[str], allowed: set[str]) -> bool:
+    return not (tokens - allowed - _FILLER)
+
+
+def _is_query(t: str, queries: Tuple[str, ...], allowed: frozenset[str] = frozenset()) -> bool:
+    """The whole (normalized) utterance is one of the queries, fillers (and allowed words) aside."""
+    return any(q in t and _only(set(t.replace(q, " ", 1).split()), set(allowed)) for q in queries)
+
+
+# --- intents (registration order = priority) ---
+
+
+@register_local_intent
+def _ping(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    # Deterministic ping guardrail (integration tests)
+    if (user_text or "").strip().lower() in {"ping", "second ping"}:
+        return LocalIntentResult("ping", "pong", audio_cues=("pong",))
+    return None
+
+
+@register_local_intent
+def _audio_route_switch(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    m = match_audio_route_command(user_text)
+    if m is None:
+        return None
+    route, phrase = m
+    normalized = (user_text or "").lower().replace("'", " ")
+    rest = set(_norm(normalized.replace(phrase, " ", 1)).split())
+    if not _only(rest, set()):
+        return None
+
+    lang = detect_lang(set(_norm(normalized).split()))
+    name = _ROUTE_NAMES[lang][route]
+    reply = f"Ok, audio su {name}." if lang == "it" else f"Okay, switching audio to {name}."
+    return LocalIntentResult("audio_route", reply, audio_route=route, audio_cues=("confirm",))
+
+
+@register_local_intent
+def _provider_switch(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    m = match_ai_provider_override(user_text)
+    if m is None:
+        return None
+    tokens = set(_norm(user_text).split())
+    if not _only(tokens, set(m.tokens) | _INTENT_TOKENS):
+        return None
+
+    name = _PROVIDER_NAMES.get(m.provider, m.provider.value)
+    if not provider_enabled(m.provider):
+        reply = (
+            f"{name} è disabilitato dalla configurazione." if detect_lang(tokens) == "it"
+            else f"{name} is disabled by configuration."
+        )
+        return LocalIntentResult("provider_switch_blocked", reply)
+    reply = f"Ok, passo a {name}." if detect_lang(tokens) == "it" else f"Okay, switching to {name}."
+    intent = f"provider_switch(fuzzy={m.score:.2f})" if m.fuzzy else "provider_switch"
+    return LocalIntentResult(intent, reply, ai_provider=m.provider, audio_cues=("confirm",))
+
+
+_POLICY_QUERIES = (
+    "quali motori sono attivi", "quali motori sono abilitati", "quali provider sono attivi",
+    "which engines are active", "which engines are enabled", "which providers are active",
+    "which providers are enabled", "what engines are active", "what providers are enabled",
+)
+
+
+@register_local_intent
+def _policy_query(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    t = _norm(user_text)
+    # The whole utterance must be the query (fillers aside), like the other commands.
+    if not _is_query(t, _POLICY_QUERIES):
+        return None
+
+    lang = detect_lang(set(t.split()))
+    active = [
+        _PROVIDER_NAMES[p] for p in bootstrap_enabled_providers()
+        if p not in (AIProviderId.ECHO, AIProviderId.NOTION_CALENDAR, AIProviderId.PRO_ACTOR)
+    ]
+    if not active:
+        reply = (
+            "Nessun motore attivo. Di' \"abilita tutti i motori\" o aggiorna la configurazione."
+            if lang == "it" else
+            "No engines are active. Say \"enable all engines\" or update the configuration."
+        )
+    elif lang == "it":
+        reply = "Motori attivi: " + ", ".join(active) + "."
+    else:
+        reply = "Active engines: " + ", ".join(active) + "."
+    return LocalIntentResult("policy_query", reply)
+
+
+_TIME_QUERIES = ("what time is it", "what s the time", "what is the time", "che ore sono", "che ora è", "che ora e")
+_DATE_QUERIES = (
+    "what day is it", "what s the date", "what is the date", "what s today s date", "what is today s date",
+    "che giorno è", "che giorno e", "che data è", "che data e", "quanti ne abbiamo",
+)
+
+
+@register_local_intent
+def _time_date(user_text: str, context: Dict[str, Any]) -> Optional[LocalIntentResult]:
+    t = _norm(user_text)
+    # "what time is it in Tokyo" / "che giorno è domani" go upstream
+    is_time = _is_query(t, _TIME_QUERIES)
+    is_date = _is_query(t, _DATE_QUERIES, frozenset({"today", "oggi"}))
+    if not (is_time or is_date):
+        return None
+
+    now = context.get("now") or datetime.now(local_tz())
+    lang = detect_lang(set(t.split()))
+    if is_time:
+        hhmm = now.strftime("%H:%M")
+        reply = f"Sono le {hhmm}." if lang == "it" else f"It's {hhmm}."
+        return LocalIntentResult("time", reply)
+
+    if lang == "it":
+        reply = f"Oggi è {IT_WEEKDAYS[now.weekday()]} {now.day} {IT_MONTHS[now.month - 1]} {now.year}."
+    else:
+        reply = f"Today is {EN_WEEKDAYS[now.weekday()]}, {now.day} {EN_MONTHS[now.month - 1]} {now.year}."
+    return LocalIntentResult("date", reply)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+from datetime import timezone, tzinfo
+
+
+# EN/IT calendar names, language detection and the local timezone, shared by
+# the local intents (time/date replies) and the calendar action stage.
+
+IT_WEEKDAYS = ("lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica")
+IT_MONTHS = (
+    "gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno",
+    "luglio", "agosto", "settembre", "ottobre", "novembre", "dicembre",
+)
+EN_WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+EN_MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+# Tokens that mark an utterance as Italian (commands, time/date and calendar words).
+IT_MARKERS = frozenset({
+    "usa", "passa", "imposta", "attiva", "seleziona", "che", "quali", "sono", "motori", "attivi",
+    "ore", "ora", "giorno", "oggi", "data", "auricolari", "cuffie", "occhiali", "altoparlante",
+    "vivavoce", "abbiamo", "è", "e", "quale",
+    "domani", "dopodomani", "stasera", "alle", "tra", "fra", "riunione", "appuntamento",
+    "chiamata", "pranzo", "cena", "con", "aggiungi", "crea", "fissa", "metti", "calendario", "agenda",
+})
+
+
+def detect_lang(tokens: set[str]) -> str:
+    """"it" when any normalized token is an Italian marker, else "en"."""
+    return "it" if tokens & IT_MARKERS else "en"
+
+
+def local_tz() -> tzinfo:
+    """HALO_LOCAL_TZ (IANA name, e.g. Europe/Rome); UTC when unset or unknown."""
+    name = (os.getenv("HALO_LOCAL_TZ") or "").strip()
+    if not name:
+        return timezone.utc
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        return timezone.utc
@@ -1,18 +1,40 @@
 from __future__ import annotations
+import asyncio
+import hmac
 import os
 import threading
+import time
 
-from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 from typing import Any, Dict, List
 
 from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 
-from app.ai_provider import ConversationAIProvider
+from app.ai_provider import LOCAL_PROVIDERS, ConversationAIProvider, estimate_prompt_tokens
+from app.audit_log import AuditLog
+from app.fanout import FanoutConfig, fanout_enabled, generate_fanout, plan_providers
+from app.idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+from app.notion_calendar import CalendarEvent, default_duration_min, event_from_utterance, event_uid, show_event_action
+from app.local_intents import answer_local_intent
+from app.profiling import Profiling, StageTimer
 from app.audio_routing import AudioRoute, infer_audio_route_override_from_text
 from app.provider_types import AIProviderId
-from app.provider_selection import infer_ai_provider_override_from_text, pick_provider_for_request
+from app.provider_selection import (
+    _norm,
+    gate_provider,
+    is_search_query,
+    match_ai_provider_override,
+    pick_provider_for_request,
+    provider_enabled,
+)
+from app.session_snapshot import SessionSnapshot
+from app.shared_state import get_shared_state
+from app.speculation import Speculation, SpeculationStore
+from app.usage_accounting import UsageAccounting
 
 
 class ConversationRequest(BaseModel):
@@ -21,6 +43,12 @@ class ConversationRequest(BaseModel):
     audio_route_request: AudioRoute | None = None  # MVP hint (client preference/policy)
 
 
+class ClientAction(BaseModel):
+    type: str  # e.g. notion_calendar.show_event
+    url: str  # deep link the client opens (cron://...)
+    event: Dict[str, Any] = Field(default_factory=dict)
+
+
 class ConversationResponse(BaseModel):
     session_id: str
     reply_text: str
@@ -32,16 +60,95 @@ class ConversationResponse(BaseModel):
     ai_provider_requested: str
     ai_provider_applied: str
     ai_routing_reason: str
+    citations: List[str] = Field(default_factory=list)
+    client_actions: List[ClientAction] = Field(default_factory=list)
+
+
+class CalendarEventRequest(BaseModel):
+    # Either an utterance to parse ("riunione domani alle 15") or explicit fields.
+    utterance: str | None = None
+    title: str | None = None
+    start_utc: datetime | None = None
+    end_utc: datetime | None = None
+    ical_uid: str | None = None
+
+
+class CalendarBatchRequest(BaseModel):
+    session_id: str | None = None
+    events: List[CalendarEventRequest]
+
+
+class CalendarBatchResponse(BaseModel):
+    client_actions: List[ClientAction] = Field(default_factory=list)
+    errors: List[Dict[str, Any]] = Field(default_factory=list)  # {"index", "error"} per rejected event
+
+
+class PartialTranscriptRequest(BaseModel):
+    session_id: str
+    partial_utterance: str
+    audio_route_request: AudioRoute | None = None
+
+
+class PartialTranscriptResponse(BaseModel):
+    session_id: str
+    audio_route_predicted: AudioRoute
+    ai_provider_predicted: str
+    ai_routing_reason: str
+    generation_started: bool = False
+
+
+provider = ConversationAIProvider()
+
+# Audit trail for routing decisions (no-op unless HALO_AUDIT_LOG_DIR is set)
+audit_log = AuditLog.from_env()
+
+# Per-tenant token/cost counters + budget throttle (flushed if HALO_USAGE_FLUSH_PATH is set)
+usage_accounting = UsageAccounting.from_env()
+
+# Session/tenant snapshots for fast restarts (single-process mode, HALO_SNAPSHOT_PATH)
+session_snapshot = SessionSnapshot.from_env()
+
+# Loop-lag monitor, sampling profiler, slow-request capture (HALO_PROFILING=1)
+profiling = Profiling.from_env()
+
+# Speculative routing/warm-up/generation on partial STT transcripts
+speculation = SpeculationStore.from_env()
+speculation.on_wasted_result = lambda spec, res: usage_accounting.record(spec.tenant_id, res.provider_applied, res.usage)
+# Cancelled in flight: the prompt may already be billed, so account for its estimate.
+speculation.on_cancelled = lambda spec: usage_accounting.record(
+    spec.tenant_id, spec.requested, {"prompt_tokens": spec.est_prompt_tokens, "completion_tokens": 0}
+)
+
+# Coalescing of resent conversation requests (Idempotency-Key or request fingerprint)
+idempotency = IdempotencyStore.from_env()
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    await audit_log.start()
+    await usage_accounting.start()
+    await profiling.start()
+    if get_shared_state() is None:
+        await session_snapshot.start()
+    try:
+        yield
+    finally:
+        await idempotency.stop()
+        await speculation.stop()
+        await provider.aclose()
+        await profiling.stop()
+        await session_snapshot.stop()
+        await usage_accounting.stop()
+        await audit_log.stop()
 
 
 app = FastAPI(
     title="Halo Backend – Conversation Orchestrator",
     version="0.3.0",
     description="Conversation API with audio routing and multi-AI provider selection via voice command.",
+    lifespan=_lifespan,
 )
 
-provider = ConversationAIProvider()
-
 # MVP in-memory session state
 SESSION_STATE: Dict[str, Dict[str, Any]] = {}
 
@@ -61,14 +168,62 @@ def _max_tenants_from_env() -> int:
 
 def _enforce_distinct_tenant_cap(tenant_id: str) -> None:
     max_tenants = _max_tenants_from_env()
-    if max_tenants == 0:
+
+    shared = get_shared_state()
+    if shared is not None:
+        # Multi-worker mode (app/serve.py): the cap is global across workers.
+        if not shared.admit_tenant(tenant_id, max_tenants):
+            raise HTTPException(status_code=429, detail="Tenant capacity exceeded")
+        with TENANTS_LOCK:
+            TENANTS_SEEN.add(tenant_id)
         return
 
     with TENANTS_LOCK:
         if tenant_id not in TENANTS_SEEN:
-            if len(TENANTS_SEEN) >= max_tenants:
+            if session_snapshot.promote_tenant(tenant_id):
+                # Restored tenant: already counted via pending_restored_tenants.
+                TENANTS_SEEN.add(tenant_id)
+            elif max_tenants == 0:
+                return
+            elif len(TENANTS_SEEN) + session_snapshot.pending_restored_tenants >= max_tenants:
                 raise HTTPException(status_code=429, detail="Tenant capacity exceeded")
-            TENANTS_SEEN.add(tenant_id)
+            else:
+                TENANTS_SEEN.add(tenant_id)
+        # Keeps the snapshot's last-seen fresh (a no-op unless new or due for a refresh)
+        session_snapshot.mark_tenant(tenant_id)
+
+
+# tenant -> [minute_window, count] (single-process mode; shared memory otherwise)
+TENANT_RATE: Dict[str, List[int]] = {}
+
+
+def _rate_limit_per_min_from_env() -> int:
+    raw = (os.getenv("HALO_TENANT_RATE_LIMIT_PER_MIN") or "0").strip()
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return 0
+
+
+def _enforce_tenant_rate_limit(tenant_id: str) -> None:
+    limit = _rate_limit_per_min_from_env()
+    if limit == 0:
+        return
+
+    shared = get_shared_state()
+    if shared is not None:
+        over = shared.hit_rate_limit(tenant_id, limit)
+    else:
+        minute = int(time.time() // 60)
+        with TENANTS_LOCK:
+            w = TENANT_RATE.get(tenant_id)
+            if w is None or w[0] != minute:
+                w = TENANT_RATE[tenant_id] = [minute, 0]
+            w[1] += 1
+            over = w[1] > limit
+
+    if over:
+        raise HTTPException(status_code=429, detail="Tenant rate limit exceeded")
 
 
 
@@ -91,6 +246,67 @@ def _normalize_tenant_id(x_client_id: str | None) -> str:
     tid = (x_client_id or "default").strip()
     return tid if tid else "default"
 
+def _history_turns() -> int:
+    """
+    Conversation turns (user+assistant pairs) replayed upstream per session.
+    Configurable via HALO_AI_HISTORY_TURNS (default 0 = stateless).
+    """
+    try:
+        return max(0, int((os.getenv("HALO_AI_HISTORY_TURNS") or "0").strip()))
+    except ValueError:
+        return 0
+
+
+def _append_history(st: Dict[str, Any], user_utterance: str, reply_text: str) -> None:
+    max_turns = _history_turns()
+    if max_turns == 0:
+        return
+    history: List[Dict[str, str]] = st.setdefault("history", [])
+    history.append({"role": "user", "content": user_utterance})
+    history.append({"role": "assistant", "content": reply_text})
+    if len(history) > 2 * max_turns:
+        # Trim in chunks, down to max_turns // 2 whole turns (never an orphaned message):
+        # the replayed history then stays byte-identical until the next trim, so the
+        # provider prompt cache keeps hitting instead of missing on a sliding window.
+        del history[: len(history) - 2 * max(1, max_turns // 2)]
+        while history and history[0]["role"] != "user":
+            del history[0]
+
+
+def _require_admin(x_admin_token: str | None) -> None:
+    """
+    Admin endpoints are disabled unless HALO_ADMIN_TOKEN is configured;
+    callers must then present it via X-Admin-Token.
+    """
+    expected = (os.getenv("HALO_ADMIN_TOKEN") or "").strip()
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled (HALO_ADMIN_TOKEN not set)")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _session_known(key: str) -> bool:
+    shared = get_shared_state()
+    if shared is None:
+        if key in SESSION_STATE:
+            return True
+        # Lazy restore from the last snapshot (no-op when snapshots are disabled).
+        restored = session_snapshot.load_session(key)
+        if restored is None:
+            return False
+        SESSION_STATE[key] = {"audio_route": restored[0], "ai_provider": restored[1]}
+        return True
+    # Multi-worker mode: the session may have been opened or updated on another
+    # worker, so the shared slot always wins over the local copy.
+    loaded = shared.load_session(key)
+    if loaded is None:
+        return key in SESSION_STATE
+    st = SESSION_STATE.setdefault(key, {})
+    st["audio_route"], st["ai_provider"] = loaded
+    st["shared_base"] = loaded  # what this request started from (merge base for _publish_state)
+    return True
+
+
 def _state(tenant_id: str, session_id: str) -> Dict[str, Any]:
     key = f"{tenant_id}:{session_id}"
     if key not in SESSION_STATE:
@@ -101,6 +317,47 @@ def _state(tenant_id: str, session_id: str) -> Dict[str, Any]:
     return SESSION_STATE[key]
 
 
+def _publish_state(tenant_id: str, session_id: str, st: Dict[str, Any]) -> None:
+    """Propagate a session state change to shared memory (multi-worker) or the next snapshot."""
+    key = f"{tenant_id}:{session_id}"
+    shared = get_shared_state()
+    if shared is not None:
+        # Merge: fields this request did not change keep what other workers stored meanwhile.
+        merged = shared.store_session(key, st["audio_route"], st.get("ai_provider"), base=st.get("shared_base"))
+        st["audio_route"], st["ai_provider"] = merged
+        st["shared_base"] = merged
+    else:
+        # Only re-encoded when route/provider changed (or the last-seen is due for a refresh)
+        session_snapshot.mark_session(key, st["audio_route"], st.get("ai_provider"))
+
+
+def _route(user_utterance: str, tenant_id: str, locked: AIProviderId | None) -> tuple[AIProviderId, str, AIProviderId | None]:
+    """
+    Provider routing for an utterance: (requested, routing_reason, voice_override).
+    Side-effect free, so partial transcripts can be routed speculatively; callers persist.
+    """
+    match = match_ai_provider_override(user_utterance)
+    # A gated-off provider is reported below as policy_excluded and never persisted.
+    ai_override = match.provider if match is not None and provider_enabled(match.provider) else None
+    if match is not None:
+        locked = match.provider
+        # Phonetic (STT-mishearing) matches carry their confidence score
+        routing_reason = f"explicit_override(fuzzy={match.score:.2f})" if match.fuzzy else "explicit_override"
+    else:
+        routing_reason = "session_locked" if locked is not None else "default_policy"
+
+    if usage_accounting.over_budget(tenant_id):
+        # Budget throttle wins over session lock / override, but is not persisted:
+        # the session resumes its provider once the budget window rolls over.
+        return gate_provider(pick_provider_for_request(user_utterance, over_budget=True)), "budget_throttled", ai_override
+    requested = locked if locked is not None else pick_provider_for_request(user_utterance)
+    gated = gate_provider(requested)
+    if gated != requested:
+        # Excluded by bootstrap gating (docs/specs/ai-provider-gating.md); not persisted.
+        return gated, f"policy_excluded({requested.value})", ai_override
+    return requested, routing_reason, ai_override
+
+
 @app.get("/health", tags=["system"])
 async def health_check() -> dict:
     return {
@@ -114,10 +371,14 @@ async def health_check() -> dict:
 async def handle_conversation_message(
     payload: ConversationRequest,
     x_client_id: str | None = Header(default=None, alias="X-Client-Id"),
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
 ) -> ConversationResponse:
+    timer = StageTimer()
     session_id = payload.session_id or str(uuid4())
     tenant_id = _normalize_tenant_id(x_client_id)
     _enforce_distinct_tenant_cap(tenant_id)
+    _enforce_tenant_rate_limit(tenant_id)
+    timer.lap("admission")
     # Tenant capacity guardrail (MVP multi-client)
     if tenant_id not in TENANTS_SEEN:
         max_tenants = _max_tenants()
@@ -132,28 +393,76 @@ async def handle_conversation_message(
             )
         TENANTS_SEEN.add(tenant_id)
 
-    # Deterministic ping guardrail (integration tests)
-    utter = (payload.user_utterance or "").strip().lower()
-    if utter in {"ping", "second ping"}:
-        key = f"{tenant_id}:{session_id}"
-        is_new_session = key not in SESSION_STATE
-        st = _state(tenant_id, session_id)
+    # Client retries: join the running request or replay its response
+    fp = fingerprint(tenant_id, payload.session_id or "", payload.user_utterance, payload.audio_route_request)
+    converse = lambda: _converse(payload, tenant_id, session_id, timer)
+    try:
+        if (idempotency_key or "").strip():
+            return await idempotency.run(f"{tenant_id}:key:{idempotency_key.strip()}", fp, converse)
+        if not payload.session_id:
+            return await converse()
+        # Fingerprint only: short window, and local-intent replies (time, date, ...) are never replayed
+        return await idempotency.run(
+            f"{tenant_id}:fp:{fp}",
+            fp,
+            converse,
+            ttl_sec=idempotency.fingerprint_ttl_sec,
+            cacheable=lambda res: not res.ai_routing_reason.startswith("guardrail"),
+        )
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "error": "idempotency_key_reused",
+                "message": "Idempotency-Key was already used for a different request.",
+            },
+        )
+
+
+async def _converse(
+    payload: ConversationRequest,
+    tenant_id: str,
+    session_id: str,
+    timer: StageTimer,
+) -> ConversationResponse:
+    key = f"{tenant_id}:{session_id}"
+    is_new_session = not _session_known(key)
+    st = _state(tenant_id, session_id)
+    audio_cues: List[str] = (["session_start"] if is_new_session else [])
+    timer.lap("session_state")
+
+    # Local fast path (ping, audio/provider switch, policy query, time/date): no upstream call
+    local = answer_local_intent(payload.user_utterance, {"tenant_id": tenant_id, "session_id": session_id})
+    timer.lap("local_intents")
+    if local is not None:
+        speculation.discard(key)
+        if local.audio_route is not None:
+            st["audio_route"] = local.audio_route
+        if local.ai_provider is not None:
+            st["ai_provider"] = local.ai_provider
+        if is_new_session or local.audio_route is not None or local.ai_provider is not None:
+            _publish_state(tenant_id, session_id, st)
+
+        ai_routing_reason = f"guardrail:{local.intent}"
+        audit_log.emit_routing(
+            tenant_id=tenant_id,
+            session_id=session_id,
+            provider_requested="local_guardrail",
+            provider_applied="local_guardrail",
+            routing_reason=ai_routing_reason,
+            latency_ms=timer.total_ms,
+        )
         return ConversationResponse(
             session_id=session_id,
-            reply_text="pong",
+            reply_text=local.reply_text,
             timestamp_utc=datetime.now(timezone.utc),
             audio_route_applied=st["audio_route"],
-            audio_cues=(["session_start", "pong"] if is_new_session else ["pong"]),
+            audio_cues=audio_cues + list(local.audio_cues),
             ai_provider_requested="local_guardrail",
             ai_provider_applied="local_guardrail",
-            ai_routing_reason="guardrail:ping",
+            ai_routing_reason=ai_routing_reason,
         )
 
-    key = f"{tenant_id}:{session_id}"
-    is_new_session = key not in SESSION_STATE
-    st = _state(tenant_id, session_id)
-    audio_cues: List[str] = (["session_start"] if is_new_session else [])
-
     # Audio route override
     audio_override = infer_audio_route_override_from_text(payload.user_utterance)
     if audio_override is not None:
@@ -163,27 +472,78 @@ async def handle_conversation_message(
     elif payload.audio_route_request is not None:
         st["audio_route"] = payload.audio_route_request
         audio_cues.append("confirm")
-    # AI provider override (voice)
-    ai_override = infer_ai_provider_override_from_text(payload.user_utterance)
+    # AI provider override (voice) + requested provider
+    requested, routing_reason, ai_override = _route(payload.user_utterance, tenant_id, st.get("ai_provider"))
     if ai_override is not None:
         st["ai_provider"] = ai_override
         audio_cues.append("confirm")
-        routing_reason = "explicit_override"
-    else:
-        routing_reason = "session_locked" if st.get("ai_provider") is not None else "default_policy"
-
-    # Requested provider
-    requested: AIProviderId = st["ai_provider"] if st.get("ai_provider") is not None else pick_provider_for_request(payload.user_utterance)
 
     # Persist provider chosen by default_policy so follow-ups become session_locked
-    if st.get("ai_provider") is None:
+    if (
+        routing_reason != "budget_throttled"
+        and not routing_reason.startswith("policy_excluded")
+        and st.get("ai_provider") is None
+    ):
         st["ai_provider"] = requested
-    
-    # Provider call (falls back internally if missing keys)
-    result = await provider.generate_reply(
-        user_utterance=payload.user_utterance,
-        session_context={"session_id": session_id, "tenant_id": tenant_id},
-        provider_requested=requested,
+
+    timer.lap("routing")
+
+    # Commit the generation started on a matching partial transcript, if any
+    history = list(st.get("history") or [])
+    session_context = {"session_id": session_id, "tenant_id": tenant_id, "history": history}
+    result = await speculation.resolve(key, payload.user_utterance, requested, len(history))
+    usage_results = [result]
+    if result is None or result.routing_note.startswith("degraded_"):
+        plan = []
+        if (
+            fanout_enabled()
+            and requested == AIProviderId.PERPLEXITY
+            and routing_reason in ("default_policy", "session_locked")
+            and is_search_query(payload.user_utterance)
+        ):
+            fanout_cfg = FanoutConfig.from_env()
+            plan = plan_providers(payload.user_utterance, session_context, fanout_cfg, usage_accounting.cost_usd)
+        if plan:
+            # Research query: Perplexity + secondaries under one deadline / cost cap
+            fanout = await generate_fanout(provider, payload.user_utterance, session_context, fanout_cfg, usage_accounting.cost_usd, plan)
+            result, usage_results = fanout.chosen, fanout.completed
+            # Cancelled providers may already be billed for the prompt, as for speculation.
+            est_prompt_tokens = estimate_prompt_tokens(payload.user_utterance, session_context)
+            for p in fanout.unfinished:
+                usage_accounting.record(tenant_id, p, {"prompt_tokens": est_prompt_tokens, "completion_tokens": 0})
+        else:
+            # Provider call (falls back internally if missing keys)
+            result = await provider.generate_reply(
+                user_utterance=payload.user_utterance,
+                session_context=session_context,
+                provider_requested=requested,
+            )
+            usage_results = [result]
+    timer.lap("upstream")
+    if not result.routing_note.startswith(("degraded_", "echo_")):
+        _append_history(st, payload.user_utterance, result.reply_text)
+
+    _publish_state(tenant_id, session_id, st)
+    for r in usage_results:
+        usage_accounting.record(tenant_id, r.provider_applied, r.usage)
+
+    ai_routing_reason = f"{routing_reason}:{result.routing_note}"
+    audit_log.emit_routing(
+        tenant_id=tenant_id,
+        session_id=session_id,
+        provider_requested=requested.value,
+        provider_applied=result.provider_applied.value,
+        routing_reason=ai_routing_reason,
+        latency_ms=timer.total_ms,
+    )
+    timer.lap("finalize")
+    profiling.slow_requests.observe(
+        timer,
+        tenant_id=tenant_id,
+        session_id=session_id,
+        provider_requested=requested.value,
+        provider_applied=result.provider_applied.value,
+        routing_reason=ai_routing_reason,
     )
 
     return ConversationResponse(
@@ -194,8 +554,223 @@ async def handle_conversation_message(
         audio_cues=audio_cues,
         ai_provider_requested=requested.value,
         ai_provider_applied=result.provider_applied.value,
-        ai_routing_reason=f"{routing_reason}:{result.routing_note}",
+        ai_routing_reason=ai_routing_reason,
+        citations=list(result.citations),
+        client_actions=list(result.client_actions),
     )
 
 
+@app.post("/api/v1/conversation/partial", response_model=PartialTranscriptResponse, tags=["conversation"])
+async def handle_partial_transcript(
+    payload: PartialTranscriptRequest,
+    x_client_id: str | None = Header(default=None, alias="X-Client-Id"),
+) -> PartialTranscriptResponse:
+    """
+    Interim STT transcript: predict routing, warm the upstream connection and
+    (HALO_SPECULATIVE_GENERATION=1) start generating, without touching session state.
+    Partials themselves are not rate limited (STT emits many); speculative
+    generations are, per tenant, and never start for tenants over budget.
+    """
+    tenant_id = _normalize_tenant_id(x_client_id)
+    _enforce_distinct_tenant_cap(tenant_id)
+    key = f"{tenant_id}:{payload.session_id}"
+    text = payload.partial_utterance
+
+    st: Dict[str, Any] = SESSION_STATE[key] if _session_known(key) else {"audio_route": AudioRoute.GLASSES, "ai_provider": None}
+    audio_route = infer_audio_route_override_from_text(text) or payload.audio_route_request or st["audio_route"]
+
+    if answer_local_intent(text, {"tenant_id": tenant_id, "session_id": payload.session_id}) is not None:
+        # Answered locally once final: nothing to prefetch.
+        speculation.discard(key)
+        return PartialTranscriptResponse(
+            session_id=payload.session_id,
+            audio_route_predicted=audio_route,
+            ai_provider_predicted="local_guardrail",
+            ai_routing_reason="guardrail",
+        )
+
+    requested, routing_reason, _ = _route(text, tenant_id, st.get("ai_provider"))
+    history = list(st.get("history") or [])
+
+    prev = speculation.get(key)
+    if prev is not None and prev.requested == requested and prev.history_len == len(history) and _norm(prev.text) == _norm(text):
+        # Same partial again (STT re-emits): keep the running speculation.
+        return PartialTranscriptResponse(
+            session_id=payload.session_id,
+            audio_route_predicted=audio_route,
+            ai_provider_predicted=requested.value,
+            ai_routing_reason=routing_reason,
+            generation_started=prev.task is not None,
+        )
+
+    task = None
+    est_prompt_tokens = 0
+    session_context = {"session_id": payload.session_id, "tenant_id": tenant_id, "history": history}
+    if (
+        speculation.generation
+        and requested not in LOCAL_PROVIDERS
+        and routing_reason != "budget_throttled"
+        and len(_norm(text)) >= speculation.min_chars
+        and speculation.allow_generation(tenant_id)
+    ):
+        est_prompt_tokens = estimate_prompt_tokens(text, session_context)
+        task = asyncio.create_task(provider.generate_reply(
+            user_utterance=text,
+            session_context=session_context,
+            provider_requested=requested,
+        ))
+    else:
+        speculation.spawn(provider.warm(requested))
+
+    speculation.put(key, Speculation(
+        tenant_id=tenant_id,
+        text=text,
+        requested=requested,
+        history_len=len(history),
+        created=time.monotonic(),
+        task=task,
+        est_prompt_tokens=est_prompt_tokens,
+    ))
+    return PartialTranscriptResponse(
+        session_id=payload.session_id,
+        audio_route_predicted=audio_route,
+        ai_provider_predicted=requested.value,
+        ai_routing_reason=routing_reason,
+        generation_started=task is not None,
+    )
+
+
+def _calendar_batch_max() -> int:
+    try:
+        return max(1, int((os.getenv("HALO_CALENDAR_BATCH_MAX") or "200").strip()))
+    except ValueError:
+        return 200
+
 
+@app.post("/api/v1/calendar/events/batch", response_model=CalendarBatchResponse, tags=["calendar"])
+async def sync_calendar_events(
+    payload: CalendarBatchRequest,
+    x_client_id: str | None = Header(default=None, alias="X-Client-Id"),
+) -> CalendarBatchResponse:
+    """Build Notion Calendar deep links for many events in one call (one admission/rate-limit hit)."""
+    tenant_id = _normalize_tenant_id(x_client_id)
+    _enforce_distinct_tenant_cap(tenant_id)
+    _enforce_tenant_rate_limit(tenant_id)
+    if len(payload.events) > _calendar_batch_max():
+        raise HTTPException(status_code=413, detail=f"Too many events (max={_calendar_batch_max()})")
+
+    session_id = payload.session_id or tenant_id
+    now = datetime.now(timezone.utc)
+    actions: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for i, ev in enumerate(payload.events):
+        if ev.start_utc is not None:
+            start = ev.start_utc if ev.start_utc.tzinfo else ev.start_utc.replace(tzinfo=timezone.utc)
+            end = ev.end_utc if ev.end_utc is not None else start + timedelta(minutes=default_duration_min())
+            if end.tzinfo is None:
+                end = end.replace(tzinfo=timezone.utc)
+            if end <= start:
+                errors.append({"index": i, "error": "end_before_start"})
+                continue
+            title = (ev.title or "").strip() or "Halo event"
+            event = CalendarEvent(title, start, end, ev.ical_uid or event_uid(session_id, start, title))
+        elif ev.utterance:
+            event, _ = event_from_utterance(ev.utterance, session_id, now=now)
+            if ev.title or ev.ical_uid:
+                title = (ev.title or "").strip() or event.title
+                event = CalendarEvent(title, event.start_utc, event.end_utc, ev.ical_uid or event_uid(session_id, event.start_utc, title))
+        else:
+            errors.append({"index": i, "error": "missing_start_or_utterance"})
+            continue
+        actions.append(show_event_action(event))
+
+    return CalendarBatchResponse(client_actions=actions, errors=errors)
+
+
+@app.get("/api/v1/admin/usage", tags=["admin"])
+async def admin_usage(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    return await usage_accounting.aggregate()
+
+
+@app.get("/api/v1/admin/shared-state", tags=["admin"])
+async def admin_shared_state(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    shared = get_shared_state()
+    return {"enabled": False} if shared is None else {"enabled": True, **shared.stats()}
+
+
+@app.get("/api/v1/admin/speculation", tags=["admin"])
+async def admin_speculation(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    return speculation.stats()
+
+
+@app.get("/api/v1/admin/idempotency", tags=["admin"])
+async def admin_idempotency(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    return idempotency.stats()
+
+
+@app.get("/api/v1/admin/profiling", tags=["admin"])
+async def admin_profiling_status(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    return {
+        "enabled": profiling.enabled,
+        "loop_lag": profiling.loop_lag.stats(),
+        "profiler": profiling.profiler.stats(),
+        "slow_requests": {
+            "threshold_ms": profiling.slow_requests.threshold_ms,
+            "observed": profiling.slow_requests.observed,
+            "captured": profiling.slow_requests.captured,
+        },
+    }
+
+
+@app.post("/api/v1/admin/profiling/profiler/start", tags=["admin"])
+async def admin_profiler_start(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    # Called on the event loop thread, which is the thread we want to sample.
+    profiling.profiler.start(threading.get_ident())
+    return profiling.profiler.stats()
+
+
+@app.post("/api/v1/admin/profiling/profiler/stop", tags=["admin"])
+async def admin_profiler_stop(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    profiling.profiler.stop()
+    return profiling.profiler.stats()
+
+
+@app.get("/api/v1/admin/profiling/profiler/collapsed", tags=["admin"], response_class=PlainTextResponse)
+async def admin_profiler_collapsed(
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> PlainTextResponse:
+    _require_admin(x_admin_token)
+    return PlainTextResponse(profiling.profiler.collapsed())
+
+
+@app.get("/api/v1/admin/profiling/slow-requests", tags=["admin"])
+async def admin_slow_requests(
+    limit: int = 50,
+    x_admin_token: str | None = Header(default=None, alias="X-Admin-Token"),
+) -> dict:
+    _require_admin(x_admin_token)
+    return {
+        "threshold_ms": profiling.slow_requests.threshold_ms,
+        "requests": profiling.slow_requests.recent(limit),
+    }
@@ -1,8 +1,29 @@
-﻿from __future__ import annotations
+from __future__ import annotations
 
-from datetime import datetime, timezone, timedelta
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta, tzinfo
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from urllib.parse import quote
 
+from app.localization import EN_MONTHS, EN_WEEKDAYS, IT_MONTHS, IT_WEEKDAYS, detect_lang, local_tz
+
+
+# Deep-link building is memoized: the same account/ref/title strings are quoted
+# over and over (batch sync, repeated turns), and datetimes/strings are hashable.
+_quote = lru_cache(maxsize=2048)(quote)
+
+
+@lru_cache(maxsize=2048)
+def _iso_z(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+@lru_cache(maxsize=4096)
 def build_notion_calendar_show_event_url(
     account_email: str,
     ical_uid: str,
@@ -12,22 +33,22 @@ def build_notion_calendar_show_event_url(
     ref: str = "com.halo.desktop"
 ) -> str:
     # Notion Calendar local API (cron://) deep-link. Dates must be ISO-8601 with Z.
-    s = start_utc.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
-    e = end_utc.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    s = _iso_z(start_utc)
+    e = _iso_z(end_utc)
 
     return (
         "cron://showEvent?"
-        f"accountEmail={quote(account_email)}"
-        f"&iCalUID={quote(ical_uid)}"
-        f"&startDate={quote(s)}"
-        f"&endDate={quote(e)}"
-        f"&title={quote(title)}"
-        f"&ref={quote(ref)}"
+        f"accountEmail={_quote(account_email)}"
+        f"&iCalUID={_quote(ical_uid)}"
+        f"&startDate={_quote(s)}"
+        f"&endDate={_quote(e)}"
+        f"&title={_quote(title)}"
+        f"&ref={_quote(ref)}"
     )
 
 
-def build_demo_event(session_id: str) -> dict:
-    now = datetime.now(timezone.utc)
+def build_demo_event(session_id: str, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.now(timezone.utc)
     start = now + timedelta(minutes=2)
     end = start + timedelta(minutes=20)
     ical_uid = f"halo-{session_id}@halo.local"
@@ -37,3 +58,252 @@ def build_demo_event(session_id: str) -> dict:
         "ical_uid": ical_uid,
         "title": "Halo – Quick focus block",
     }
+
+
+# --- Calendar action stage ---
+#
+# Utterances routed to NOTION_CALENDAR are parsed locally (EN/IT day, time,
+# relative offset and duration expressions) into an event, returned to the
+# client as a cron:// showEvent action. Utterances without any time expression
+# fall back to the demo quick focus block, with a UID derived from the utterance
+# so several of them in one batch do not collide.
+
+
+@dataclass(frozen=True)
+class CalendarEvent:
+    title: str
+    start_utc: datetime
+    end_utc: datetime
+    ical_uid: str
+
+
+def default_duration_min() -> int:
+    """HALO_CALENDAR_DEFAULT_DURATION_MIN: duration of events without an explicit end (min 5)."""
+    try:
+        return max(5, int((os.getenv("HALO_CALENDAR_DEFAULT_DURATION_MIN") or "30").strip()))
+    except ValueError:
+        return 30
+
+
+def event_uid(session_id: str, start_utc: datetime, title: str) -> str:
+    # Deterministic: re-syncing the same event yields the same iCalUID.
+    h = hashlib.blake2b(f"{session_id}|{_iso_z(start_utc)}|{title}".encode("utf-8"), digest_size=8).hexdigest()
+    return f"halo-{h}@halo.local"
+
+
+def show_event_action(event: CalendarEvent, account_email: Optional[str] = None) -> Dict[str, Any]:
+    email = account_email if account_email is not None else (os.getenv("NOTION_CALENDAR_ACCOUNT_EMAIL") or "").strip()
+    ref = (os.getenv("NOTION_CALENDAR_REF") or "com.halo.desktop").strip()
+    return {
+        "type": "notion_calendar.show_event",
+        "url": build_notion_calendar_show_event_url(email, event.ical_uid, event.start_utc, event.end_utc, event.title, ref),
+        "event": {
+            "ical_uid": event.ical_uid,
+            "title": event.title,
+            "start_utc": _iso_z(event.start_utc),
+            "end_utc": _iso_z(event.end_utc),
+        },
+    }
+
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "un": 1, "una": 1, "uno": 1,
+    "two": 2, "due": 2, "three": 3, "tre": 3, "four": 4, "quattro": 4,
+    "five": 5, "cinque": 5, "ten": 10, "dieci": 10, "fifteen": 15, "quindici": 15,
+    "twenty": 20, "venti": 20, "thirty": 30, "trenta": 30, "forty five": 45, "quarantacinque": 45,
+}
+_NUM = r"(\d+|" + "|".join(sorted((re.escape(w) for w in _NUMBER_WORDS), key=len, reverse=True)) + r")"
+_MIN_UNIT = r"(?:minutes?|mins?|minuti|minuto)"
+_HOUR_UNIT = r"(?:hours?|hrs?|ore|ora|h)"
+
+_WEEKDAY_INDEX = {d.lower(): i for i, d in enumerate(EN_WEEKDAYS)}
+_WEEKDAY_INDEX.update({d: i for i, d in enumerate(IT_WEEKDAYS)})
+_WEEKDAY_INDEX.update({d.replace("ì", "i"): i for i, d in enumerate(IT_WEEKDAYS)})
+_MONTH_INDEX = {m.lower(): i + 1 for i, m in enumerate(EN_MONTHS)}
+_MONTH_INDEX.update({m: i + 1 for i, m in enumerate(IT_MONTHS)})
+_WEEKDAYS_RE = "|".join(sorted(_WEEKDAY_INDEX, key=len, reverse=True))
+_MONTHS_RE = "|".join(sorted(_MONTH_INDEX, key=len, reverse=True))
+
+_RELATIVE_DAY = re.compile(r"\b(day after tomorrow|dopodomani|tomorrow|domani|today|oggi|tonight|stasera)\b")
+_WEEKDAY = re.compile(rf"\b(?:next |this |on |questo |questa )?({_WEEKDAYS_RE})(?: prossim[oa])?\b")
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)? (?:of )?({_MONTHS_RE})\b")
+_MONTH_DAY = re.compile(rf"\b({_MONTHS_RE}) (\d{{1,2}})(?:st|nd|rd|th)?\b")
+_IN_OFFSET = re.compile(rf"\b(?:in|tra|fra) (?:(mezz ?ora|half an hour)|{_NUM} ?({_MIN_UNIT}|{_HOUR_UNIT}))\b")
+_CLOCK = re.compile(
+    r"\b(?:at|alle|per le|verso le|@) ?(\d{1,2})(?:[:.](\d{2}))? ?(am|pm|a\.m\.|p\.m\.)?(?![a-z0-9])"
+    r"|\b(\d{1,2})(?:[:.](\d{2}))? ?(am|pm|a\.m\.|p\.m\.)(?![a-z0-9])"
+    r"|\b(noon|mezzogiorno|midnight|mezzanotte)\b"
+)
+_AFTERNOON = re.compile(r"\b(?:in the afternoon|in the evening|at night|tonight|di pomeriggio|del pomeriggio|di sera|della sera|stasera)\b")
+_DURATION = re.compile(rf"\b(?:for|per) (?:(mezz ?ora|half an hour)|{_NUM} ?({_MIN_UNIT}|{_HOUR_UNIT}))\b")
+_TITLE = re.compile(r"\b(?:called|titled|named|chiamat[oa]|intitolat[oa]|dal titolo)\s+(.+)$")
+_WITH = re.compile(r"\b(?:with|con) ([a-zà-ù]+)")
+
+_NOUNS = (
+    ("meeting", "Meeting"), ("riunione", "Riunione"), ("appointment", "Appointment"),
+    ("appuntamento", "Appuntamento"), ("call", "Call"), ("chiamata", "Chiamata"),
+    ("lunch", "Lunch"), ("pranzo", "Pranzo"), ("dinner", "Dinner"), ("cena", "Cena"),
+    ("dentist", "Dentist"), ("dentista", "Dentista"), ("focus", "Focus block"),
+)
+def _number(raw: str) -> int:
+    return int(raw) if raw.isdigit() else _NUMBER_WORDS.get(raw, 1)
+
+
+def _minutes(half: Optional[str], num: Optional[str], unit: Optional[str]) -> int:
+    if half:
+        return 30
+    n = _number(num or "1")
+    return n * 60 if unit and re.fullmatch(_HOUR_UNIT, unit) else n
+
+
+def _clean(text: str) -> str:
+    t = (text or "").lower().replace("’", "'").replace("'", " ")
+    t = re.sub(r"[^\w:.@àèéìòù ]+", " ", t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+@lru_cache(maxsize=512)
+def parse_event_text(text: str) -> Optional[Mapping[str, Any]]:
+    """
+    Time expressions in an utterance, independent of "now" (hence memoizable):
+    {"day": ("rel", n) | ("weekday", i) | ("date", month, day) | None,
+     "time": (hour, minute) | None, "offset_min": int | None, "duration_min": int | None,
+     "title": str | None, "lang": "en" | "it"}. None if nothing time-related was found.
+    The mapping is read-only: it is shared by every caller of the cache.
+    """
+    t = _clean(text)
+    spans: List[Tuple[int, int]] = []
+    out: Dict[str, Any] = {"day": None, "time": None, "offset_min": None, "duration_min": None}
+
+    m = _DURATION.search(t)
+    if m:
+        out["duration_min"] = _minutes(m.group(1), m.group(2), m.group(3))
+        spans.append(m.span())
+
+    m = _IN_OFFSET.search(t)
+    if m:
+        out["offset_min"] = _minutes(m.group(1), m.group(2), m.group(3))
+        spans.append(m.span())
+
+    m = _RELATIVE_DAY.search(t)
+    if m:
+        word = m.group(1)
+        n = 2 if word in ("day after tomorrow", "dopodomani") else 1 if word in ("tomorrow", "domani") else 0
+        out["day"] = ("rel", n)
+        spans.append(m.span())
+    else:
+        m = _DAY_MONTH.search(t) or _MONTH_DAY.search(t)
+        if m:
+            a, b = m.group(1), m.group(2)
+            day, month = (int(a), _MONTH_INDEX[b]) if a.isdigit() else (int(b), _MONTH_INDEX[a])
+            out["day"] = ("date", month, day)
+            spans.append(m.span())
+        else:
+            m = _WEEKDAY.search(t)
+            if m:
+                out["day"] = ("weekday", _WEEKDAY_INDEX[m.group(1)])
+                spans.append(m.span())
+
+    for m in _CLOCK.finditer(t):
+        if any(s <= m.start() < e for s, e in spans):
+            continue  # e.g. the "4" in "for 4 hours"
+        if m.group(7):
+            out["time"] = (12, 0) if m.group(7) in ("noon", "mezzogiorno") else (0, 0)
+        else:
+            hour = int(m.group(1) or m.group(4))
+            minute = int(m.group(2) or m.group(5) or 0)
+            ampm = (m.group(3) or m.group(6) or "").replace(".", "")
+            if hour > 23 or minute > 59:
+                continue
+            if ampm == "pm" and hour < 12:
+                hour += 12
+            elif ampm == "am" and hour == 12:
+                hour = 0
+            elif not ampm and hour < 12 and (_AFTERNOON.search(t) or 1 <= hour <= 7):
+                # "alle 3" / "at 5" without am/pm: office hours, i.e. afternoon
+                hour += 12
+            out["time"] = (hour, minute)
+        spans.append(m.span())
+        break
+
+    if out["day"] is None and out["time"] is None and out["offset_min"] is None:
+        return None
+
+    tokens = set(t.split())
+    out["lang"] = detect_lang(tokens)
+
+    rest = t
+    for s, e in sorted(spans, reverse=True):
+        rest = rest[:s] + " " + rest[e:]
+    rest = re.sub(r"\s+", " ", rest).strip()
+    title = None
+    m = _TITLE.search(rest)
+    if m:
+        title = m.group(1).strip(" .").capitalize() or None
+    else:
+        noun = next((label for word, label in _NOUNS if word in tokens), None)
+        if noun is not None:
+            w = _WITH.search(rest)
+            title = f"{noun} {'con' if out['lang'] == 'it' else 'with'} {w.group(1).title()}" if w else noun
+    out["title"] = title
+    return MappingProxyType(out)
+
+
+def resolve_event(
+    parsed: Mapping[str, Any],
+    session_id: str,
+    now: datetime,
+    tz: tzinfo,
+) -> CalendarEvent:
+    local_now = now.astimezone(tz)
+    if parsed["offset_min"] is not None and parsed["time"] is None:
+        start = local_now + timedelta(minutes=parsed["offset_min"])
+    else:
+        day = parsed["day"]
+        date = local_now.date()
+        if day is not None and day[0] == "rel":
+            date = date + timedelta(days=day[1])
+        elif day is not None and day[0] == "weekday":
+            date = date + timedelta(days=(day[1] - date.weekday()) % 7 or 7)
+        elif day is not None and day[0] == "date":
+            try:
+                date = date.replace(month=day[1], day=day[2])
+                if date < local_now.date():
+                    date = date.replace(year=date.year + 1)
+            except ValueError:
+                pass  # e.g. 31 February: keep today
+        hour, minute = parsed["time"] if parsed["time"] is not None else (9, 0)
+        start = datetime(date.year, date.month, date.day, hour, minute, tzinfo=tz)
+        if day is None and start < local_now:
+            start += timedelta(days=1)  # "at 9" said at 10:00 means tomorrow
+
+    duration = parsed["duration_min"] or default_duration_min()
+    title = parsed["title"] or ("Evento Halo" if parsed["lang"] == "it" else "Halo event")
+    start_utc = start.astimezone(timezone.utc)
+    return CalendarEvent(title, start_utc, start_utc + timedelta(minutes=duration), event_uid(session_id, start_utc, title))
+
+
+def event_from_utterance(
+    text: str,
+    session_id: str,
+    now: Optional[datetime] = None,
+    tz: Optional[tzinfo] = None,
+) -> Tuple[CalendarEvent, str]:
+    """(event, lang). Utterances without a time expression get the demo focus block."""
+    parsed = parse_event_text(text or "")
+    if parsed is None:
+        cleaned = _clean(text)
+        lang = detect_lang(set(cleaned.split()))
+        demo = build_demo_event(session_id, now)
+        demo["ical_uid"] = event_uid(session_id, demo["start_utc"], f"{demo['title']}|{cleaned}")
+        return CalendarEvent(**demo), lang
+    tz = tz or local_tz()
+    return resolve_event(parsed, session_id, now or datetime.now(timezone.utc), tz), parsed["lang"]
+
+
+def describe_event(event: CalendarEvent, lang: str, tz: Optional[tzinfo] = None) -> str:
+    s = event.start_utc.astimezone(tz or local_tz())
+    hhmm = s.strftime("%H:%M")
+    if lang == "it":
+        return f"Ho preparato “{event.title}” per {IT_WEEKDAYS[s.weekday()]} {s.day} {IT_MONTHS[s.month - 1]} alle {hhmm}."
+    return f"I've prepared “{event.title}” for {EN_WEEKDAYS[s.weekday()]}, {s.day} {EN_MONTHS[s.month - 1]} at {hhmm}."
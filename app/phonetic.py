@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+
+
+# Offline phonetic keys for STT mishearings (EN/IT), metaphone-style:
+# spelling variants that sound alike collapse to the same key, e.g.
+# gemini/jemini -> "jemini", claude/cloud -> "klod", perplexity/perplexiti -> "perpleksiti",
+# chat gpt / ciat gpt -> "Catgpt" (C = /tʃ/, S = /ʃ/).
+#
+# Keys are compared with a bounded Levenshtein distance; both are pure Python
+# and cheap enough for the per-utterance hot path (a few µs per word).
+
+# Ordered rewrite rules (regex, replacement), applied to a lowercase ASCII word.
+_RULES = [
+    (re.compile(r"ow"), "o"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"gh"), "g"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"sch"), "sk"),
+    (re.compile(r"sc(?=[eiy])|sh"), "S"),
+    (re.compile(r"ch(?=[ei])"), "k"),  # IT chi/che
+    (re.compile(r"ch|ci(?=[aou])|tch"), "C"),  # EN chat, IT cia/cio
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"gi(?=[aou])|g(?=[eiy])|dg"), "j"),
+    (re.compile(r"gn"), "n"),
+    (re.compile(r"qu"), "kv"),
+    (re.compile(r"ck|c|q"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"au|ou|oa"), "o"),
+    (re.compile(r"ai|ay|ei|ey"), "e"),
+    (re.compile(r"ee|ie"), "i"),
+    (re.compile(r"oo"), "u"),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+
+def _ascii(s: str) -> str:
+    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+
+
+@lru_cache(maxsize=4096)
+def _word_key(word: str) -> str:
+    k = re.sub(r"[^a-z0-9]", "", word)
+    for rx, repl in _RULES:
+        k = rx.sub(repl, k)
+    if len(k) > 3 and k.endswith("e"):
+        k = k[:-1]  # EN silent e (claude, face)
+    return k
+
+
+def phonetic_key(text: str) -> str:
+    """Phonetic key of a word or a run of words, keyed per word then joined ("chat gpt" == "chatgpt")."""
+    return "".join(_word_key(w) for w in _ascii((text or "").lower()).split())
+
+
+def bounded_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """Edit distance, or max_dist + 1 as soon as it is known to exceed max_dist."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if a == b:
+        return 0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < row_min:
+                row_min = cur[j]
+        if row_min > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1] if prev[-1] <= max_dist else max_dist + 1
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.env import env_flag, env_float, env_int
+
+
+# Opt-in runtime instrumentation (HALO_PROFILING=1):
+# - LoopLagMonitor: how late the event loop wakes a periodic sleeper (stall detector)
+# - SamplingProfiler: background thread sampling the loop thread's stack,
+#   aggregated as collapsed stacks (flamegraph.pl / speedscope input)
+# - SlowRequestLog: per-stage timings of slow conversation requests in a ring buffer
+
+
+def profiling_enabled() -> bool:
+    return env_flag("HALO_PROFILING")
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_ms: float = 100.0, stall_ms: float = 100.0, window: int = 600) -> None:
+        self.interval_sec = max(0.001, interval_ms / 1000.0)
+        self.stall_ms = stall_ms
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self.last_stall_utc: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="halo-loop-lag")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval_sec)
+            lag_ms = max(0.0, (time.perf_counter() - t0 - self.interval_sec) * 1000.0)
+            self.samples.append(lag_ms)
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+            if lag_ms >= self.stall_ms:
+                self.stalls += 1
+                self.last_stall_utc = datetime.now(timezone.utc).isoformat()
+
+    def stats(self) -> Dict[str, Any]:
+        s = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(s[min(len(s) - 1, int(p * len(s)))], 3) if s else 0.0
+
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval_sec * 1000.0,
+            "samples": len(s),
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag_ms, 3),
+            "stall_threshold_ms": self.stall_ms,
+            "stalls": self.stalls,
+            "last_stall_utc": self.last_stall_utc,
+        }
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread."""
+
+    def __init__(self, interval_ms: float = 5.0, max_sec: float = 60.0) -> None:
+        self.interval_sec = max(0.001, interval_ms / 1000.0)
+        self.max_sec = max(1.0, max_sec)
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started_utc: Optional[str] = None
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target_thread_id: Optional[int] = None, reset: bool = True) -> None:
+        if self.running:
+            return
+        if reset:
+            self.stacks.clear()
+            self.samples = 0
+        self._target = target_thread_id or threading.get_ident()
+        self._stop.clear()
+        self.started_utc = datetime.now(timezone.utc).isoformat()
+        self._thread = threading.Thread(target=self._run, name="halo-sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_sec
+        while not self._stop.wait(self.interval_sec):
+            if time.monotonic() >= deadline:
+                # Auto-stop: a forgotten profiler must not run forever.
+                break
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                break
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, one `frame;frame;frame count` line per unique stack."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_sec * 1000.0,
+            "max_sec": self.max_sec,
+            "started_utc": self.started_utc,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+        }
+
+
+class StageTimer:
+    """Lap timer: lap(name) records the time spent since the previous lap."""
+
+    __slots__ = ("t0", "_last", "stages")
+
+    def __init__(self) -> None:
+        self.t0 = self._last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        self.stages.append((name, (now - self._last) * 1000.0))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000.0
+
+
+class SlowRequestLog:
+    def __init__(self, enabled: bool = False, threshold_ms: float = 1000.0, capacity: int = 100) -> None:
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=max(1, capacity))
+        self.observed = 0
+        self.captured = 0
+
+    def observe(self, timer: StageTimer, **meta: Any) -> None:
+        if not self.enabled:
+            return
+        self.observed += 1
+        total = timer.total_ms
+        if total < self.threshold_ms:
+            return
+        self.captured += 1
+        self.entries.append({
+            "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+            "total_ms": round(total, 3),
+            "stages_ms": {name: round(ms, 3) for name, ms in timer.stages},
+            **meta,
+        })
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(self.entries)[-limit:][::-1] if limit > 0 else []
+
+
+class Profiling:
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.loop_lag = LoopLagMonitor(
+            interval_ms=env_float("HALO_LOOP_LAG_INTERVAL_MS", 100.0),
+            stall_ms=env_float("HALO_LOOP_STALL_MS", 100.0),
+        )
+        self.profiler = SamplingProfiler(
+            interval_ms=env_float("HALO_PROFILER_INTERVAL_MS", 5.0),
+            max_sec=env_float("HALO_PROFILER_MAX_SEC", 60.0),
+        )
+        self.slow_requests = SlowRequestLog(
+            enabled=enabled,
+            threshold_ms=env_float("HALO_SLOW_REQUEST_MS", 1000.0),
+            capacity=env_int("HALO_SLOW_REQUEST_BUFFER", 100),
+        )
+
+    @classmethod
+    def from_env(cls) -> "Profiling":
+        return cls(profiling_enabled())
+
+    async def start(self) -> None:
+        if self.enabled:
+            await self.loop_lag.start()
+
+    async def stop(self) -> None:
+        self.profiler.stop()
+        await self.loop_lag.stop()
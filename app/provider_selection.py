@@ -1,8 +1,12 @@
 ﻿from __future__ import annotations
 
+import os
 import re
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
+from app.env import env_flag, env_float
+from app.phonetic import bounded_levenshtein, phonetic_key
 from app.provider_types import AIProviderId
 
 
@@ -10,6 +14,10 @@ from app.provider_types import AIProviderId
 # - normalize text (lower, strip, collapse spaces, remove punctuation)
 # - accept multiple "switch" intents (use/usa/switch/passa/imposta/attiva)
 # - match provider via token sets + common mis-hearings/aliases
+# - otherwise fuzzy-match phonetic keys against a precomputed EN/IT alias index
+#   (bounded edit distance, confidence threshold), only for command-only
+#   utterances: [glue] intent [glue] <provider> [glue], so sentences such as
+#   "use the cloud to back up my photos" never become provider switches
 #
 # NOTE: We keep it deterministic and offline (no extra dependencies).
 
@@ -37,7 +45,169 @@ def _has_intent(toks: set[str]) -> bool:
     return len(toks.intersection(_INTENT_TOKENS)) > 0
 
 
-def infer_ai_provider_override_from_text(user_text: str) -> Optional[AIProviderId]:
+# Provider alias definitions (token-based)
+# We intentionally allow both EN/IT variants and common short forms.
+_ALIAS_MAP: list[tuple[AIProviderId, list[set[str]]]] = [
+    (AIProviderId.OPENAI, [
+        {"chatgpt"},
+        {"openai"},
+        {"gpt"},
+    ]),
+    (AIProviderId.PERPLEXITY, [
+        {"perplexity"},
+        {"pplx"},
+    ]),
+    (AIProviderId.CLAUDE, [
+        {"claude"},
+        {"anthropic"},
+    ]),
+    (AIProviderId.HUGGINGFACE, [
+        {"hugging", "face"},
+        {"huggingface"},
+        {"hf"},
+    ]),
+    (AIProviderId.CLOUD_AI, [
+        {"cloud", "ai"},
+        {"gemini"},
+        {"google", "ai"},
+    ]),
+    (AIProviderId.NOTION_CALENDAR, [
+        {"notion", "calendar"},
+        {"notion"},
+        {"calendario", "notion"},
+    ]),
+    (AIProviderId.PRO_ACTOR, [
+        {"pro", "actor"},
+        {"proactor"},
+        {"pro", "attore"},  # occasional IT STT
+    ]),
+    (AIProviderId.ECHO, [
+        {"echo"},
+        {"eco"},  # IT STT common for "echo"
+    ]),
+]
+
+
+# How provider names are pronounced / misheard (EN + IT), indexed phonetically
+# together with the single-token aliases above. Word order matters here.
+_FUZZY_SEEDS: list[tuple[AIProviderId, list[str]]] = [
+    (AIProviderId.OPENAI, ["chat gpt", "ciat gpt", "ciat gi pi ti", "open ai"]),
+    (AIProviderId.PERPLEXITY, ["perplessiti"]),
+    (AIProviderId.HUGGINGFACE, ["hugging face", "aghing feis"]),
+    (AIProviderId.CLOUD_AI, ["cloud ai", "google ai", "jemini"]),
+    (AIProviderId.NOTION_CALENDAR, ["notion calendar", "nozion"]),
+    (AIProviderId.PRO_ACTOR, ["pro actor", "pro attore"]),
+]
+
+_FUZZY_MIN_KEY = 4  # shorter keys (gpt, hf, eco) only match exactly
+_FUZZY_EXACT_ONLY = 5  # keys up to this length must equal an alias key (google != google ai)
+_FUZZY_MAX_DIST = 2
+_FUZZY_MAX_SPAN = 3  # words per candidate phrase
+# Everyday words that sound like an alias (cloud/claude -> "klod", open/openai -> "open"):
+# said on their own they are never a provider ("use cloud"), while mishearings with
+# the same key ("usa claud", "use clod") and phrases ("use open ai") still match.
+_FUZZY_COMMON_WORDS = {"cloud", "open"}
+_GLUE = {
+    "to", "a", "the", "on", "for", "me", "il", "lo", "la", "le", "al", "alla", "allo", "su", "di",
+    "please", "now", "ora", "adesso", "halo", "hey", "ok", "okay", "per", "favore", "instead",
+    "grazie", "thanks",
+}
+
+
+def _deletes(key: str, max_d: int) -> set[str]:
+    out = {key}
+    frontier = {key}
+    for _ in range(max_d):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _build_fuzzy_index() -> Tuple[List[Tuple[str, AIProviderId]], Dict[str, List[int]]]:
+    """
+    Alias phonetic keys plus a symmetric-delete index (every key with up to
+    _FUZZY_MAX_DIST characters deleted -> alias ids), built once at import:
+    lookups touch only aliases that can be within the edit-distance bound.
+    """
+    aliases: List[Tuple[str, AIProviderId]] = []
+    phrases = [(p, next(iter(a))) for p, sets in _ALIAS_MAP for a in sets if len(a) == 1]
+    phrases += [(p, s) for p, seeds in _FUZZY_SEEDS for s in seeds]
+    for provider_id, phrase in phrases:
+        key = phonetic_key(phrase)
+        if len(key) >= _FUZZY_MIN_KEY and (key, provider_id) not in aliases:
+            aliases.append((key, provider_id))
+
+    deletes: Dict[str, List[int]] = {}
+    for idx, (key, _) in enumerate(aliases):
+        for variant in _deletes(key, _FUZZY_MAX_DIST):
+            deletes.setdefault(variant, []).append(idx)
+    return aliases, deletes
+
+
+_FUZZY_ALIASES, _FUZZY_DELETES = _build_fuzzy_index()
+_FUZZY_MAX_KEY = max(len(k) for k, _ in _FUZZY_ALIASES) + _FUZZY_MAX_DIST
+_FUZZY_EXACT: Dict[str, AIProviderId] = {k: p for k, p in reversed(_FUZZY_ALIASES)}  # first alias wins
+
+
+def _fuzzy_min_score() -> float:
+    return env_float("HALO_AI_FUZZY_MIN_SCORE", 0.8)
+
+
+def _fuzzy_enabled() -> bool:
+    return env_flag("HALO_AI_FUZZY_MATCH", default=True)
+
+
+@dataclass(frozen=True)
+class ProviderMatch:
+    provider: AIProviderId
+    tokens: frozenset[str]  # utterance tokens consumed by the alias (+ intent tokens)
+    score: float = 1.0  # phonetic similarity for fuzzy matches (1.0 = same phonetic key)
+    fuzzy: bool = False  # matched through the phonetic index, not a literal alias
+
+
+def _fuzzy_match(words: list[str], min_score: float) -> Optional[ProviderMatch]:
+    # The provider must come right after the intent token (glue aside) and be the
+    # last thing said: "passa a perplexi" matches, "use a perplexing word" does not.
+    i = 0
+    while i < len(words) and (words[i] in _GLUE or words[i] in _INTENT_TOKENS):
+        i += 1
+    if i == len(words) or not _has_intent(set(words[:i])):
+        return None
+    end = len(words)
+    while end > i and words[end - 1] in _GLUE:
+        end -= 1
+    if end - i > _FUZZY_MAX_SPAN or (end - i == 1 and words[i] in _FUZZY_COMMON_WORDS):
+        return None
+
+    key = phonetic_key(" ".join(words[i:end]))
+    consumed = frozenset(words[i:end]) | (set(words) & _INTENT_TOKENS)
+    if len(key) < _FUZZY_MIN_KEY or len(key) > _FUZZY_MAX_KEY:
+        return None
+    if key in _FUZZY_EXACT:
+        # Same phonetic key as an alias: nothing can score higher.
+        return ProviderMatch(_FUZZY_EXACT[key], consumed, 1.0, fuzzy=True)
+    if len(key) <= _FUZZY_EXACT_ONLY:
+        return None
+
+    best: Optional[Tuple[float, AIProviderId]] = None
+    ambiguous = False
+    candidates = {idx for v in _deletes(key, _FUZZY_MAX_DIST) for idx in _FUZZY_DELETES.get(v, ())}
+    for idx in candidates:
+        alias_key, provider_id = _FUZZY_ALIASES[idx]
+        d = bounded_levenshtein(key, alias_key, _FUZZY_MAX_DIST)
+        if d > _FUZZY_MAX_DIST:
+            continue
+        score = 1.0 - d / max(len(key), len(alias_key))
+        if best is None or score > best[0]:
+            best, ambiguous = (score, provider_id), False
+        elif score == best[0] and provider_id != best[1]:
+            ambiguous = True
+    if best is None or ambiguous or best[0] < min_score:
+        return None
+    return ProviderMatch(best[1], consumed, round(best[0], 2), fuzzy=True)
+
+
+def match_ai_provider_override(user_text: str) -> Optional[ProviderMatch]:
     raw = user_text or ""
     t = _norm(raw)
     if not t:
@@ -50,84 +220,103 @@ def infer_ai_provider_override_from_text(user_text: str) -> Optional[AIProviderI
     if not _has_intent(toks):
         return None
 
-    # Provider alias definitions (token-based)
-    # We intentionally allow both EN/IT variants and common short forms.
-    alias_map: list[tuple[AIProviderId, list[set[str]]]] = [
-        (AIProviderId.OPENAI, [
-            {"chatgpt"},
-            {"openai"},
-            {"gpt"},
-        ]),
-        (AIProviderId.PERPLEXITY, [
-            {"perplexity"},
-            {"pplx"},
-        ]),
-                (AIProviderId.CLAUDE, [
-            {"claude"},
-            {"anthropic"},
-        ]),
-        (AIProviderId.HUGGINGFACE, [
-            {"hugging", "face"},
-            {"huggingface"},
-            {"hf"},
-        ]),
-(AIProviderId.CLOUD_AI, [
-            {"cloud", "ai"},
-            {"gemini"},
-            {"google", "ai"},
-        ]),
-        (AIProviderId.NOTION_CALENDAR, [
-            {"notion", "calendar"},
-            {"notion"},
-            {"calendario", "notion"},
-        ]),
-        (AIProviderId.PRO_ACTOR, [
-            {"pro", "actor"},
-            {"proactor"},
-            {"pro", "attore"},  # occasional IT STT
-        ]),
-        (AIProviderId.ECHO, [
-            {"echo"},
-            {"eco"},  # IT STT common for "echo"
-        ]),
-    ]
-
-    for provider_id, alias_sets in alias_map:
+    for provider_id, alias_sets in _ALIAS_MAP:
         for aset in alias_sets:
             if aset.issubset(toks):
-                return provider_id
+                return ProviderMatch(provider_id, frozenset(aset | (toks & _INTENT_TOKENS)))
 
+    # STT mishearings ("perplexiti", "jemini", "ciat gpt")
+    if _fuzzy_enabled():
+        return _fuzzy_match(t.split(), _fuzzy_min_score())
     return None
 
 
+def infer_ai_provider_override_from_text(user_text: str) -> Optional[AIProviderId]:
+    m = match_ai_provider_override(user_text)
+    return m.provider if m is not None else None
+
+
 def pick_default_provider() -> AIProviderId:
-    import os
     v = (os.getenv("HALO_AI_DEFAULT_PROVIDER") or "echo").strip().lower()
     try:
         return AIProviderId(v)
     except Exception:
         return AIProviderId.ECHO
 
+def pick_budget_fallback_provider() -> AIProviderId:
+    """
+    Provider used when a tenant is over its usage budget (cheaper engine or echo).
+    Configurable via HALO_AI_BUDGET_FALLBACK_PROVIDER (default echo).
+    """
+    v = (os.getenv("HALO_AI_BUDGET_FALLBACK_PROVIDER") or "echo").strip().lower()
+    try:
+        return AIProviderId(v)
+    except Exception:
+        return AIProviderId.ECHO
+
+def bootstrap_enabled_providers() -> list[AIProviderId]:
+    """
+    Providers candidable per bootstrap gating config (docs/specs/ai-provider-gating.md):
+    HALO_AI_PROVIDERS_ENABLED (CSV allowlist, optional) minus HALO_AI_PROVIDERS_DISABLED (CSV).
+    """
+    def _csv(name: str) -> set[str]:
+        return {x.strip().lower() for x in (os.getenv(name) or "").split(",") if x.strip()}
+
+    enabled = _csv("HALO_AI_PROVIDERS_ENABLED")
+    disabled = _csv("HALO_AI_PROVIDERS_DISABLED")
+    return [
+        p for p in AIProviderId
+        if (not enabled or p.value in enabled) and p.value not in disabled
+    ]
+
+
+def provider_enabled(provider: AIProviderId) -> bool:
+    """Bootstrap gating check; echo is the local fallback and always available."""
+    return provider == AIProviderId.ECHO or provider in bootstrap_enabled_providers()
+
+
+def gate_provider(provider: AIProviderId) -> AIProviderId:
+    """
+    A provider excluded by bootstrap gating is never selected: fall back to the
+    default provider if that is enabled, otherwise to echo.
+    """
+    if provider_enabled(provider):
+        return provider
+    default_provider = pick_default_provider()
+    return default_provider if provider_enabled(default_provider) else AIProviderId.ECHO
+
 # --- Auto-routing policy (MVP) ---
-def _env_truthy(name: str) -> bool:
-    import os
-    v = (os.getenv(name) or "").strip().lower()
-    return v in ("1", "true", "yes", "y", "on")
 
+# Web/search/news intent (research-type queries)
+_SEARCH_TOKENS = (
+    "news", "notizie", "oggi", "ieri", "ultima", "ultime", "latest", "recent",
+    "prezzo", "quanto costa", "costi", "media", "con fonti", "fonti", "citazioni",
+    "sources", "cita le fonti", "cerca", "ricerca", "search", "web",
+)
+
+
+def is_search_query(user_text: str) -> bool:
+    t = (user_text or "").strip().lower()
+    return any(tok in t for tok in _SEARCH_TOKENS)
 
-def pick_provider_for_request(user_text: str) -> AIProviderId:
+
+def pick_provider_for_request(user_text: str, over_budget: bool = False) -> AIProviderId:
     """
     Policy-based provider selection when there is NO explicit voice override.
     Enable with HALO_AI_AUTO_ROUTING=1.
+    When the tenant is over budget the budget fallback provider always wins.
     """
+    if over_budget:
+        return pick_budget_fallback_provider()
+
     default_provider = pick_default_provider()
 
-    if not _env_truthy("HALO_AI_AUTO_ROUTING"):
+    if not env_flag("HALO_AI_AUTO_ROUTING"):
         return default_provider
 
     t = (user_text or "").strip().lower()
 
-    # Calendar / scheduling intent -> Notion Calendar (placeholder)
+    # Calendar / scheduling intent -> Notion Calendar (local calendar action stage)
     cal_tokens = (
         "calendario", "agenda", "appuntamento", "riunione", "meeting",
         "notion calendar", "notion calendario", "invito", "invita", "schedule",
@@ -145,12 +334,7 @@ def pick_provider_for_request(user_text: str) -> AIProviderId:
         return AIProviderId.PRO_ACTOR
 
     # Web/search/news intent -> Perplexity
-    search_tokens = (
-        "news", "notizie", "oggi", "ieri", "ultima", "ultime", "latest", "recent",
-        "prezzo", "quanto costa", "costi", "media", "con fonti", "fonti", "citazioni",
-        "sources", "cita le fonti", "cerca", "ricerca", "search", "web",
-    )
-    if any(tok in t for tok in search_tokens):
+    if is_search_query(t):
         return AIProviderId.PERPLEXITY
 
     # Claude and Hugging Face are explicit-override providers in MVP;
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from typing import Any, List
+
+from app.shared_state import SharedState, activate
+
+
+# Multi-worker launcher: N uvicorn workers on one port via SO_REUSEPORT
+# (the kernel load-balances accepted connections), with tenant caps,
+# rate-limit counters and session routing state kept in shared memory.
+# Each worker gets HALO_WORKER_ID, so file outputs (audit log, usage flush)
+# go to per-worker paths instead of racing on one file.
+#
+#   python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+#
+# Platforms without SO_REUSEPORT (Windows) fall back to a single worker.
+
+
+def _reuseport_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(worker_id: int, shm_name: str, lock: Any, host: str, port: int, log_level: str) -> None:
+    import uvicorn
+
+    os.environ["HALO_WORKER_ID"] = str(worker_id)
+
+    state = SharedState.attach(shm_name, lock)
+    activate(state)
+    try:
+        sock = _reuseport_socket(host, port)
+        config = uvicorn.Config("app.main:app", host=host, port=port, log_level=log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        state.close()
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the Halo orchestrator with N workers sharing one port.")
+    parser.add_argument("--host", default=os.getenv("HALO_HOST") or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("HALO_PORT") or "8000"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("HALO_WORKERS") or str(os.cpu_count() or 1)))
+    parser.add_argument("--tenant-slots", type=int, default=0, help="default: max(4096, 4 * HALO_MAX_TENANTS)")
+    parser.add_argument("--session-slots", type=int, default=65536)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, "SO_REUSEPORT") or args.workers <= 1:
+        import uvicorn
+
+        if args.workers > 1:
+            print("WARN: SO_REUSEPORT not available on this platform; running a single worker", file=sys.stderr)
+        uvicorn.run("app.main:app", host=args.host, port=args.port, log_level=args.log_level)
+        return 0
+
+    if args.tenant_slots <= 0:
+        try:
+            max_tenants = int((os.getenv("HALO_MAX_TENANTS") or "128").strip())
+        except ValueError:
+            max_tenants = 128
+        # Headroom keeps probe windows short enough that capped admission never hits a full window.
+        args.tenant_slots = max(4096, 4 * max_tenants)
+
+    ctx = multiprocessing.get_context("spawn")
+    lock = ctx.Lock()
+    state = SharedState.create(lock, tenant_slots=args.tenant_slots, session_slots=args.session_slots)
+
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(i, state.shm.name, lock, args.host, args.port, args.log_level),
+            name=f"halo-worker-{i}",
+        )
+        for i in range(args.workers)
+    ]
+
+    def _stop(_signum: int, _frame: Any) -> None:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"START {args.workers} workers on http://{args.host}:{args.port} (shm={state.shm.name})")
+    try:
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    finally:
+        _stop(signal.SIGTERM, None)
+        for p in procs:
+            p.join(timeout=10)
+        state.close()
+
+    return 0 if all(p.exitcode in (0, -signal.SIGTERM) for p in procs) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from app.audio_routing import AudioRoute
+from app.env import env_float
+from app.provider_types import AIProviderId
+from app.shared_state import _PROVIDERS, _ROUTES, _key_hash
+
+
+# Session/tenant snapshots for fast restarts.
+#
+# File layout (little endian), both tables sorted by key hash:
+#   header:   magic "HALOSNP2" | n_tenants u32 | n_sessions u32
+#   tenants:  n_tenants  x key_hash u64 | last_seen u32 | pad
+#   sessions: n_sessions x key_hash u64 | audio_route u8 | ai_provider u8 | pad | last_seen u32
+#
+# Restore is lazy: startup only maps the file; sessions/tenants are looked up by
+# binary search on first use, so startup time does not depend on snapshot size.
+# Snapshots are incremental and copy-on-write: only keys marked dirty since the
+# last snapshot are re-encoded, unchanged runs are copied byte-wise from the
+# mapped previous file into a new file that atomically replaces it.
+# Conversation history is never persisted (GDPR minimization).
+#
+# Records carry a last-seen time (unix seconds) and expire after
+# HALO_SNAPSHOT_TTL_SEC (default 7 days, 0 = never): expired records are ignored
+# on lookup and dropped by a pruning rewrite (at most every _PRUNE_EVERY_SEC), so
+# the file stays bounded and idle restored tenants stop counting towards
+# HALO_MAX_TENANTS. A record is only re-marked when its content changes or its
+# stored last-seen is older than _REFRESH_SEC (or a quarter of the TTL), not on
+# every request. Files from the previous format (HALOSNP1) are ignored.
+
+
+_MAGIC = b"HALOSNP2"
+_HEADER = struct.Struct("<8sII")
+_TENANT = struct.Struct("<QI4x")
+_SESSION = struct.Struct("<QBB2xI")
+_TENANT_SEEN_OFF = 8
+_SESSION_SEEN_OFF = 12
+
+_REFRESH_SEC = 3600
+_PRUNE_EVERY_SEC = 3600
+
+
+def _lower_bound(buf, base: int, n: int, size: int, h: int) -> int:
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if struct.unpack_from("<Q", buf, base + mid * size)[0] < h:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _merge(old: bytes | mmap.mmap, base: int, n: int, size: int, updates: Dict[int, bytes]) -> Tuple[bytearray, int]:
+    """Merge sorted fixed-size records with sorted updates (same key replaces)."""
+    out = bytearray()
+    prev = 0
+    count = 0
+    for h in sorted(updates):
+        i = _lower_bound(old, base, n, size, h)
+        out += old[base + prev * size: base + i * size]
+        out += updates[h]
+        count += (i - prev) + 1
+        prev = i + 1 if i < n and struct.unpack_from("<Q", old, base + i * size)[0] == h else i
+    out += old[base + prev * size: base + n * size]
+    count += n - prev
+    return out, count
+
+
+def _prune(records: bytearray, size: int, seen_off: int, cutoff: int) -> Tuple[bytearray, int]:
+    """Drop records last seen before cutoff (order is kept)."""
+    out = bytearray()
+    for off in range(0, len(records), size):
+        if struct.unpack_from("<I", records, off + seen_off)[0] >= cutoff:
+            out += records[off: off + size]
+    return out, len(out) // size
+
+
+class SessionSnapshot:
+    def __init__(self, path: Optional[str], interval_sec: float = 5.0, ttl_sec: float = 7 * 86400) -> None:
+        self.path = Path(path) if path else None
+        self.interval_sec = max(0.5, interval_sec)
+        self.ttl_sec = max(0, int(ttl_sec))
+        self.restored_tenants = 0  # live tenants in the snapshot found at startup
+        self.pruned = 0  # records dropped as expired
+
+        self._fh = None
+        self._mm: Optional[mmap.mmap] = None
+        self._n_tenants = 0
+        self._n_sessions = 0
+        self._dirty_sessions: Dict[int, bytes] = {}
+        self._dirty_tenants: Dict[int, bytes] = {}
+        self._pending_tenants: Set[int] = set()  # restored, not seen yet since startup
+        self._next_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls) -> "SessionSnapshot":
+        return cls(
+            (os.getenv("HALO_SNAPSHOT_PATH") or "").strip() or None,
+            env_float("HALO_SNAPSHOT_INTERVAL_SEC", 5.0),
+            env_float("HALO_SNAPSHOT_TTL_SEC", 7 * 86400),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def pending_restored_tenants(self) -> int:
+        """Restored tenants not seen yet since startup (still count towards the tenant cap)."""
+        return len(self._pending_tenants)
+
+    def _cutoff(self) -> int:
+        return int(time.time()) - self.ttl_sec if self.ttl_sec else 0
+
+    # --- lazy restore ---
+
+    def _open(self) -> None:
+        self._close_map()
+        if self.path is None or not self.path.exists() or self.path.stat().st_size < _HEADER.size:
+            return
+        self._fh = open(self.path, "rb")
+        mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_t, n_s = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or mm.size() != _HEADER.size + n_t * _TENANT.size + n_s * _SESSION.size:
+            # Unknown or truncated file: start empty rather than restoring garbage.
+            mm.close()
+            self._fh.close()
+            self._fh = None
+            return
+        self._mm, self._n_tenants, self._n_sessions = mm, n_t, n_s
+
+    def _close_map(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._n_tenants = self._n_sessions = 0
+
+    @property
+    def _sessions_off(self) -> int:
+        return _HEADER.size + self._n_tenants * _TENANT.size
+
+    def _stored_tenant(self, h: int) -> Optional[int]:
+        """last_seen of the tenant record (pending or on disk), expired ones included."""
+        rec = self._dirty_tenants.get(h)
+        if rec is not None:
+            return _TENANT.unpack(rec)[1]
+        if self._mm is None:
+            return None
+        i = _lower_bound(self._mm, _HEADER.size, self._n_tenants, _TENANT.size, h)
+        if i >= self._n_tenants:
+            return None
+        slot_h, seen = _TENANT.unpack_from(self._mm, _HEADER.size + i * _TENANT.size)
+        return seen if slot_h == h else None
+
+    def _stored_session(self, h: int) -> Optional[Tuple[int, int, int]]:
+        """(route, provider, last_seen) of the session record (pending or on disk), expired ones included."""
+        rec = self._dirty_sessions.get(h)
+        if rec is not None:
+            return _SESSION.unpack(rec)[1:]
+        if self._mm is None:
+            return None
+        base = self._sessions_off
+        i = _lower_bound(self._mm, base, self._n_sessions, _SESSION.size, h)
+        if i >= self._n_sessions:
+            return None
+        slot_h, route, prov, seen = _SESSION.unpack_from(self._mm, base + i * _SESSION.size)
+        return (route, prov, seen) if slot_h == h else None
+
+    def has_tenant(self, tenant_id: str) -> bool:
+        seen = self._stored_tenant(_key_hash(tenant_id))
+        return seen is not None and seen >= self._cutoff()
+
+    def promote_tenant(self, tenant_id: str) -> bool:
+        """A restored tenant is back: stop counting it as pending. False if it was not restored."""
+        h = _key_hash(tenant_id)
+        if h not in self._pending_tenants:
+            return False
+        self._pending_tenants.discard(h)
+        return self.has_tenant(tenant_id)
+
+    def load_session(self, key: str) -> Optional[Tuple[AudioRoute, Optional[AIProviderId]]]:
+        stored = self._stored_session(_key_hash(key))
+        if stored is None or stored[2] < self._cutoff():
+            return None
+        route, prov, _ = stored
+        return (
+            _ROUTES[route - 1] if route else AudioRoute.GLASSES,
+            _PROVIDERS[prov - 1] if prov else None,
+        )
+
+    # --- incremental snapshots ---
+
+    def _stale(self, seen: int, now: int) -> bool:
+        return bool(self.ttl_sec) and now - seen >= min(_REFRESH_SEC, self.ttl_sec // 4)
+
+    def mark_session(self, key: str, audio_route: AudioRoute, ai_provider: Optional[AIProviderId]) -> None:
+        """Record a session for the next snapshot, if it changed (or its last-seen needs a refresh)."""
+        if self.path is None:
+            return
+        h = _key_hash(key)
+        route = _ROUTES.index(audio_route) + 1
+        prov = _PROVIDERS.index(ai_provider) + 1 if ai_provider is not None else 0
+        now = int(time.time())
+        stored = self._stored_session(h)
+        if stored is not None and stored[:2] == (route, prov) and not self._stale(stored[2], now):
+            return
+        self._dirty_sessions[h] = _SESSION.pack(h, route, prov, now)
+
+    def mark_tenant(self, tenant_id: str) -> None:
+        """Record a tenant as seen; only re-encoded when new or its last-seen needs a refresh."""
+        if self.path is None:
+            return
+        h = _key_hash(tenant_id)
+        now = int(time.time())
+        seen = self._stored_tenant(h)
+        if seen is not None and not self._stale(seen, now):
+            return
+        self._dirty_tenants[h] = _TENANT.pack(h, now)
+
+    async def start(self) -> None:
+        if self.path is None or self._task is not None:
+            return
+        self._open()
+        cutoff = self._cutoff()
+        self._pending_tenants = {
+            h for h, seen in (_TENANT.unpack_from(self._mm, _HEADER.size + i * _TENANT.size) for i in range(self._n_tenants))
+            if seen >= cutoff
+        } if self._mm is not None else set()
+        self.restored_tenants = len(self._pending_tenants)
+        self._next_prune = time.monotonic() + min(_PRUNE_EVERY_SEC, self.interval_sec)  # early first pass
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="halo-session-snapshot")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # No cancel(): an in-flight snapshot must finish before the map is closed.
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self.snapshot()
+        self._close_map()
+
+    async def snapshot(self) -> bool:
+        prune = bool(self.ttl_sec) and self._mm is not None and time.monotonic() >= self._next_prune
+        if self.path is None or (not self._dirty_sessions and not self._dirty_tenants and not prune):
+            return False
+        if prune:
+            self._next_prune = time.monotonic() + _PRUNE_EVERY_SEC
+
+        # Swap the dirty sets on the loop; the writer thread only sees its own copy.
+        sessions, self._dirty_sessions = self._dirty_sessions, {}
+        tenants, self._dirty_tenants = self._dirty_tenants, {}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            await asyncio.to_thread(self._write, tmp, sessions, tenants, self._cutoff() if prune else 0)
+            # Swap files on the loop so no lookup sees a half-replaced mapping
+            # (and Windows cannot replace a file that is still mapped).
+            self._close_map()
+            os.replace(tmp, self.path)
+        except OSError:
+            # Keep the changes for the next round.
+            for h, rec in sessions.items():
+                self._dirty_sessions.setdefault(h, rec)
+            for h, rec in tenants.items():
+                self._dirty_tenants.setdefault(h, rec)
+            return False
+        finally:
+            self._open()
+        if prune:
+            # Restored tenants that expired before coming back no longer hold a slot.
+            self._pending_tenants = {h for h in self._pending_tenants if self._stored_tenant(h) is not None}
+        return True
+
+    def _write(self, tmp: Path, sessions: Dict[int, bytes], tenants: Dict[int, bytes], cutoff: int) -> None:
+        old = self._mm if self._mm is not None else b""
+        n_t, n_s = self._n_tenants, self._n_sessions
+
+        tenant_bytes, tenant_count = _merge(old, _HEADER.size, n_t, _TENANT.size, tenants)
+        session_bytes, session_count = _merge(old, _HEADER.size + n_t * _TENANT.size, n_s, _SESSION.size, sessions)
+        if cutoff:
+            before = tenant_count + session_count
+            tenant_bytes, tenant_count = _prune(tenant_bytes, _TENANT.size, _TENANT_SEEN_OFF, cutoff)
+            session_bytes, session_count = _prune(session_bytes, _SESSION.size, _SESSION_SEEN_OFF, cutoff)
+            self.pruned += before - tenant_count - session_count
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as fh:
+            fh.write(_HEADER.pack(_MAGIC, tenant_count, session_count))
+            fh.write(tenant_bytes)
+            fh.write(session_bytes)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval_sec)
+            except asyncio.TimeoutError:
+                await self.snapshot()
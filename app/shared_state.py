@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+from app.audio_routing import AudioRoute
+from app.provider_types import AIProviderId
+
+
+# Cross-process state for multi-worker deployments (see app/serve.py).
+#
+# One shared-memory segment holds two fixed-size open-addressing tables:
+# - tenants:  key_hash u64 | requests_total u64 | rate_window u32 | rate_count u32 | touched u32
+#             | budget_window u32 | budget_tokens u64 | budget_cost (micro-USD) u64
+# - sessions: key_hash u64 | audio_route u8 | ai_provider u8 | pad | touched u32
+# Every slot read/modify/write happens under a single multiprocessing.Lock
+# created by the launcher, so slot updates are atomic across workers.
+# key_hash 0 marks an empty slot.
+#
+# Probing is bounded to PROBE_LIMIT slots past the home slot, so a lookup costs
+# the same on a full table as on an empty one. Slots are never emptied: when
+# the probe window is full, the least recently touched entry is replaced in
+# place (LRU), which keeps every probe chain contiguous. Sessions are always
+# evicted that way; tenants only when there is no distinct-tenant cap (with a
+# cap, evicting would forget counted tenants, so admission is refused instead).
+# Evictions and refusals are counted in the header and exposed by stats().
+
+
+_MAGIC = 0x48414C4F  # "HALO"
+# magic, tenant_slots, session_slots, tenant_count, tenant_evictions, session_evictions, tenant_full
+_HEADER = struct.Struct("<IIIQQQQ")
+_TENANT = struct.Struct("<QQIIIIQQ")
+_SESSION = struct.Struct("<QBB2xI")
+_TENANT_TOUCHED = 24  # byte offset of "touched" inside a tenant slot
+_SESSION_TOUCHED = 12
+
+PROBE_LIMIT = 32
+
+_ROUTES = list(AudioRoute)
+_PROVIDERS = list(AIProviderId)
+
+
+def _key_hash(key: str) -> int:
+    h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1
+
+
+def _now() -> int:
+    return int(time.time()) & 0xFFFFFFFF
+
+
+def worker_id() -> Optional[str]:
+    """Worker index set by the multi-worker launcher (HALO_WORKER_ID), None in single-process mode."""
+    return (os.getenv("HALO_WORKER_ID") or "").strip() or None
+
+
+class SharedState:
+    def __init__(self, shm: shared_memory.SharedMemory, lock: Any, owner: bool) -> None:
+        self.shm = shm
+        self.lock = lock
+        self.owner = owner
+        magic, self.tenant_slots, self.session_slots = _HEADER.unpack_from(shm.buf, 0)[:3]
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory segment {shm.name} is not a Halo state segment")
+        self._tenants_off = _HEADER.size
+        self._sessions_off = self._tenants_off + self.tenant_slots * _TENANT.size
+
+    @staticmethod
+    def segment_size(tenant_slots: int, session_slots: int) -> int:
+        return _HEADER.size + tenant_slots * _TENANT.size + session_slots * _SESSION.size
+
+    @classmethod
+    def create(cls, lock: Any, tenant_slots: int = 4096, session_slots: int = 65536) -> "SharedState":
+        size = cls.segment_size(tenant_slots, session_slots)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, tenant_slots, session_slots, 0, 0, 0, 0)
+        return cls(shm, lock, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, lock: Any) -> "SharedState":
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Spawned workers share the launcher's resource tracker, so attaching
+            # here does not cause the segment to be unlinked on worker exit.
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, lock, owner=False)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _find(self, base: int, slots: int, size: int, touched_off: int, h: int) -> Tuple[int, bool]:
+        """
+        Return (offset, found) within the probe window. When not found, offset is
+        the first empty slot or, if the window is full, the least recently touched one.
+        """
+        buf = self.shm.buf
+        i = h % slots
+        lru_off, lru_touched = -1, 0
+        for _ in range(min(slots, PROBE_LIMIT)):
+            off = base + i * size
+            slot_h = struct.unpack_from("<Q", buf, off)[0]
+            if slot_h == h:
+                return off, True
+            if slot_h == 0:
+                return off, False
+            touched = struct.unpack_from("<I", buf, off + touched_off)[0]
+            if lru_off < 0 or touched < lru_touched:
+                lru_off, lru_touched = off, touched
+            i = (i + 1) % slots
+        return lru_off, False
+
+    def _bump(self, field: int) -> None:
+        hdr = list(_HEADER.unpack_from(self.shm.buf, 0))
+        hdr[field] += 1
+        _HEADER.pack_into(self.shm.buf, 0, *hdr)
+
+    # --- tenants ---
+
+    def tenant_count(self) -> int:
+        return _HEADER.unpack_from(self.shm.buf, 0)[3]
+
+    def admit_tenant(self, tenant_id: str, max_tenants: int) -> bool:
+        """Register a request for tenant_id; False if it would exceed the distinct-tenant cap."""
+        h = _key_hash(tenant_id)
+        buf = self.shm.buf
+        with self.lock:
+            off, found = self._find(self._tenants_off, self.tenant_slots, _TENANT.size, _TENANT_TOUCHED, h)
+            if not found:
+                count = self.tenant_count()
+                if max_tenants > 0 and count >= max_tenants:
+                    return False
+                if struct.unpack_from("<Q", buf, off)[0] != 0:
+                    if max_tenants > 0:
+                        self._bump(6)  # probe window full: size --tenant-slots above the cap
+                        return False
+                    self._bump(4)
+                else:
+                    self._bump(3)
+                _TENANT.pack_into(buf, off, h, 0, 0, 0, 0, 0, 0, 0)
+            _, total, window, rate, _, *budget = _TENANT.unpack_from(buf, off)
+            _TENANT.pack_into(buf, off, h, total + 1, window, rate, _now(), *budget)
+            return True
+
+    def hit_rate_limit(self, tenant_id: str, limit_per_min: int) -> bool:
+        """Count one request in the tenant's fixed 1-minute window; True if over the limit."""
+        h = _key_hash(tenant_id)
+        minute = int(time.time() // 60) & 0xFFFFFFFF
+        buf = self.shm.buf
+        with self.lock:
+            off, found = self._find(self._tenants_off, self.tenant_slots, _TENANT.size, _TENANT_TOUCHED, h)
+            if not found:
+                return False
+            _, total, window, rate, _, *budget = _TENANT.unpack_from(buf, off)
+            if window != minute:
+                window, rate = minute, 0
+            rate += 1
+            _TENANT.pack_into(buf, off, h, total, window, rate, _now(), *budget)
+            return rate > limit_per_min
+
+    def add_usage(self, tenant_id: str, tokens: int, cost_usd: float, window_sec: float) -> Optional[Tuple[int, float]]:
+        """Add to the tenant's global budget window; returns (tokens, cost_usd) used, None if not tracked."""
+        return self._budget(tenant_id, tokens, cost_usd, window_sec)
+
+    def usage_window(self, tenant_id: str, window_sec: float) -> Optional[Tuple[int, float]]:
+        return self._budget(tenant_id, 0, 0.0, window_sec)
+
+    def _budget(self, tenant_id: str, tokens: int, cost_usd: float, window_sec: float) -> Optional[Tuple[int, float]]:
+        h = _key_hash(tenant_id)
+        now = _now()
+        buf = self.shm.buf
+        with self.lock:
+            off, found = self._find(self._tenants_off, self.tenant_slots, _TENANT.size, _TENANT_TOUCHED, h)
+            if not found:
+                return None
+            _, total, window, rate, touched, b_start, b_tokens, b_cost = _TENANT.unpack_from(buf, off)
+            if b_start == 0 or now - b_start >= window_sec:
+                b_start, b_tokens, b_cost = now, 0, 0
+            b_tokens += max(0, tokens)
+            b_cost += max(0, round(cost_usd * 1_000_000))
+            _TENANT.pack_into(buf, off, h, total, window, rate, touched, b_start, b_tokens, b_cost)
+        return b_tokens, b_cost / 1_000_000
+
+    # --- sessions ---
+
+    def load_session(self, key: str) -> Optional[Tuple[AudioRoute, Optional[AIProviderId]]]:
+        h = _key_hash(key)
+        with self.lock:
+            off, found = self._find(self._sessions_off, self.session_slots, _SESSION.size, _SESSION_TOUCHED, h)
+            if not found:
+                return None
+            _, route, prov, _ = _SESSION.unpack_from(self.shm.buf, off)
+            _SESSION.pack_into(self.shm.buf, off, h, route, prov, _now())
+        return _decode_session(route, prov)
+
+    def store_session(
+        self,
+        key: str,
+        audio_route: AudioRoute,
+        ai_provider: Optional[AIProviderId],
+        base: Optional[Tuple[AudioRoute, Optional[AIProviderId]]] = None,
+    ) -> Tuple[AudioRoute, Optional[AIProviderId]]:
+        """
+        Publish a session's state and return what is stored afterwards.
+
+        `base` is the state this worker loaded before changing it: fields still
+        equal to it were not changed here and keep the stored value, so
+        concurrent updates of the other field on other workers are not lost.
+        """
+        h = _key_hash(key)
+        route = _ROUTES.index(audio_route) + 1
+        prov = _PROVIDERS.index(ai_provider) + 1 if ai_provider is not None else 0
+        with self.lock:
+            off, found = self._find(self._sessions_off, self.session_slots, _SESSION.size, _SESSION_TOUCHED, h)
+            if found and base is not None:
+                _, cur_route, cur_prov, _ = _SESSION.unpack_from(self.shm.buf, off)
+                if audio_route == base[0]:
+                    route = cur_route
+                if ai_provider == base[1]:
+                    prov = cur_prov
+            elif not found and struct.unpack_from("<Q", self.shm.buf, off)[0] != 0:
+                self._bump(5)
+            _SESSION.pack_into(self.shm.buf, off, h, route, prov, _now())
+        return _decode_session(route, prov)
+
+    def stats(self) -> Dict[str, Any]:
+        _, ts, ss, count, tenant_ev, session_ev, tenant_full = _HEADER.unpack_from(self.shm.buf, 0)
+        return {
+            "tenant_slots": ts,
+            "session_slots": ss,
+            "probe_limit": PROBE_LIMIT,
+            "tenants": count,
+            "tenant_evictions": tenant_ev,
+            "tenant_table_full": tenant_full,
+            "session_evictions": session_ev,
+        }
+
+
+def _decode_session(route: int, prov: int) -> Tuple[AudioRoute, Optional[AIProviderId]]:
+    return (
+        _ROUTES[route - 1] if route else AudioRoute.GLASSES,
+        _PROVIDERS[prov - 1] if prov else None,
+    )
+
+
+_ACTIVE: Optional[SharedState] = None
+
+
+def activate(state: Optional[SharedState]) -> None:
+    global _ACTIVE
+    _ACTIVE = state
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """Shared state of this worker, or None in single-process mode."""
+    return _ACTIVE
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Dict, Optional, Set
+
+from app.env import env_flag, env_float, env_int
+from app.provider_selection import _norm
+from app.provider_types import AIProviderId
+
+
+# Speculative prefetch on partial STT transcripts.
+#
+# The glasses stream interim transcripts to /api/v1/conversation/partial while
+# the user is still speaking. Each partial replaces the session's speculation:
+# routing is predicted (never persisted), the upstream connection is warmed and,
+# with HALO_SPECULATIVE_GENERATION=1, a generation is started on the partial text.
+#
+# When the final utterance arrives, the speculation is committed only if its
+# normalized text is close enough to the final one (normalized-prefix similarity,
+# HALO_SPECULATION_MIN_SIMILARITY) and the final routing/history agree; otherwise
+# it is discarded (task cancelled, or its usage recorded if it already finished).
+# Similarity only validates the predicted routing and warm-up: a generated reply
+# is reused only when the normalized texts are equal, since a near-identical
+# prefix can still ask something else ("12 times 13" vs "12 times 134").
+# A cancelled generation may already have been billed upstream, so its estimated
+# prompt tokens are recorded too (on_cancelled hook).
+#
+# Speculative generations spend real tokens, so they are limited per tenant
+# (HALO_SPECULATION_GENERATIONS_PER_MIN) and skipped for tenants over budget;
+# partials beyond the limit only warm the connection.
+#
+# Speculations are per worker: in multi-worker mode a final landing on another
+# worker is simply a miss.
+
+
+def prefix_similarity(a: str, b: str) -> float:
+    """Shared normalized prefix length over the longer normalized text (1.0 = same text)."""
+    a, b = _norm(a), _norm(b)
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i / max(len(a), len(b))
+
+
+@dataclass
+class Speculation:
+    tenant_id: str
+    text: str  # partial transcript the prediction was made on
+    requested: AIProviderId
+    history_len: int
+    created: float
+    task: Optional[asyncio.Task] = None  # speculative generate_reply()
+    est_prompt_tokens: int = 0  # recorded if the generation is cancelled
+
+
+class SpeculationStore:
+    def __init__(
+        self,
+        ttl_sec: float = 10.0,
+        min_similarity: float = 0.95,
+        min_chars: int = 12,
+        max_entries: int = 1024,
+        generation: bool = False,
+        generations_per_min: int = 30,
+    ) -> None:
+        self.ttl_sec = ttl_sec
+        self.min_similarity = min_similarity
+        self.min_chars = min_chars
+        self.max_entries = max(1, max_entries)
+        self.generation = generation
+        self.generations_per_min = max(0, generations_per_min)
+        # Called with (speculation, ProviderResult) for generations that finished but were not used.
+        self.on_wasted_result: Optional[Callable[[Speculation, Any], None]] = None
+        # Called with the speculation whose generation was cancelled before it finished.
+        self.on_cancelled: Optional[Callable[[Speculation], None]] = None
+
+        self._entries: Dict[str, Speculation] = {}
+        self._background: Set[asyncio.Task] = set()
+        # tenant -> [minute_window, generations started]
+        self._gen_rate: Dict[str, list] = {}
+
+        self.partials = 0
+        self.generations_started = 0
+        self.committed = 0  # final matched the speculation and its generation was used
+        self.routing_hits = 0  # final matched, routing was right, no generation to reuse
+        self.discarded = 0
+        self.generations_throttled = 0
+
+    @classmethod
+    def from_env(cls) -> "SpeculationStore":
+        return cls(
+            ttl_sec=env_float("HALO_SPECULATION_TTL_SEC", 10.0),
+            min_similarity=env_float("HALO_SPECULATION_MIN_SIMILARITY", 0.95),
+            min_chars=env_int("HALO_SPECULATION_MIN_CHARS", 12),
+            max_entries=env_int("HALO_SPECULATION_MAX_ENTRIES", 1024),
+            generation=env_flag("HALO_SPECULATIVE_GENERATION"),
+            generations_per_min=env_int("HALO_SPECULATION_GENERATIONS_PER_MIN", 30),
+        )
+
+    def allow_generation(self, tenant_id: str) -> bool:
+        """Count one speculative generation in the tenant's 1-minute window; False once over the limit."""
+        minute = int(time.time() // 60)
+        w = self._gen_rate.get(tenant_id)
+        if w is None or w[0] != minute:
+            if len(self._gen_rate) >= self.max_entries:
+                self._gen_rate.clear()
+            w = self._gen_rate[tenant_id] = [minute, 0]
+        if w[1] >= self.generations_per_min:
+            self.generations_throttled += 1
+            return False
+        w[1] += 1
+        return True
+
+    def spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Fire-and-forget helper (e.g. connection warm-up) that is cancelled on stop()."""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def get(self, key: str) -> Optional[Speculation]:
+        spec = self._entries.get(key)
+        if spec is not None and time.monotonic() - spec.created > self.ttl_sec:
+            self.discard(key)
+            return None
+        return spec
+
+    def put(self, key: str, spec: Speculation) -> None:
+        self.partials += 1
+        self.discard(key, count=False)
+        while len(self._entries) >= self.max_entries:
+            self.discard(next(iter(self._entries)))
+        self._entries[key] = spec
+        if spec.task is not None:
+            self.generations_started += 1
+
+    def discard(self, key: str, count: bool = True) -> None:
+        spec = self._entries.pop(key, None)
+        if spec is None:
+            return
+        if count:
+            self.discarded += 1
+        self._drop_task(spec)
+
+    def _drop_task(self, spec: Speculation) -> None:
+        task = spec.task
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+            if self.on_cancelled is not None:
+                self.on_cancelled(spec)
+        elif not task.cancelled() and task.exception() is None and self.on_wasted_result is not None:
+            # Tokens were spent anyway: account for them.
+            self.on_wasted_result(spec, task.result())
+
+    async def resolve(
+        self,
+        key: str,
+        final_text: str,
+        requested: AIProviderId,
+        history_len: int,
+    ) -> Optional[Any]:
+        """
+        Commit or discard the session's speculation for the final utterance.
+        Returns the speculative ProviderResult when it can be used as the reply.
+        """
+        spec = self.get(key)
+        if spec is None:
+            return None
+        del self._entries[key]
+
+        if (
+            spec.requested != requested
+            or spec.history_len != history_len
+            or prefix_similarity(spec.text, final_text) < self.min_similarity
+        ):
+            self.discarded += 1
+            self._drop_task(spec)
+            return None
+
+        if spec.task is None or spec.task.cancelled():
+            self.routing_hits += 1
+            return None
+        if _norm(spec.text) != _norm(final_text):
+            # Routing/warm-up hold, but the reply answers different text.
+            self.routing_hits += 1
+            self._drop_task(spec)
+            return None
+        try:
+            result = await spec.task
+        except Exception:
+            self.discarded += 1
+            return None
+        self.committed += 1
+        return result
+
+    async def stop(self) -> None:
+        for key in list(self._entries):
+            self.discard(key, count=False)
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation_enabled": self.generation,
+            "min_similarity": self.min_similarity,
+            "ttl_sec": self.ttl_sec,
+            "active": len(self._entries),
+            "partials": self.partials,
+            "generations_started": self.generations_started,
+            "committed": self.committed,
+            "routing_hits": self.routing_hits,
+            "discarded": self.discarded,
+            "generations_per_min": self.generations_per_min,
+            "generations_throttled": self.generations_throttled,
+        }
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.env import env_float, env_int
+from app.provider_types import AIProviderId
+from app.shared_state import get_shared_state, worker_id
+
+
+# Per-tenant / per-provider token + cost accounting.
+#
+# Counters are plain lists mutated only from the event loop thread, so the hot
+# path needs no locks; readers (admin endpoint, periodic flush) take a copy.
+# Budgets are evaluated over a rolling window (HALO_USAGE_BUDGET_WINDOW_SEC)
+# and drive the budget throttle in pick_provider_for_request.
+#
+# Multi-worker launcher (app/serve.py):
+# - budget windows live in shared memory, so a tenant's budget is global
+#   (not N x the configured limit)
+# - per-provider counters stay per worker; each worker flushes its own
+#   <stem>.worker-<N><suffix> file and /api/v1/admin/usage merges them
+#   (other workers' figures are as of their last flush)
+
+
+# USD per 1K tokens (input, output, cached input, cache write). Override with
+# HALO_AI_PRICING_JSON, e.g. '{"openai": [0.00015, 0.0006, 0.000075], "perplexity": [0.001, 0.001]}'
+# (cached input and cache write default to the input price when omitted).
+DEFAULT_PRICING_PER_1K: Dict[AIProviderId, Tuple[float, ...]] = {
+    AIProviderId.OPENAI: (0.00015, 0.0006, 0.000075),
+    AIProviderId.PERPLEXITY: (0.001, 0.001, 0.001),
+    AIProviderId.CLAUDE: (0.001, 0.005, 0.0001, 0.00125),
+    AIProviderId.HUGGINGFACE: (0.0, 0.0, 0.0),
+    AIProviderId.CLOUD_AI: (0.0003, 0.0025, 0.000075),
+    AIProviderId.NOTION_CALENDAR: (0.0, 0.0, 0.0),
+    AIProviderId.PRO_ACTOR: (0.0, 0.0, 0.0),
+    AIProviderId.ECHO: (0.0, 0.0, 0.0),
+}
+
+# Counter slots
+_REQUESTS, _PROMPT, _COMPLETION, _COST, _CACHED = range(5)
+
+
+def load_pricing() -> Dict[AIProviderId, Tuple[float, ...]]:
+    pricing = dict(DEFAULT_PRICING_PER_1K)
+    raw = (os.getenv("HALO_AI_PRICING_JSON") or "").strip()
+    if not raw:
+        return pricing
+    try:
+        for k, v in json.loads(raw).items():
+            pricing[AIProviderId(k)] = tuple(float(x) for x in v)
+    except Exception:
+        # Bad pricing config must never take the orchestrator down.
+        pass
+    return pricing
+
+
+def load_budgets() -> Dict[str, Dict[str, float]]:
+    """Per-tenant overrides: HALO_TENANT_BUDGETS_JSON='{"acme": {"tokens": 100000, "cost_usd": 5}}'."""
+    raw = (os.getenv("HALO_TENANT_BUDGETS_JSON") or "").strip()
+    if not raw:
+        return {}
+    try:
+        return {str(k): {kk: float(vv) for kk, vv in v.items()} for k, v in json.loads(raw).items()}
+    except Exception:
+        return {}
+
+
+class UsageAccounting:
+    def __init__(
+        self,
+        pricing: Optional[Dict[AIProviderId, Tuple[float, ...]]] = None,
+        token_budget: int = 0,
+        cost_budget_usd: float = 0.0,
+        tenant_budgets: Optional[Dict[str, Dict[str, float]]] = None,
+        budget_window_sec: float = 86400.0,
+        flush_path: Optional[str] = None,
+        flush_interval_sec: float = 60.0,
+        worker_files_glob: Optional[str] = None,
+    ) -> None:
+        self.pricing = pricing if pricing is not None else dict(DEFAULT_PRICING_PER_1K)
+        self.token_budget = max(0, token_budget)
+        self.cost_budget_usd = max(0.0, cost_budget_usd)
+        self.tenant_budgets = tenant_budgets or {}
+        self.budget_window_sec = max(1.0, budget_window_sec)
+        self.flush_path = Path(flush_path) if flush_path else None
+        self.flush_interval_sec = max(1.0, flush_interval_sec)
+        self.worker_files_glob = worker_files_glob  # flush files of all workers (multi-worker mode)
+
+        # (tenant, provider) -> [requests, prompt_tokens, completion_tokens, cost_usd, cached_tokens]
+        self._by_tenant_provider: Dict[Tuple[str, str], list] = {}
+        # tenant -> [window_start_monotonic, tokens, cost_usd]
+        self._window: Dict[str, list] = {}
+        self._started_at = datetime.now(timezone.utc)
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "UsageAccounting":
+        flush_path = (os.getenv("HALO_USAGE_FLUSH_PATH") or "").strip() or None
+        worker_files_glob = None
+        wid = worker_id()
+        if flush_path and wid is not None:
+            # Multi-worker launcher: one file per worker (usage.json -> usage.worker-0.json).
+            p = Path(flush_path)
+            flush_path = str(p.with_name(f"{p.stem}.worker-{wid}{p.suffix}"))
+            worker_files_glob = f"{p.stem}.worker-*{p.suffix}"
+        return cls(
+            pricing=load_pricing(),
+            token_budget=env_int("HALO_TENANT_TOKEN_BUDGET", 0),
+            cost_budget_usd=env_float("HALO_TENANT_COST_BUDGET_USD", 0.0),
+            tenant_budgets=load_budgets(),
+            budget_window_sec=env_float("HALO_USAGE_BUDGET_WINDOW_SEC", 86400.0),
+            flush_path=flush_path,
+            flush_interval_sec=env_float("HALO_USAGE_FLUSH_INTERVAL_SEC", 60.0),
+            worker_files_glob=worker_files_glob,
+        )
+
+    def cost_usd(
+        self,
+        provider: AIProviderId,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
+        """
+        prompt_tokens includes cached_tokens and cache_write_tokens (normalized
+        usage); both are billed at their own rates instead of the input rate.
+        """
+        p = self.pricing.get(provider) or (0.0, 0.0)
+        p_in, p_out = p[0], p[1]
+        p_cached = p[2] if len(p) > 2 else p_in
+        p_write = p[3] if len(p) > 3 else p_in
+        cached = min(max(0, cached_tokens), prompt_tokens)
+        written = min(max(0, cache_write_tokens), prompt_tokens - cached)
+        plain = prompt_tokens - cached - written
+        return (plain * p_in + cached * p_cached + written * p_write + completion_tokens * p_out) / 1000.0
+
+    def record(self, tenant_id: str, provider: AIProviderId, usage: Optional[Dict[str, int]]) -> None:
+        prompt = int((usage or {}).get("prompt_tokens") or 0)
+        completion = int((usage or {}).get("completion_tokens") or 0)
+        cached = int((usage or {}).get("cached_tokens") or 0)
+        cache_write = int((usage or {}).get("cache_write_tokens") or 0)
+        cost = self.cost_usd(provider, prompt, completion, cached, cache_write)
+
+        c = self._by_tenant_provider.get((tenant_id, provider.value))
+        if c is None:
+            c = self._by_tenant_provider[(tenant_id, provider.value)] = [0, 0, 0, 0.0, 0]
+        c[_REQUESTS] += 1
+        c[_PROMPT] += prompt
+        c[_COMPLETION] += completion
+        c[_COST] += cost
+        c[_CACHED] += cached
+
+        w = self._current_window(tenant_id)
+        w[1] += prompt + completion
+        w[2] += cost
+        shared = get_shared_state()
+        if shared is not None:
+            shared.add_usage(tenant_id, prompt + completion, cost, self.budget_window_sec)
+
+    def _current_window(self, tenant_id: str) -> list:
+        now = time.monotonic()
+        w = self._window.get(tenant_id)
+        if w is None or now - w[0] >= self.budget_window_sec:
+            w = self._window[tenant_id] = [now, 0, 0.0]
+        return w
+
+    def _window_used(self, tenant_id: str) -> Tuple[int, float]:
+        """(tokens, cost_usd) in the tenant's budget window: global in multi-worker mode."""
+        shared = get_shared_state()
+        if shared is not None:
+            used = shared.usage_window(tenant_id, self.budget_window_sec)
+            if used is not None:
+                return used
+        w = self._current_window(tenant_id)
+        return w[1], w[2]
+
+    def budget_for(self, tenant_id: str) -> Tuple[int, float]:
+        b = self.tenant_budgets.get(tenant_id) or {}
+        return int(b.get("tokens", self.token_budget)), float(b.get("cost_usd", self.cost_budget_usd))
+
+    def over_budget(self, tenant_id: str) -> bool:
+        max_tokens, max_cost = self.budget_for(tenant_id)
+        if not max_tokens and not max_cost:
+            return False
+        tokens, cost = self._window_used(tenant_id)
+        return bool((max_tokens and tokens >= max_tokens) or (max_cost and cost >= max_cost))
+
+    def snapshot(self) -> Dict[str, Any]:
+        tenants: Dict[str, Dict[str, Any]] = {}
+        for (tenant_id, provider_id), c in list(self._by_tenant_provider.items()):
+            t = tenants.setdefault(tenant_id, {"providers": {}, "totals": {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}})
+            row = {"requests": c[_REQUESTS], "prompt_tokens": c[_PROMPT], "completion_tokens": c[_COMPLETION], "cached_tokens": c[_CACHED], "cost_usd": round(c[_COST], 6)}
+            t["providers"][provider_id] = row
+            for k in ("requests", "prompt_tokens", "completion_tokens", "cached_tokens"):
+                t["totals"][k] += row[k]
+            t["totals"]["cost_usd"] = round(t["totals"]["cost_usd"] + c[_COST], 6)
+
+        for tenant_id, t in tenants.items():
+            max_tokens, max_cost = self.budget_for(tenant_id)
+            tokens, cost = self._window_used(tenant_id)
+            t["budget"] = {
+                "window_sec": self.budget_window_sec,
+                "tokens_used": tokens,
+                "cost_usd_used": round(cost, 6),
+                "tokens_limit": max_tokens,
+                "cost_usd_limit": max_cost,
+                "over_budget": self.over_budget(tenant_id),
+            }
+
+        return {
+            "since_utc": self._started_at.isoformat(),
+            "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+            "tenants": tenants,
+        }
+
+    async def start(self) -> None:
+        if self.flush_path is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="halo-usage-flush")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self.flush_path is None:
+            return
+        snap = self.snapshot()
+        await asyncio.to_thread(self._write, snap)
+
+    async def aggregate(self) -> Dict[str, Any]:
+        """Snapshot merged across workers (this worker live, the others as of their last flush)."""
+        snap = self.snapshot()
+        if self.flush_path is None or self.worker_files_glob is None:
+            return snap
+        others = await asyncio.to_thread(self._read_worker_files)
+        return merge_snapshots([snap, *others])
+
+    def _read_worker_files(self) -> list:
+        out = []
+        for path in sorted(self.flush_path.parent.glob(self.worker_files_glob)):
+            if path == self.flush_path:
+                continue
+            try:
+                out.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_sec)
+            try:
+                await self.flush()
+            except OSError:
+                # Keep counting in memory; the next flush retries.
+                pass
+
+    def _write(self, snap: Dict[str, Any]) -> None:
+        self.flush_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.flush_path.with_suffix(self.flush_path.suffix + ".tmp")
+        tmp.write_text(json.dumps(snap, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, self.flush_path)
+
+
+_COUNTER_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+
+
+def merge_snapshots(snaps: list) -> Dict[str, Any]:
+    """Sum per-provider counters of several worker snapshots; budget blocks come from the first one."""
+    merged: Dict[str, Any] = {
+        "since_utc": min(s.get("since_utc") or "" for s in snaps),
+        "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+        "workers": len(snaps),
+        "tenants": {},
+    }
+    for snap in snaps:
+        for tenant_id, t in (snap.get("tenants") or {}).items():
+            mt = merged["tenants"].setdefault(tenant_id, {"providers": {}, "totals": dict.fromkeys(_COUNTER_FIELDS, 0)})
+            if "budget" in t:
+                mt.setdefault("budget", t["budget"])
+            for provider_id, row in (t.get("providers") or {}).items():
+                mrow = mt["providers"].setdefault(provider_id, dict.fromkeys(_COUNTER_FIELDS, 0))
+                for k in _COUNTER_FIELDS:
+                    mrow[k] += row.get(k) or 0
+                    mt["totals"][k] += row.get(k) or 0
+    for t in merged["tenants"].values():
+        t["totals"]["cost_usd"] = round(t["totals"]["cost_usd"], 6)
+        for row in t["providers"].values():
+            row["cost_usd"] = round(row["cost_usd"], 6)
+    return merged
@@ -0,0 +1,49 @@
+from app.ai_provider import _chat_messages, _encode_json, _usage_anthropic, _usage_openai
+
+
+def test_chat_messages_keep_stable_prefix_across_turns(monkeypatch):
+    monkeypatch.setenv("HALO_AI_SYSTEM_PROMPT", "You are Halo.")
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+    turn_1 = _encode_json({"model": "m", "messages": _chat_messages("what time is it", {"history": history})})
+    turn_2 = _encode_json({"model": "m", "messages": _chat_messages("and tomorrow", {"history": history})})
+
+    prefix = _encode_json({"model": "m", "messages": _chat_messages("", {"history": history})[:-1]})[:-2]
+    assert turn_1.startswith(prefix) and turn_2.startswith(prefix)
+    assert _chat_messages("x", {})[0] == {"role": "system", "content": "You are Halo."}
+
+
+def test_usage_reports_cached_tokens():
+    assert _usage_openai({"prompt_tokens": 2000, "completion_tokens": 10, "prompt_tokens_details": {"cached_tokens": 1536}}) == {
+        "prompt_tokens": 2000, "completion_tokens": 10, "cached_tokens": 1536,
+    }
+    assert _usage_anthropic({"input_tokens": 20, "output_tokens": 5, "cache_read_input_tokens": 1800, "cache_creation_input_tokens": 0}) == {
+        "prompt_tokens": 1820, "completion_tokens": 5, "cached_tokens": 1800, "cache_write_tokens": 0,
+    }
+
+
+def test_history_keeps_whole_turns(monkeypatch):
+    from app.main import _append_history
+
+    monkeypatch.setenv("HALO_AI_HISTORY_TURNS", "1")
+    st = {}
+    for i in range(3):
+        _append_history(st, f"q{i}", f"a{i}")
+    assert st["history"] == [{"role": "user", "content": "q2"}, {"role": "assistant", "content": "a2"}]
+
+
+def test_history_trim_keeps_replayed_prefix_stable(monkeypatch):
+    from app.main import _append_history
+
+    monkeypatch.setenv("HALO_AI_HISTORY_TURNS", "4")
+    st = {}
+    for i in range(5):
+        _append_history(st, f"q{i}", f"a{i}")
+    assert [m["content"] for m in st["history"]] == ["q3", "a3", "q4", "a4"]  # trimmed to 2 turns
+
+    prev = _encode_json({"model": "m", "messages": _chat_messages("next", st)[:-1]})[:-2]
+    for i in range(5, 7):  # up to the next trim (at 5 turns), each request extends the previous one
+        _append_history(st, f"q{i}", f"a{i}")
+        cur = _encode_json({"model": "m", "messages": _chat_messages("next", st)[:-1]})[:-2]
+        assert cur.startswith(prev)
+        prev = cur
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+from app.audit_log import AuditLog, redact
+
+
+def test_redact_masks_bearer_tokens_and_api_keys():
+    out = redact({
+        "routing_reason": "degraded_openai_error: Bearer sk-abcdefghijklmnop",
+        "api_key": "pplx-123",
+        "nested": ["key AIzaSyA1234567890abcdefghijkl", "token=abc123"],
+    })
+    assert "sk-abcdefghijklmnop" not in out["routing_reason"]
+    assert out["api_key"] == "[REDACTED]"
+    assert out["nested"] == ["key [REDACTED]", "token=[REDACTED]"]
+
+
+def test_audit_log_writes_batched_jsonl(tmp_path):
+    async def run():
+        log = AuditLog(str(tmp_path), fsync="always")
+        await log.start()
+        for i in range(5):
+            log.emit_routing("t1", f"s{i}", "openai", "openai", "default_policy:openai_chat_completions", 12.5)
+        await log.stop()
+        return log
+
+    log = asyncio.run(run())
+    lines = (tmp_path / "audit.jsonl").read_text(encoding="utf-8").splitlines()
+    assert log.written == 5
+    assert [json.loads(x)["session_id"] for x in lines] == [f"s{i}" for i in range(5)]
+    assert json.loads(lines[0])["latency_ms"] == 12.5
+
+
+def test_audit_log_drops_with_count_when_saturated(tmp_path):
+    async def run():
+        log = AuditLog(str(tmp_path), queue_max=2)
+        await log.start()
+        # No await in between: the writer cannot drain, so the queue saturates.
+        for i in range(5):
+            log.emit("routing", session_id=f"s{i}")
+        await log.stop()
+        return log
+
+    log = asyncio.run(run())
+    events = [json.loads(x) for x in (tmp_path / "audit.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert log.dropped == 3
+    assert events[-1]["kind"] == "audit_dropped"
+    assert events[-1]["dropped_total"] == 3
+
+
+def test_audit_log_disabled_is_noop():
+    log = AuditLog(None)
+    log.emit("routing", session_id="s1")
+    assert log.stats()["enabled"] is False
+
+
+def test_audit_log_survives_write_errors_and_stops(tmp_path, monkeypatch):
+    async def run():
+        log = AuditLog(str(tmp_path), queue_max=4, stop_timeout_sec=2.0)
+        real_write = log._write_batch
+        failures = iter([True, False])
+
+        def flaky_write(batch, force_fsync):
+            if next(failures, False):
+                raise OSError(28, "No space left on device")
+            real_write(batch, force_fsync)
+
+        monkeypatch.setattr(log, "_write_batch", flaky_write)
+        await log.start()
+        log.emit("routing", session_id="lost")
+        await asyncio.sleep(0.05)
+        for i in range(3):
+            log.emit("routing", session_id=f"s{i}")
+        await asyncio.wait_for(log.stop(), timeout=5)
+        return log
+
+    log = asyncio.run(run())
+    events = [json.loads(x) for x in (tmp_path / "audit.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert log.write_errors == 1 and log.lost == 1
+    assert [e["session_id"] for e in events] == ["s0", "s1", "s2"]
+
+
+def test_audit_log_stop_does_not_hang_on_stuck_writer(tmp_path, monkeypatch):
+    async def run():
+        log = AuditLog(str(tmp_path), queue_max=2, stop_timeout_sec=0.1)
+        monkeypatch.setattr(log, "_write_batch", lambda batch, force_fsync: time.sleep(0.5))
+        await log.start()
+        for i in range(5):
+            log.emit("routing", session_id=f"s{i}")
+        await asyncio.sleep(0.01)
+        for i in range(5):
+            log.emit("routing", session_id=f"t{i}")
+        await asyncio.wait_for(log.stop(), timeout=3)
+        return log
+
+    log = asyncio.run(run())
+    assert log.stats()["queued"] == 0 and log._task is None
@@ -0,0 +1,110 @@
+import asyncio
+
+from app.ai_provider import ProviderResult
+from app.fanout import FanoutConfig, generate_fanout, plan_providers
+from app.provider_types import AIProviderId
+from app.usage_accounting import UsageAccounting
+
+
+class ScriptedProvider:
+    """(delay_sec, ProviderResult) per provider."""
+
+    def __init__(self, script):
+        self.script = script
+
+    async def generate_reply(self, user_utterance, session_context, provider_requested):
+        delay, result = self.script[provider_requested]
+        await asyncio.sleep(delay)
+        return result
+
+
+def _res(p, text, citations=()):
+    return ProviderResult(text, p, f"{p.value}_ok", {"prompt_tokens": 10, "completion_tokens": 20}, tuple(citations))
+
+
+def _keys(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("GEMINI_API_KEY", "AIza-test")
+
+
+def test_deadline_returns_partial_results_and_strategy_picks_among_them(monkeypatch):
+    _keys(monkeypatch)
+    script = {
+        AIProviderId.PERPLEXITY: (0.01, _res(AIProviderId.PERPLEXITY, "short", ["https://a"])),
+        AIProviderId.OPENAI: (0.02, _res(AIProviderId.OPENAI, "a much longer answer without sources")),
+        AIProviderId.CLOUD_AI: (5.0, _res(AIProviderId.CLOUD_AI, "too late")),
+    }
+    cfg = FanoutConfig(deadline_sec=0.2, max_cost_usd=1.0)
+    out = asyncio.run(generate_fanout(ScriptedProvider(script), "latest news", {}, cfg, UsageAccounting().cost_usd))
+
+    assert out.chosen.provider_applied == AIProviderId.PERPLEXITY  # sources beat length
+    assert out.chosen.routing_note == "fanout_longest_with_sources_2of3:perplexity_ok"
+    assert [r.provider_applied for r in out.completed] == [AIProviderId.PERPLEXITY, AIProviderId.OPENAI]
+    assert out.unfinished == [AIProviderId.CLOUD_AI]
+
+    first = FanoutConfig(strategy="first_valid", deadline_sec=0.2, max_cost_usd=1.0)
+    out = asyncio.run(generate_fanout(ScriptedProvider(script), "latest news", {}, first, UsageAccounting().cost_usd))
+    assert out.chosen.reply_text == "short" and len(out.completed) == 1
+    assert out.unfinished == [AIProviderId.OPENAI, AIProviderId.CLOUD_AI]
+    assert out.errors == {AIProviderId.OPENAI: "cancelled", AIProviderId.CLOUD_AI: "cancelled"}
+
+
+def test_cost_cap_limits_secondaries(monkeypatch):
+    _keys(monkeypatch)
+    cost = UsageAccounting().cost_usd
+    # Perplexity (~0.0004) + OpenAI (~0.0002) fit; Gemini (~0.001) does not.
+    cfg = FanoutConfig(max_cost_usd=0.0008)
+    assert plan_providers("latest news", {}, cfg, cost) == [AIProviderId.PERPLEXITY, AIProviderId.OPENAI]
+    monkeypatch.delenv("OPENAI_API_KEY")
+    assert plan_providers("latest news", {}, FanoutConfig(max_cost_usd=0.0005), cost) == [AIProviderId.PERPLEXITY]
+
+
+def test_plan_respects_gating_and_caps_perplexity_too(monkeypatch):
+    _keys(monkeypatch)
+    cost = UsageAccounting().cost_usd
+    monkeypatch.setenv("HALO_AI_PROVIDERS_DISABLED", "openai")
+    assert plan_providers("latest news", {}, FanoutConfig(max_cost_usd=1.0), cost) == [AIProviderId.PERPLEXITY, AIProviderId.CLOUD_AI]
+    # Perplexity alone (~0.0004) over the cap: no fan-out at all.
+    assert plan_providers("latest news", {}, FanoutConfig(max_cost_usd=0.0001), cost) == []
+
+
+def test_degraded_fanout_reports_per_provider_reasons(monkeypatch):
+    _keys(monkeypatch)
+    script = {
+        AIProviderId.PERPLEXITY: (0.01, ProviderResult("ECHO: x", AIProviderId.PERPLEXITY, "degraded_perplexity_error:ReadTimeout")),
+        AIProviderId.OPENAI: (5.0, _res(AIProviderId.OPENAI, "too late")),
+    }
+    cfg = FanoutConfig(secondaries=(AIProviderId.OPENAI,), deadline_sec=0.1, max_cost_usd=1.0)
+    out = asyncio.run(generate_fanout(ScriptedProvider(script), "latest news", {}, cfg, UsageAccounting().cost_usd))
+    assert out.chosen.routing_note == "degraded_fanout_1of2[perplexity=degraded_perplexity_error:ReadTimeout,openai=deadline]"
+
+
+def test_cancelled_fanout_providers_are_billed_their_prompt_estimate(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    _keys(monkeypatch)
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("HALO_AI_FANOUT", "1")
+    monkeypatch.setenv("HALO_AI_FANOUT_STRATEGY", "first_valid")
+    monkeypatch.setenv("HALO_AI_FANOUT_MAX_COST_USD", "1.0")
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "perplexity")
+    script = {
+        AIProviderId.PERPLEXITY: (0.01, _res(AIProviderId.PERPLEXITY, "short", ["https://a"])),
+        AIProviderId.OPENAI: (5.0, _res(AIProviderId.OPENAI, "too late")),
+        AIProviderId.CLOUD_AI: (5.0, _res(AIProviderId.CLOUD_AI, "too late")),
+    }
+    monkeypatch.setattr(main.provider, "generate_reply", ScriptedProvider(script).generate_reply)
+
+    r = TestClient(main.app).post(
+        "/api/v1/conversation/message",
+        json={"user_utterance": "latest news about the election"},
+        headers={"X-Client-Id": "fanout-billing-tenant"},
+    ).json()
+    assert r["ai_routing_reason"].endswith("fanout_first_valid_1of3:perplexity_ok")
+
+    providers = main.usage_accounting.snapshot()["tenants"]["fanout-billing-tenant"]["providers"]
+    for p in ("openai", "cloud_ai"):
+        assert providers[p]["requests"] == 1 and providers[p]["prompt_tokens"] > 0
+        assert providers[p]["completion_tokens"] == 0
@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.ai_provider import ProviderResult
+from app.idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+
+
+def test_fingerprint_uses_normalized_utterance():
+    assert fingerprint("t", "s", "Tell me a story.") == fingerprint("t", "s", "tell me a story")
+    assert fingerprint("t", "s", "tell me a story") != fingerprint("t", "s2", "tell me a story")
+
+
+def test_concurrent_resends_join_one_upstream_call(monkeypatch):
+    monkeypatch.setenv("HALO_AI_HISTORY_TURNS", "4")
+    calls = []
+
+    async def slow_reply(user_utterance, session_context, provider_requested):
+        calls.append(user_utterance)
+        await asyncio.sleep(0.05)
+        return ProviderResult(f"reply {len(calls)}", provider_requested, "openai_chat_completions")
+
+    monkeypatch.setattr(main.provider, "generate_reply", slow_reply)
+    payload = {"session_id": "idem-s1", "user_utterance": "use perplexity and tell me a story"}
+    headers = {"X-Client-Id": "idem-tenant"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            post = lambda: client.post("/api/v1/conversation/message", json=payload, headers=headers)
+            first, second = await asyncio.gather(post(), post())
+            third = await post()  # after completion: replayed from the result store
+            return first.json(), second.json(), third.json()
+
+    first, second, third = asyncio.run(run())
+    assert calls == ["use perplexity and tell me a story"]
+    assert first == second == third
+    st = main._state("idem-tenant", "idem-s1")
+    assert len(st["history"]) == 2  # one user + one assistant turn: override/history applied once
+
+
+def test_idempotency_key_reuse_with_different_request_is_rejected():
+    client = TestClient(main.app)
+    headers = {"X-Client-Id": "idem-tenant", "Idempotency-Key": "k-1"}
+    r = client.post("/api/v1/conversation/message", json={"user_utterance": "ping"}, headers=headers)
+    assert r.status_code == 200
+    again = client.post("/api/v1/conversation/message", json={"user_utterance": "ping"}, headers=headers)
+    assert again.json() == r.json()  # same session_id although none was sent
+    r = client.post("/api/v1/conversation/message", json={"user_utterance": "what time is it"}, headers=headers)
+    assert r.status_code == 422 and r.json()["detail"]["error"] == "idempotency_key_reused"
+
+
+def test_failures_are_not_stored_and_ttl_zero_disables():
+    store = IdempotencyStore(ttl_sec=10.0)
+    runs = []
+
+    async def boom():
+        runs.append("boom")
+        raise RuntimeError("upstream")
+
+    async def ok():
+        runs.append("ok")
+        return "done"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.run("k", "fp", boom)
+        assert await store.run("k", "fp", ok) == "done"
+        assert await store.run("k", "fp", ok) == "done"
+        with pytest.raises(IdempotencyConflict):
+            await store.run("k", "other", ok)
+
+        off = IdempotencyStore(ttl_sec=0)
+        await off.run("k", "fp", ok)
+        await off.run("k", "fp", ok)
+
+    asyncio.run(scenario())
+    assert runs == ["boom", "ok", "ok", "ok"]
+    assert store.stats()["replayed"] == 1 and store.stats()["conflicts"] == 1
+
+
+def test_fingerprint_coalescing_skips_local_intents_and_uses_short_window(monkeypatch):
+    monkeypatch.setattr(main.idempotency, "fingerprint_ttl_sec", 0.05)
+    client = TestClient(main.app)
+    headers = {"X-Client-Id": "idem-fp-tenant"}
+    payload = {"session_id": "idem-fp-s1", "user_utterance": "what time is it"}
+
+    before = main.idempotency.stats()
+    client.post("/api/v1/conversation/message", json=payload, headers=headers)
+    client.post("/api/v1/conversation/message", json=payload, headers=headers)
+    after = main.idempotency.stats()
+    assert after["executed"] - before["executed"] == 2  # local reply: not replayed
+    assert after["replayed"] == before["replayed"]
+
+    async def scenario():
+        store = IdempotencyStore(ttl_sec=10.0)
+        runs = []
+
+        async def ok():
+            runs.append("ok")
+            return len(runs)
+
+        assert await store.run("fp", "x", ok, ttl_sec=0.01) == 1
+        assert await store.run("fp", "x", ok, ttl_sec=0.01) == 1
+        await asyncio.sleep(0.02)
+        assert await store.run("fp", "x", ok, ttl_sec=0.01) == 2  # window elapsed: runs again
+        assert await store.run("other", "y", ok, cacheable=lambda res: False) == 3
+        assert await store.run("other", "y", ok, cacheable=lambda res: False) == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import httpx
+
+from app.ai_provider import ConversationAIProvider
+from app.json_stream import JsonFieldExtractor
+from app.provider_types import AIProviderId
+
+
+PPLX_BODY = {
+    "id": "r1",
+    "search_results": [{"title": f"t{i} \"q\" {{[", "url": f"https://e/{i}", "snippet": "a, b: [c] \\\" " * 20} for i in range(50)],
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Rome \"caput mundi\" \\ é"}}],
+    "citations": ["https://a.example", "https://b.example"],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 34},
+}
+
+
+def test_extractor_is_chunk_boundary_independent():
+    raw = json.dumps(PPLX_BODY, ensure_ascii=False, indent=1).encode("utf-8")
+    targets = [("choices", 0, "message", "content"), ("usage",), ("citations",), ("search_results", 3, "url"), ("missing",)]
+    for size in (1, 2, 7, 64, len(raw)):
+        ex = JsonFieldExtractor(targets)
+        for i in range(0, len(raw), size):
+            ex.feed(raw[i:i + size])
+        assert ex.get(("choices", 0, "message", "content")) == "Rome \"caput mundi\" \\ é"
+        assert ex.get(("usage",)) == {"prompt_tokens": 12, "completion_tokens": 34}
+        assert ex.get(("citations",)) == ["https://a.example", "https://b.example"]
+        assert ex.get(("search_results", 3, "url")) == "https://e/3"
+        assert ("missing",) not in ex.results
+
+
+def test_perplexity_reply_streams_text_usage_and_citations(monkeypatch):
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=PPLX_BODY)
+
+    provider = ConversationAIProvider(transport=httpx.MockTransport(handler))
+    res = asyncio.run(provider.generate_reply("capital of italy", {}, AIProviderId.PERPLEXITY))
+    assert res.routing_note == "perplexity_chat_completions"
+    assert res.reply_text == "Rome \"caput mundi\" \\ é"
+    assert res.usage == {"prompt_tokens": 12, "completion_tokens": 34, "cached_tokens": 0}
+    assert res.citations == ("https://a.example", "https://b.example")
+
+
+def test_missing_reply_field_degrades_like_before(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"error": "nope"}))
+    res = asyncio.run(ConversationAIProvider(transport=transport).generate_reply("hi", {}, AIProviderId.OPENAI))
+    assert res.routing_note == "degraded_openai_error:KeyError"
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from app.audio_routing import AudioRoute
+from app.local_intents import answer_local_intent
+from app.provider_types import AIProviderId
+
+
+def test_bare_commands_are_answered_locally_in_en_and_it():
+    r = answer_local_intent("use earbuds", {})
+    assert (r.intent, r.audio_route, r.reply_text) == ("audio_route", AudioRoute.PAIRED_DEVICE, "Okay, switching audio to your earbuds.")
+
+    r = answer_local_intent("Halo, usa perplexity per favore", {})
+    assert (r.intent, r.ai_provider, r.reply_text) == ("provider_switch", AIProviderId.PERPLEXITY, "Ok, passo a Perplexity.")
+
+
+def test_commands_with_a_question_still_go_upstream():
+    assert answer_local_intent("use perplexity and tell me the latest news", {}) is None
+    assert answer_local_intent("use earbuds and read my messages", {}) is None
+
+
+def test_policy_query_reflects_bootstrap_gating(monkeypatch):
+    monkeypatch.setenv("HALO_AI_PROVIDERS_ENABLED", "openai,perplexity")
+    monkeypatch.setenv("HALO_AI_PROVIDERS_DISABLED", "perplexity")
+    r = answer_local_intent("Halo, quali motori sono attivi?", {})
+    assert (r.intent, r.reply_text) == ("policy_query", "Motori attivi: ChatGPT.")
+
+
+def test_time_and_date_templates():
+    now = datetime(2026, 10, 19, 14, 5)
+    assert answer_local_intent("che ore sono?", {"now": now}).reply_text == "Sono le 14:05."
+    assert answer_local_intent("What day is it?", {"now": now}).reply_text == "Today is Monday, 19 October 2026."
+    assert answer_local_intent("che giorno è oggi", {"now": now}).reply_text == "Oggi è lunedì 19 ottobre 2026."
+
+
+def test_time_and_date_questions_with_more_context_go_upstream():
+    for text in (
+        "what time is it in Tokyo",
+        "che ore sono a New York",
+        "what day is it tomorrow",
+        "che giorno è domani",
+        "what is the date of easter this year",
+    ):
+        assert answer_local_intent(text, {}) is None, text
+
+
+def test_longer_policy_questions_go_upstream():
+    assert answer_local_intent("which providers are enabled", {}).intent == "policy_query"
+    assert answer_local_intent("explain which providers are enabled for coding and why", {}) is None
+
+
+def test_switch_to_gated_provider_is_refused(monkeypatch):
+    monkeypatch.setenv("HALO_AI_PROVIDERS_DISABLED", "perplexity")
+    r = answer_local_intent("usa perplexity", {})
+    assert (r.intent, r.ai_provider, r.reply_text) == ("provider_switch_blocked", None, "Perplexity è disabilitato dalla configurazione.")
+
+
+def test_gated_provider_is_never_routed(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    monkeypatch.setenv("HALO_AI_PROVIDERS_DISABLED", "perplexity")
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "echo")
+    r = TestClient(main.app).post(
+        "/api/v1/conversation/message",
+        json={"session_id": "gated-s1", "user_utterance": "use perplexity and tell me the latest news"},
+        headers={"X-Client-Id": "gated-tenant"},
+    ).json()
+    assert r["ai_provider_requested"] == "echo"
+    assert r["ai_routing_reason"].startswith("policy_excluded(perplexity)")
+    assert main._state("gated-tenant", "gated-s1")["ai_provider"] is None
+
+
+def test_only_ping_survives_when_local_intents_are_off(monkeypatch):
+    monkeypatch.setenv("HALO_LOCAL_INTENTS", "0")
+    assert answer_local_intent("ping", {}).intent == "ping"
+    assert answer_local_intent("use earbuds", {}) is None
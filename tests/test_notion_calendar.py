@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.notion_calendar import build_notion_calendar_show_event_url, event_from_utterance
+
+NOW = datetime(2026, 10, 19, 10, 0, tzinfo=timezone.utc)  # Monday
+
+
+def test_parses_en_and_it_time_expressions():
+    ev, lang = event_from_utterance("Schedule a meeting with Marco tomorrow at 3pm for 45 minutes", "s1", now=NOW, tz=timezone.utc)
+    assert (ev.title, lang) == ("Meeting with Marco", "en")
+    assert ev.start_utc == datetime(2026, 10, 20, 15, 0, tzinfo=timezone.utc)
+    assert ev.end_utc - ev.start_utc == timedelta(minutes=45)
+
+    ev, lang = event_from_utterance("fissa una riunione giovedì prossimo alle 9:30 per un'ora", "s1", now=NOW, tz=timezone.utc)
+    assert (ev.title, lang) == ("Riunione", "it")
+    assert ev.start_utc == datetime(2026, 10, 22, 9, 30, tzinfo=timezone.utc)
+    assert ev.end_utc - ev.start_utc == timedelta(hours=1)
+
+    ev, _ = event_from_utterance("add a call called budget review in 20 minutes", "s1", now=NOW, tz=timezone.utc)
+    assert (ev.title, ev.start_utc) == ("Budget review", NOW + timedelta(minutes=20))
+
+    # No time expression: demo quick focus block, UID per utterance
+    ev, _ = event_from_utterance("open my calendar", "s1", now=NOW, tz=timezone.utc)
+    other, _ = event_from_utterance("block some focus time", "s1", now=NOW, tz=timezone.utc)
+    assert ev.start_utc == NOW + timedelta(minutes=2) and ev.ical_uid != other.ical_uid
+    assert ev.ical_uid == event_from_utterance("Open my calendar!", "s1", now=NOW, tz=timezone.utc)[0].ical_uid
+
+
+def test_parsed_expressions_are_read_only():
+    import pytest
+
+    from app.notion_calendar import parse_event_text
+
+    parsed = parse_event_text("meeting tomorrow at 3pm")
+    with pytest.raises(TypeError):
+        parsed["title"] = "changed"
+    assert parse_event_text("meeting tomorrow at 3pm")["title"] == "Meeting"
+
+
+def test_deep_links_are_memoized():
+    args = ("me@example.com", "uid@halo.local", NOW, NOW + timedelta(minutes=30), "Budget review")
+    url = build_notion_calendar_show_event_url(*args)
+    assert url.startswith("cron://showEvent?accountEmail=me%40example.com&iCalUID=uid%40halo.local&startDate=2026-10-19T10%3A00%3A00Z")
+    assert build_notion_calendar_show_event_url(*args) is url
+
+
+def test_calendar_turn_and_batch_return_client_actions(monkeypatch):
+    monkeypatch.setenv("NOTION_CALENDAR_ACCOUNT_EMAIL", "me@example.com")
+    monkeypatch.setenv("HALO_AI_AUTO_ROUTING", "1")
+    client = TestClient(main.app)
+    headers = {"X-Client-Id": "cal-tenant"}
+
+    r = client.post("/api/v1/conversation/message", json={"user_utterance": "add a meeting tomorrow at 10 to my calendar"}, headers=headers).json()
+    assert r["ai_provider_applied"] == "notion_calendar"
+    assert r["client_actions"][0]["type"] == "notion_calendar.show_event"
+    assert r["client_actions"][0]["url"].startswith("cron://showEvent?accountEmail=me%40example.com")
+
+    r = client.post("/api/v1/calendar/events/batch", json={"session_id": "s1", "events": [
+        {"utterance": "pranzo domani alle 13"},
+        {"title": "Standup", "start_utc": "2026-10-20T08:00:00Z", "end_utc": "2026-10-20T08:15:00Z"},
+        {"title": "broken", "start_utc": "2026-10-20T08:00:00Z", "end_utc": "2026-10-20T07:00:00Z"},
+        {"title": "nothing"},
+    ]}, headers=headers).json()
+    assert [a["event"]["title"] for a in r["client_actions"]] == ["Pranzo", "Standup"]
+    assert r["client_actions"][1]["event"]["end_utc"] == "2026-10-20T08:15:00Z"
+    assert r["errors"] == [{"index": 2, "error": "end_before_start"}, {"index": 3, "error": "missing_start_or_utterance"}]
+
+
+def test_batch_event_without_end_uses_default_duration(monkeypatch):
+    monkeypatch.setenv("HALO_CALENDAR_DEFAULT_DURATION_MIN", "45")
+    r = TestClient(main.app).post("/api/v1/calendar/events/batch", json={"session_id": "s1", "events": [
+        {"title": "Review", "start_utc": "2026-10-20T08:00:00Z"},
+    ]}, headers={"X-Client-Id": "cal-tenant"}).json()
+    assert r["client_actions"][0]["event"]["end_utc"] == "2026-10-20T08:45:00Z"
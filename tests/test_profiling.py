@@ -0,0 +1,36 @@
+import time
+
+from app.profiling import SamplingProfiler, SlowRequestLog, StageTimer
+
+
+def test_slow_request_log_keeps_only_slow_requests_in_bounded_buffer():
+    log = SlowRequestLog(enabled=True, threshold_ms=5.0, capacity=2)
+
+    fast = StageTimer()
+    fast.lap("upstream")
+    log.observe(fast, session_id="fast")
+
+    for i in range(3):
+        slow = StageTimer()
+        time.sleep(0.006)
+        slow.lap("upstream")
+        log.observe(slow, session_id=f"slow{i}")
+
+    recent = log.recent()
+    assert [e["session_id"] for e in recent] == ["slow2", "slow1"]
+    assert recent[0]["stages_ms"]["upstream"] >= 5.0
+    assert (log.observed, log.captured) == (4, 3)
+
+
+def test_sampling_profiler_emits_collapsed_stacks():
+    prof = SamplingProfiler(interval_ms=1.0)
+    prof.start()
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    prof.stop()
+
+    lines = prof.collapsed().splitlines()
+    assert prof.samples > 0
+    assert any("test_sampling_profiler_emits_collapsed_stacks" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
@@ -22,3 +22,60 @@ def test_voice_command_claude_alias():
 def test_voice_command_huggingface_alias():
     assert infer_ai_provider_override_from_text("usa hugging face") == AIProviderId.HUGGINGFACE
     assert infer_ai_provider_override_from_text("usa hf") == AIProviderId.HUGGINGFACE
+
+
+def test_voice_command_phonetic_mishearings():
+    from app.provider_selection import match_ai_provider_override
+
+    assert infer_ai_provider_override_from_text("usa perplexiti") == AIProviderId.PERPLEXITY
+    assert infer_ai_provider_override_from_text("use jemini") == AIProviderId.CLOUD_AI
+    assert infer_ai_provider_override_from_text("usa ciat gpt") == AIProviderId.OPENAI
+    for text in ("usa claud", "use cloude", "use clod"):  # cloud/claude mishearings
+        assert infer_ai_provider_override_from_text(text) == AIProviderId.CLAUDE, text
+    assert infer_ai_provider_override_from_text("hey halo usa nozion per favore") == AIProviderId.NOTION_CALENDAR
+    m = match_ai_provider_override("passa a perplexi")
+    assert m.provider == AIProviderId.PERPLEXITY and m.fuzzy and 0.8 <= m.score < 1.0
+    m = match_ai_provider_override("use jemini")
+    assert m.fuzzy and m.score == 1.0  # same phonetic key, still tagged as fuzzy
+    assert not match_ai_provider_override("use gemini").fuzzy
+
+
+def test_voice_command_fuzzy_has_no_false_positives():
+    assert infer_ai_provider_override_from_text("usa le cuffie") is None
+    assert infer_ai_provider_override_from_text("use earbuds and tell me the latest news") is None
+    assert infer_ai_provider_override_from_text("perplexiti") is None  # still needs an intent token
+    # Ordinary sentences: the candidate must follow the intent token and end the utterance,
+    # and everyday words (cloud, open) or partial names (google) are not aliases.
+    for text in (
+        "how do I use cloud storage",
+        "use the cloud to back up my photos",
+        "attiva il cloud",
+        "switch to cloud",
+        "use open",
+        "use google",
+        "usa google maps",
+        "use a perplexing word",
+        "passa a perplexi e dimmi le notizie",
+    ):
+        assert infer_ai_provider_override_from_text(text) is None, text
+
+
+def test_fuzzy_score_is_reported_in_routing_reason(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    r = TestClient(main.app).post(
+        "/api/v1/conversation/message",
+        json={"user_utterance": "passa a perplexi"},
+        headers={"X-Client-Id": "fuzzy-tenant"},
+    ).json()
+    assert r["ai_routing_reason"] == "guardrail:provider_switch(fuzzy=0.82)"
+
+    monkeypatch.setenv("HALO_LOCAL_INTENTS", "0")
+    r = TestClient(main.app).post(
+        "/api/v1/conversation/message",
+        json={"user_utterance": "usa perplexiti"},
+        headers={"X-Client-Id": "fuzzy-tenant"},
+    ).json()
+    assert r["ai_routing_reason"].startswith("explicit_override(fuzzy=1.00):")
@@ -0,0 +1,27 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location("qa_perf", Path(__file__).resolve().parents[1] / "tools" / "qa_perf.py")
+qa_perf = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(qa_perf)
+
+
+def test_in_process_run_hits_only_scripted_upstreams():
+    upstreams = qa_perf.ScriptedUpstreams()
+    results = asyncio.run(qa_perf.run_all(requests=4, warmup=1, upstreams=upstreams))
+    assert upstreams.unexpected == []
+    assert set(upstreams.calls) == {"api.openai.com", "api.perplexity.ai"}
+    assert set(results) == {"openai_chat", "perplexity_search", "local_ping"}
+    chat = results["openai_chat"]
+    # Scripted upstream latency is included in end-to-end latency, not in overhead.
+    assert chat["p50_ms"] >= 20.0 and chat["overhead_p50_ms"] < chat["p50_ms"]
+    assert chat["alloc_peak_kib_p50"] > 0
+
+
+def test_compare_flags_only_metrics_beyond_tolerance():
+    baseline = {"scenarios": {"openai_chat": {"p99_ms": 40.0, "overhead_p50_ms": 2.0, "overhead_p99_ms": 4.0}}}
+    results = {"openai_chat": {"p99_ms": 90.0, "overhead_p50_ms": 3.9, "overhead_p99_ms": 11.0}}
+    regressions = qa_perf.compare(results, baseline)
+    # End-to-end latency is informational; overhead beyond tolerance + slack gates.
+    assert [(r["metric"], r["limit"]) for r in regressions] == [("overhead_p99_ms", 10.0)]
@@ -0,0 +1,111 @@
+import asyncio
+
+from app.audio_routing import AudioRoute
+from app.provider_types import AIProviderId
+from app.session_snapshot import SessionSnapshot
+
+
+def test_snapshot_roundtrip_and_incremental_update(tmp_path):
+    path = str(tmp_path / "sessions.snap")
+
+    async def first_run():
+        snap = SessionSnapshot(path)
+        await snap.start()
+        for i in range(50):
+            snap.mark_session(f"t1:s{i}", AudioRoute.GLASSES, AIProviderId.PERPLEXITY)
+        snap.mark_tenant("t1")
+        assert await snap.snapshot() is True
+
+        # Only the changed session is re-encoded; the rest is copied from the old file.
+        snap.mark_session("t1:s7", AudioRoute.PAIRED_DEVICE, None)
+        snap.mark_tenant("t2")
+        await snap.stop()
+
+    async def second_run():
+        snap = SessionSnapshot(path)
+        await snap.start()
+        try:
+            return (
+                snap.load_session("t1:s7"),
+                snap.load_session("t1:s8"),
+                snap.load_session("t1:missing"),
+                snap.has_tenant("t2"),
+                snap.pending_restored_tenants,
+            )
+        finally:
+            await snap.stop()
+
+    asyncio.run(first_run())
+    s7, s8, missing, has_t2, pending = asyncio.run(second_run())
+    assert s7 == (AudioRoute.PAIRED_DEVICE, None)
+    assert s8 == (AudioRoute.GLASSES, AIProviderId.PERPLEXITY)
+    assert missing is None
+    assert has_t2 is True
+    assert pending == 2
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "sessions.snap"
+    path.write_bytes(b"not a snapshot at all")
+
+    async def run():
+        snap = SessionSnapshot(str(path))
+        await snap.start()
+        try:
+            return snap.load_session("t1:s1")
+        finally:
+            await snap.stop()
+
+    assert asyncio.run(run()) is None
+
+
+def test_unchanged_sessions_are_not_remarked_and_expired_records_are_pruned(tmp_path, monkeypatch):
+    import time
+    from types import SimpleNamespace
+
+    import app.session_snapshot as session_snapshot
+
+    clock = [1_000_000.0]
+    monkeypatch.setattr(session_snapshot, "time", SimpleNamespace(time=lambda: clock[0], monotonic=time.monotonic))
+    path = tmp_path / "sessions.snap"
+
+    async def first_run():
+        snap = SessionSnapshot(str(path), ttl_sec=100)
+        await snap.start()
+        for key in ("t1:s1", "t2:s2"):
+            snap.mark_session(key, AudioRoute.GLASSES, AIProviderId.PERPLEXITY)
+        snap.mark_tenant("t1")
+        snap.mark_tenant("t2")
+        assert await snap.snapshot() is True
+        snap.mark_session("t1:s1", AudioRoute.GLASSES, AIProviderId.PERPLEXITY)  # nothing changed
+        snap.mark_tenant("t1")
+        assert await snap.snapshot() is False
+        await snap.stop()
+
+    async def second_run():  # only t1 comes back, after its last-seen is due for a refresh
+        snap = SessionSnapshot(str(path), ttl_sec=100)
+        await snap.start()
+        assert snap.promote_tenant("t1")
+        snap.mark_tenant("t1")
+        snap.mark_session("t1:s1", AudioRoute.GLASSES, AIProviderId.PERPLEXITY)
+        await snap.stop()
+
+    async def third_run():
+        snap = SessionSnapshot(str(path), ttl_sec=100)
+        await snap.start()
+        try:
+            assert snap.pending_restored_tenants == 1  # t2 expired: no longer holds a tenant slot
+            assert not snap.has_tenant("t2") and snap.load_session("t2:s2") is None
+            assert snap.load_session("t1:s1") == (AudioRoute.GLASSES, AIProviderId.PERPLEXITY)
+            snap._next_prune = 0.0
+            assert await snap.snapshot() is True
+            assert snap.pruned == 2
+        finally:
+            await snap.stop()
+
+    asyncio.run(first_run())
+    clock[0] += 50
+    asyncio.run(second_run())
+    clock[0] += 60
+    asyncio.run(third_run())
+    assert path.stat().st_size == 16 + 16 + 16  # header + t1 + t1:s1
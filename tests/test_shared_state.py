@@ -0,0 +1,96 @@
+import multiprocessing
+
+from app.audio_routing import AudioRoute
+from app.provider_types import AIProviderId
+from app.shared_state import SharedState
+
+
+def test_shared_tenant_cap_and_rate_limit():
+    state = SharedState.create(multiprocessing.Lock(), tenant_slots=8, session_slots=8)
+    try:
+        assert state.admit_tenant("t1", max_tenants=2)
+        assert state.admit_tenant("t1", max_tenants=2)
+        assert state.admit_tenant("t2", max_tenants=2)
+        assert not state.admit_tenant("t3", max_tenants=2)
+        assert state.tenant_count() == 2
+
+        assert [state.hit_rate_limit("t1", 2) for _ in range(3)] == [False, False, True]
+    finally:
+        state.close()
+
+
+def test_shared_sessions_visible_across_attachments():
+    lock = multiprocessing.Lock()
+    owner = SharedState.create(lock, tenant_slots=4, session_slots=4)
+    try:
+        worker = SharedState(owner.shm, lock, owner=False)
+        assert worker.load_session("t1:s1") is None
+
+        owner.store_session("t1:s1", AudioRoute.PAIRED_DEVICE, AIProviderId.PERPLEXITY)
+        assert worker.load_session("t1:s1") == (AudioRoute.PAIRED_DEVICE, AIProviderId.PERPLEXITY)
+
+        # Full table degrades to an LRU cache: the recently used session survives.
+        for i in range(10):
+            owner.store_session(f"t1:x{i}", AudioRoute.GLASSES, None)
+            worker.load_session("t1:s1")
+        assert worker.load_session("t1:s1") == (AudioRoute.PAIRED_DEVICE, AIProviderId.PERPLEXITY)
+        assert owner.stats()["session_evictions"] > 0
+    finally:
+        owner.close()
+
+
+def test_concurrent_session_updates_merge_instead_of_overwriting():
+    state = SharedState.create(multiprocessing.Lock(), tenant_slots=4, session_slots=16)
+    try:
+        state.store_session("t1:s1", AudioRoute.GLASSES, None)
+        base_a = base_b = state.load_session("t1:s1")
+        # Worker A switches the audio route, worker B the provider, from the same base.
+        state.store_session("t1:s1", AudioRoute.PAIRED_DEVICE, None, base=base_a)
+        merged = state.store_session("t1:s1", AudioRoute.GLASSES, AIProviderId.CLAUDE, base=base_b)
+        assert merged == (AudioRoute.PAIRED_DEVICE, AIProviderId.CLAUDE)
+        assert state.load_session("t1:s1") == merged
+    finally:
+        state.close()
+
+
+def test_tenant_table_full_evicts_uncapped_and_refuses_capped():
+    state = SharedState.create(multiprocessing.Lock(), tenant_slots=8, session_slots=4)
+    try:
+        assert all(state.admit_tenant(f"t{i}", max_tenants=0) for i in range(50))
+        assert state.stats()["tenant_evictions"] > 0
+
+        capped = SharedState.create(multiprocessing.Lock(), tenant_slots=4, session_slots=4)
+        try:
+            admitted = [capped.admit_tenant(f"t{i}", max_tenants=100) for i in range(8)]
+            assert admitted[:4] == [True] * 4 and not any(admitted[4:])
+            assert capped.stats()["tenant_table_full"] == 4
+        finally:
+            capped.close()
+    finally:
+        state.close()
+
+
+def test_missing_key_lookup_is_bounded_on_a_full_table():
+    import time
+
+    state = SharedState.create(multiprocessing.Lock(), tenant_slots=4, session_slots=65536)
+    try:
+        for i in range(65536):
+            state.store_session(f"t:{i}", AudioRoute.GLASSES, None)
+        t0 = time.perf_counter()
+        for i in range(100):
+            assert state.load_session(f"t:missing-{i}") is None
+        assert (time.perf_counter() - t0) / 100 < 0.002
+    finally:
+        state.close()
+
+
+def test_workers_get_their_own_output_files(monkeypatch, tmp_path):
+    from app.audit_log import AuditLog
+    from app.usage_accounting import UsageAccounting
+
+    monkeypatch.setenv("HALO_AUDIT_LOG_DIR", str(tmp_path / "audit"))
+    monkeypatch.setenv("HALO_USAGE_FLUSH_PATH", str(tmp_path / "usage.json"))
+    monkeypatch.setenv("HALO_WORKER_ID", "2")
+    assert AuditLog.from_env().path == tmp_path / "audit" / "worker-2" / "audit.jsonl"
+    assert UsageAccounting.from_env().flush_path == tmp_path / "usage.worker-2.json"
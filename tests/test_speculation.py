@@ -0,0 +1,98 @@
+from fastapi.testclient import TestClient
+
+from app import main
+from app.ai_provider import ProviderResult
+from app.speculation import prefix_similarity
+
+
+def test_prefix_similarity_uses_normalized_text():
+    assert prefix_similarity("What's the news, today?", "whats the news today") < 1.0
+    assert prefix_similarity("What is the news today?", "what is the news today") == 1.0
+    assert prefix_similarity("what is the news", "what is the news today") < 0.95
+
+
+def test_final_utterance_commits_or_discards_speculative_generation(monkeypatch):
+    calls = []
+
+    async def fake_reply(user_utterance, session_context, provider_requested):
+        calls.append(user_utterance)
+        return ProviderResult(f"reply to {user_utterance}", provider_requested, "openai_chat_completions")
+
+    monkeypatch.setattr(main.provider, "generate_reply", fake_reply)
+    monkeypatch.setattr(main.speculation, "generation", True)
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "openai")
+    headers = {"X-Client-Id": "spec-tenant"}
+
+    with TestClient(main.app) as client:
+        r = client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "tell me a story about"}, headers=headers)
+        assert r.json()["ai_provider_predicted"] == "openai" and r.json()["generation_started"]
+        r = client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "tell me a story about rome"}, headers=headers)
+        r = client.post("/api/v1/conversation/message", json={"session_id": "s1", "user_utterance": "Tell me a story about Rome."}, headers=headers)
+        assert r.json()["reply_text"] == "reply to tell me a story about rome"
+        assert calls == ["tell me a story about", "tell me a story about rome"]
+
+        client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "what is the weather"}, headers=headers)
+        r = client.post("/api/v1/conversation/message", json={"session_id": "s1", "user_utterance": "what is the weather in milan tomorrow"}, headers=headers)
+        assert r.json()["reply_text"] == "reply to what is the weather in milan tomorrow"
+
+    assert main.speculation.committed >= 1 and main.speculation.discarded >= 1
+
+
+def test_speculative_generations_are_limited_and_cancelled_ones_accounted(monkeypatch):
+    async def slow_reply(user_utterance, session_context, provider_requested):
+        import asyncio
+
+        await asyncio.sleep(5)
+        return ProviderResult("late", provider_requested, "openai_chat_completions")
+
+    monkeypatch.setattr(main.provider, "generate_reply", slow_reply)
+    monkeypatch.setattr(main.speculation, "generation", True)
+    monkeypatch.setattr(main.speculation, "generations_per_min", 1)
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "openai")
+    headers = {"X-Client-Id": "spec-budget-tenant"}
+
+    with TestClient(main.app) as client:
+        r = client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "tell me a story about"}, headers=headers)
+        assert r.json()["generation_started"]
+        r = client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "tell me a story about rome"}, headers=headers)
+        assert not r.json()["generation_started"]  # over the per-tenant limit: warm-up only
+
+    usage = main.usage_accounting.snapshot()["tenants"]["spec-budget-tenant"]["providers"]["openai"]
+    assert usage["requests"] == 1 and usage["prompt_tokens"] > 0  # the cancelled generation
+    assert main.speculation.generations_throttled >= 1
+
+
+def test_calendar_actions_are_built_from_the_final_utterance(monkeypatch):
+    monkeypatch.setattr(main.speculation, "generation", True)
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "notion_calendar")
+    headers = {"X-Client-Id": "spec-calendar-tenant"}
+
+    with TestClient(main.app) as client:
+        r = client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "add a meeting tomorrow at 1"}, headers=headers)
+        assert r.json()["ai_provider_predicted"] == "notion_calendar" and not r.json()["generation_started"]
+        r = client.post("/api/v1/conversation/message", json={"session_id": "s1", "user_utterance": "add a meeting tomorrow at 10"}, headers=headers)
+
+    body = r.json()
+    assert body["ai_provider_applied"] == "notion_calendar"
+    assert "10:00" in body["reply_text"] and "13:00" not in body["reply_text"]
+
+
+def test_generated_reply_is_reused_only_for_the_same_text(monkeypatch):
+    calls = []
+
+    async def fake_reply(user_utterance, session_context, provider_requested):
+        calls.append(user_utterance)
+        return ProviderResult(f"reply to {user_utterance}", provider_requested, "openai_chat_completions")
+
+    monkeypatch.setattr(main.provider, "generate_reply", fake_reply)
+    monkeypatch.setattr(main.speculation, "generation", True)
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "openai")
+    headers = {"X-Client-Id": "spec-exact-tenant"}
+    assert prefix_similarity("what is 12 times 13", "what is 12 times 134") >= main.speculation.min_similarity
+
+    with TestClient(main.app) as client:
+        client.post("/api/v1/conversation/partial", json={"session_id": "s1", "partial_utterance": "what is 12 times 13"}, headers=headers)
+        r = client.post("/api/v1/conversation/message", json={"session_id": "s1", "user_utterance": "what is 12 times 134"}, headers=headers)
+
+    assert r.json()["reply_text"] == "reply to what is 12 times 134"
+    assert calls == ["what is 12 times 13", "what is 12 times 134"]
@@ -0,0 +1,85 @@
+from app.provider_selection import pick_provider_for_request
+from app.provider_types import AIProviderId
+from app.usage_accounting import UsageAccounting
+
+
+def test_usage_counters_per_tenant_and_provider():
+    acc = UsageAccounting(pricing={AIProviderId.OPENAI: (1.0, 2.0)})
+    acc.record("t1", AIProviderId.OPENAI, {"prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 768})
+    acc.record("t1", AIProviderId.OPENAI, None)
+
+    snap = acc.snapshot()["tenants"]["t1"]
+    assert snap["providers"]["openai"] == {"requests": 2, "prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 768, "cost_usd": 2.0}
+    assert snap["totals"]["cost_usd"] == 2.0
+
+
+def test_token_budget_and_tenant_override():
+    acc = UsageAccounting(token_budget=100, tenant_budgets={"vip": {"tokens": 0, "cost_usd": 0}})
+    acc.record("t1", AIProviderId.PERPLEXITY, {"prompt_tokens": 60, "completion_tokens": 40})
+    acc.record("vip", AIProviderId.PERPLEXITY, {"prompt_tokens": 60, "completion_tokens": 40})
+
+    assert acc.over_budget("t1") is True
+    assert acc.over_budget("vip") is False
+    assert acc.over_budget("t2") is False
+
+
+def test_over_budget_routes_to_fallback_provider(monkeypatch):
+    monkeypatch.setenv("HALO_AI_DEFAULT_PROVIDER", "perplexity")
+    monkeypatch.delenv("HALO_AI_BUDGET_FALLBACK_PROVIDER", raising=False)
+    assert pick_provider_for_request("latest news", over_budget=True) == AIProviderId.ECHO
+
+    monkeypatch.setenv("HALO_AI_BUDGET_FALLBACK_PROVIDER", "pro_actor")
+    assert pick_provider_for_request("latest news", over_budget=True) == AIProviderId.PRO_ACTOR
+
+
+def test_cached_input_tokens_are_priced_at_the_cached_rate():
+    acc = UsageAccounting(pricing={AIProviderId.OPENAI: (1.0, 2.0, 0.5)})
+    # 1000 prompt tokens of which 800 cached: 200 * 1.0 + 800 * 0.5 + 100 * 2.0
+    assert acc.cost_usd(AIProviderId.OPENAI, 1000, 100, cached_tokens=800) == 0.8
+
+
+def test_budget_is_global_across_workers(monkeypatch):
+    import multiprocessing
+
+    from app import shared_state
+    from app.shared_state import SharedState
+
+    state = SharedState.create(multiprocessing.Lock(), tenant_slots=8, session_slots=4)
+    monkeypatch.setattr(shared_state, "_ACTIVE", state)
+    try:
+        state.admit_tenant("t1", max_tenants=0)
+        worker_a, worker_b = UsageAccounting(token_budget=100), UsageAccounting(token_budget=100)
+        worker_a.record("t1", AIProviderId.OPENAI, {"prompt_tokens": 30, "completion_tokens": 30})
+        assert worker_b.over_budget("t1") is False
+        worker_b.record("t1", AIProviderId.OPENAI, {"prompt_tokens": 30, "completion_tokens": 30})
+        assert worker_a.over_budget("t1") is True
+        assert worker_a.snapshot()["tenants"]["t1"]["budget"]["tokens_used"] == 120
+    finally:
+        state.close()
+
+
+def test_worker_snapshots_are_merged(tmp_path):
+    import asyncio
+
+    from app.usage_accounting import merge_snapshots
+
+    a, b = UsageAccounting(), UsageAccounting()
+    a.record("t1", AIProviderId.OPENAI, {"prompt_tokens": 10, "completion_tokens": 5})
+    b.record("t1", AIProviderId.OPENAI, {"prompt_tokens": 20, "completion_tokens": 5})
+    b.record("t2", AIProviderId.PERPLEXITY, {"prompt_tokens": 1, "completion_tokens": 1})
+    merged = merge_snapshots([a.snapshot(), b.snapshot()])
+    assert merged["tenants"]["t1"]["providers"]["openai"]["prompt_tokens"] == 30
+    assert merged["tenants"]["t1"]["totals"]["requests"] == 2 and "t2" in merged["tenants"]
+
+    b.flush_path = tmp_path / "usage.worker-1.json"
+    asyncio.run(b.flush())
+    a.flush_path, a.worker_files_glob = tmp_path / "usage.worker-0.json", "usage.worker-*.json"
+    assert asyncio.run(a.aggregate())["tenants"]["t1"]["totals"]["prompt_tokens"] == 30
+
+
+def test_anthropic_cache_writes_are_priced_separately():
+    acc = UsageAccounting(pricing={AIProviderId.CLAUDE: (1.0, 2.0, 0.1, 1.25)})
+    acc.record("t1", AIProviderId.CLAUDE, {"prompt_tokens": 1000, "completion_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 800})
+    # 200 * 1.0 + 800 * 1.25
+    assert acc.snapshot()["tenants"]["t1"]["totals"]["cost_usd"] == 1.2
+
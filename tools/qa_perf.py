@@ -0,0 +1,278 @@
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Perf-regression stage: drives POST /api/v1/conversation/message in-process
+# (httpx.ASGITransport) against deterministic fake upstreams (httpx.MockTransport
+# with scripted latency), measures p50/p99 latency, orchestrator overhead
+# (latency minus the upstream time actually elapsed) and tracemalloc allocations
+# per request, and compares them with a stored baseline (tools/perf_baseline.json).
+#
+# Only overhead and allocation metrics gate: end-to-end latency is dominated by
+# the scripted sleeps, whose granularity is platform dependent (~15 ms timer on
+# Windows), so p50/p99 are reported but not compared. Baselines are stored per
+# platform ("Windows-py3.12", ...): with no baseline for the current platform the
+# run reports baseline_missing and does not fail, unless --require-baseline is given
+# (the CI perf job, which runs on the platform of the committed baseline); record
+# one with --update-baseline on that platform.
+#
+# Exit code: 0 ok, 1 regression, 2 usage, 3 baseline missing (--require-baseline). The output json is picked up by
+# qa_summarize.py (KPI card in index.html + "perf" section in engineering.json).
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import httpx  # noqa: E402
+
+# Scripted upstream latency (ms), cycled per host: deterministic but not constant.
+LATENCY_MS = {
+    "api.openai.com": (20, 24, 22, 40, 21),
+    "api.perplexity.ai": (30, 33, 31, 60, 32),
+}
+
+# Metric -> relative tolerance before it counts as a regression; small absolute
+# slack keeps sub-millisecond metrics from flapping.
+TOLERANCE = {
+    "overhead_p50_ms": 0.50,
+    "overhead_p99_ms": 1.00,
+    "alloc_peak_kib_p50": 0.25,
+    "retained_bytes_per_req": 1.00,
+}
+ABS_SLACK = {"overhead_p50_ms": 1.0, "overhead_p99_ms": 2.0, "retained_bytes_per_req": 512.0}
+
+SCENARIOS = [
+    # name, env, utterance
+    ("openai_chat", {"HALO_AI_DEFAULT_PROVIDER": "openai", "HALO_AI_AUTO_ROUTING": "0"}, "tell me a short story about the sea"),
+    ("perplexity_search", {"HALO_AI_DEFAULT_PROVIDER": "openai", "HALO_AI_AUTO_ROUTING": "1"}, "latest news about the Rome marathon with sources"),
+    ("local_ping", {}, "ping"),
+]
+
+FAKE_ENV = {
+    "OPENAI_API_KEY": "sk-perf-fake",
+    "PERPLEXITY_API_KEY": "pplx-perf-fake",
+    "HALO_MAX_TENANTS": "0",
+    "HALO_TENANT_RATE_LIMIT_PER_MIN": "0",
+}
+
+
+def platform_key() -> str:
+    return f"{platform.system()}-py{sys.version_info.major}.{sys.version_info.minor}"
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(p * len(s)))], 3) if s else 0.0
+
+
+def _chat_body(text: str) -> dict:
+    return {
+        "id": "perf",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 42, "completion_tokens": 64},
+    }
+
+
+_PPLX_BODY = dict(
+    _chat_body("The marathon was won in 2:08:45. " * 8),
+    citations=[f"https://news.example/{i}" for i in range(6)],
+    search_results=[{"title": f"Result {i}", "url": f"https://news.example/{i}", "snippet": "lorem ipsum " * 40} for i in range(40)],
+)
+_BODIES = {
+    "api.openai.com": json.dumps(_chat_body("Once upon a time, the sea was calm. " * 6)).encode("utf-8"),
+    "api.perplexity.ai": json.dumps(_PPLX_BODY).encode("utf-8"),
+}
+
+
+class ScriptedUpstreams:
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self.unexpected: list[str] = []  # hosts without a script (should stay empty)
+        self.upstream_ms = 0.0  # upstream time actually elapsed since the last reset
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host not in LATENCY_MS:
+            self.unexpected.append(host)
+            return httpx.Response(599, content=b"{}")
+        seq = LATENCY_MS[host]
+        n = self.calls.get(host, 0)
+        self.calls[host] = n + 1
+        t0 = time.perf_counter()
+        await asyncio.sleep(seq[n % len(seq)] / 1000.0)
+        self.upstream_ms += (time.perf_counter() - t0) * 1000.0
+        return httpx.Response(200, content=_BODIES[host], headers={"content-type": "application/json"})
+
+
+async def run_scenario(main_mod, upstreams: ScriptedUpstreams, name: str, utterance: str, requests: int, warmup: int) -> dict:
+    transport = httpx.ASGITransport(app=main_mod.app)
+    payload = {"session_id": f"perf-{name}", "user_utterance": utterance}
+    headers = {"X-Client-Id": "perf"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://perf") as client:
+        async def one() -> None:
+            r = await client.post("/api/v1/conversation/message", json=payload, headers=headers)
+            r.raise_for_status()
+
+        for _ in range(warmup):
+            await one()
+
+        # Latency phase (no tracing: tracemalloc slows allocation-heavy code a lot)
+        latency: list[float] = []
+        overhead: list[float] = []
+        t_start = time.perf_counter()
+        for _ in range(requests):
+            upstreams.upstream_ms = 0.0
+            t0 = time.perf_counter()
+            await one()
+            ms = (time.perf_counter() - t0) * 1000.0
+            latency.append(ms)
+            overhead.append(max(0.0, ms - upstreams.upstream_ms))
+        wall = time.perf_counter() - t_start
+
+        # Allocation phase: transient peak and retained bytes per request
+        peaks: list[float] = []
+        tracemalloc.start()
+        try:
+            gc.collect()
+            base_current, _ = tracemalloc.get_traced_memory()
+            for _ in range(max(1, requests // 4)):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                await one()
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append((peak - before) / 1024.0)
+            gc.collect()  # only count what survives a collection as retained
+            end_current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "p50_ms": pct(latency, 0.50),
+        "p99_ms": pct(latency, 0.99),
+        "overhead_p50_ms": pct(overhead, 0.50),
+        "overhead_p99_ms": pct(overhead, 0.99),
+        "throughput_rps": round(requests / wall, 1) if wall > 0 else 0.0,
+        "alloc_peak_kib_p50": pct(peaks, 0.50),
+        "retained_bytes_per_req": round(max(0, end_current - base_current) / len(peaks), 1),
+    }
+
+
+async def run_all(requests: int, warmup: int, upstreams: ScriptedUpstreams | None = None) -> dict:
+    from app import main as main_mod
+    from app.ai_provider import ConversationAIProvider
+
+    upstreams = upstreams or ScriptedUpstreams()
+    original = main_mod.provider
+    main_mod.provider = ConversationAIProvider(transport=httpx.MockTransport(upstreams.handler))
+    # Scenarios resend the same request: keep retry coalescing from replaying it.
+    idem_ttl = main_mod.idempotency.ttl_sec
+    main_mod.idempotency.ttl_sec = 0.0
+    saved = {k: os.environ.get(k) for k in set(FAKE_ENV).union(*(env for _, env, _ in SCENARIOS))}
+    results: dict[str, dict] = {}
+    try:
+        os.environ.update(FAKE_ENV)
+        for name, env, utterance in SCENARIOS:
+            for k in ("HALO_AI_DEFAULT_PROVIDER", "HALO_AI_AUTO_ROUTING"):
+                os.environ.pop(k, None)
+            os.environ.update(env)
+            results[name] = await run_scenario(main_mod, upstreams, name, utterance, requests, warmup)
+    finally:
+        await main_mod.provider.aclose()
+        main_mod.provider = original
+        main_mod.idempotency.ttl_sec = idem_ttl
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list[dict]:
+    """Regressions: metrics above baseline * (1 + tolerance) + absolute slack."""
+    regressions = []
+    for scenario, metrics in results.items():
+        base = (baseline.get("scenarios") or {}).get(scenario) or {}
+        for metric, tol in TOLERANCE.items():
+            if metric not in base or metric not in metrics:
+                continue
+            limit = float(base[metric]) * (1.0 + tol) + ABS_SLACK.get(metric, 0.0)
+            if float(metrics[metric]) > limit:
+                regressions.append({
+                    "scenario": scenario,
+                    "metric": metric,
+                    "baseline": base[metric],
+                    "value": metrics[metric],
+                    "limit": round(limit, 3),
+                })
+    return regressions
+
+
+def main() -> int:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    update = "--update-baseline" in sys.argv
+    require_baseline = "--require-baseline" in sys.argv
+    if len(args) != 2:
+        print("usage: qa_perf.py <perf_baseline.json> <perf.json> [--update-baseline | --require-baseline]")
+        return 2
+
+    baseline_json = Path(args[0])
+    out_json = Path(args[1])
+    requests = int(os.getenv("HALO_PERF_REQUESTS") or "200")
+    warmup = int(os.getenv("HALO_PERF_WARMUP") or "20")
+
+    results = asyncio.run(run_all(requests, warmup))
+
+    key = platform_key()
+    stored = json.loads(baseline_json.read_text(encoding="utf-8")) if baseline_json.exists() else {}
+    baselines = stored.get("platforms") or {}
+    baseline = {} if update else (baselines.get(key) or {})
+    regressions = compare(results, baseline) if baseline else []
+    status = "baseline_missing" if not baseline and not update else ("regressed" if regressions else "ok")
+
+    if update:
+        baselines[key] = {
+            "generated_at_utc": utc_now_iso(),
+            "python": sys.version.split()[0],
+            "requests": requests,
+            "scenarios": results,
+        }
+        baseline_json.write_text(json.dumps({"platforms": baselines}, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        status = "baseline_updated"
+
+    out = {
+        "generated_at_utc": utc_now_iso(),
+        "status": status,
+        "requests_per_scenario": requests,
+        "baseline": str(baseline_json),
+        "platform": key,
+        "baseline_generated_at_utc": baseline.get("generated_at_utc"),
+        "tolerance": TOLERANCE,
+        "scenarios": results,
+        "regressions": regressions,
+    }
+    out_json.write_text(json.dumps(out, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    for r in regressions:
+        print(f"REGRESSION {r['scenario']}.{r['metric']}: {r['value']} > {r['limit']} (baseline {r['baseline']})")
+    print("OK_PERF_WRITTEN", str(out_json), status)
+    if status == "baseline_missing" and require_baseline:
+        print(f"ERR: no perf baseline for {key} in {baseline_json}")
+        return 3
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,8 +7,8 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 def main() -> int:
-    if len(sys.argv) != 6:
-        print("usage: qa_summarize.py <report.json> <executive.md> <engineering.json> <index.html> <links.json>")
+    if len(sys.argv) not in (6, 7):
+        print("usage: qa_summarize.py <report.json> <executive.md> <engineering.json> <index.html> <links.json> [perf.json]")
         return 2
 
     report_json = Path(sys.argv[1])
@@ -16,6 +16,7 @@ def main() -> int:
     out_eng = Path(sys.argv[3])
     out_html = Path(sys.argv[4])
     links_json = Path(sys.argv[5])
+    perf_json = Path(sys.argv[6]) if len(sys.argv) == 7 else None
 
     if not report_json.exists():
         print("ERR: report.json not found:", str(report_json))
@@ -43,6 +44,11 @@ def main() -> int:
 
     pass_rate = (passed / total * 100.0) if total else 0.0
 
+    # Perf-regression stage (tools/qa_perf.py), optional
+    perf = None
+    if perf_json is not None and perf_json.exists():
+        perf = json.loads(perf_json.read_text(encoding="utf-8"))
+
     exec_md = []
     exec_md.append("# Halo Test Lab  Executive Report")
     exec_md.append("")
@@ -73,12 +79,35 @@ def main() -> int:
             "executive_md": "executive.md",
         },
     }
+    if perf is not None:
+        eng["perf"] = {
+            "status": perf.get("status"),
+            "baseline_generated_at_utc": perf.get("baseline_generated_at_utc"),
+            "scenarios": perf.get("scenarios") or {},
+            "regressions": perf.get("regressions") or [],
+        }
+        eng["artifacts"]["perf_json"] = perf_json.name
     out_eng.write_text(json.dumps(eng, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
 
     links = {"reports": []}
     if links_json.exists():
         links = json.loads(links_json.read_text(encoding="utf-8"))
 
+    perf_card = ""
+    if perf is not None:
+        scen = perf.get("scenarios") or {}
+        worst_p50 = max((float(m.get("p50_ms") or 0) for m in scen.values()), default=0.0)
+        worst_p99 = max((float(m.get("p99_ms") or 0) for m in scen.values()), default=0.0)
+        worst_alloc = max((float(m.get("alloc_peak_kib_p50") or 0) for m in scen.values()), default=0.0)
+        status = perf.get("status") or "n/a"
+        color = "#c62828" if status == "regressed" else "#2e7d32" if status == "ok" else "#777"
+        perf_card = (
+            f'<div class="card" style="border-color:{color}"><b>Perf</b> <span style="color:{color}">{status}</span><br/>'
+            f"p50 {worst_p50:.1f} ms / p99 {worst_p99:.1f} ms<br/>"
+            f"alloc {worst_alloc:.1f} KiB/req<br/>"
+            f'regressions: {len(perf.get("regressions") or [])} (<a href="{perf_json.name}">json</a>)</div>'
+        )
+
     li = "\n".join([f'<li><a href="{r["href"]}">{r["label"]}</a></li>' for r in links.get("reports", [])])
 
     html = f"""<!doctype html>
@@ -103,6 +132,7 @@ def main() -> int:
     <div class="card"><b>Skipped</b><br/>{skipped}</div>
     <div class="card"><b>Duration (s)</b><br/>{duration:.2f}</div>
     <div class="card"><b>Pass rate</b><br/>{pass_rate:.1f}%</div>
+    {perf_card}
   </div>
 
   <h2>Reports</h2>
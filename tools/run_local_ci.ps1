@@ -65,15 +65,46 @@ try {
   }
   Write-Host "HEALTH OK"
 
-  # Backend unit tests
+  # Backend unit tests (json report for qa_summarize.py when pytest-json-report is installed)
   Write-Host "RUN backend tests"
+  $ReportDir = Join-Path $BackendRoot "tools\qa_report"
+  New-Item -ItemType Directory -Force $ReportDir | Out-Null
+  $ReportJson = Join-Path $ReportDir "report.json"
+  $PerfJson = Join-Path $ReportDir "perf.json"
+  Remove-Item $ReportJson -ErrorAction SilentlyContinue
+  & $BackendPy -c "import pytest_jsonreport" 2>$null
+  $JsonReportArgs = @()
+  if ($LASTEXITCODE -eq 0) { $JsonReportArgs = @("--json-report", "--json-report-file=$ReportJson") }
   Push-Location $BackendRoot
   try {
-    & $BackendPy -m pytest -q
+    & $BackendPy -m pytest -q @JsonReportArgs
+    $testsExit = $LASTEXITCODE
   } finally {
     Pop-Location
   }
 
+  # Perf-regression stage (in-process, fake upstreams; compares with tools\perf_baseline.json).
+  # Gates only where a baseline for this platform exists; in CI the Linux perf-regression job is the gate.
+  Write-Host "RUN perf regression"
+  & $BackendPy (Join-Path $BackendRoot "tools\qa_perf.py") (Join-Path $BackendRoot "tools\perf_baseline.json") $PerfJson
+  $perfExit = $LASTEXITCODE
+
+  # QA summary (executive.md, engineering.json, index.html with the perf KPI card)
+  if (Test-Path $ReportJson) {
+    & $BackendPy (Join-Path $BackendRoot "tools\qa_summarize.py") $ReportJson (Join-Path $ReportDir "executive.md") (Join-Path $ReportDir "engineering.json") (Join-Path $ReportDir "index.html") (Join-Path $ReportDir "links.json") $PerfJson
+    if ($LASTEXITCODE -ne 0) { throw "qa_summarize.py failed (exit $LASTEXITCODE)" }
+    Write-Host "QA summary: $(Join-Path $ReportDir 'index.html')"
+  } else {
+    Write-Host "SKIP QA summary: pytest-json-report not installed"
+  }
+
+  if ($testsExit -ne 0) {
+    throw "Backend tests failed (exit $testsExit)"
+  }
+  if ($perfExit -ne 0) {
+    throw "Perf regression detected (exit $perfExit, see $PerfJson)"
+  }
+
   # QA integration tests (optional but recommended)
   if ($QaPy) {
     Write-Host "RUN QA tests (integration) from: $($QaRoot.Path)"